@@ -50,6 +50,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",  # Provides various security enhancements to the project such as preventing clickjacking, adding content security policy headers, etc.
+    "core.middleware.AsyncWhiteNoiseMiddleware",  # Serves the collected static files straight from the app process with far-future cache headers and precompressed gzip / brotli variants.
+    "core.middleware.InstrumentationMiddleware",  # Counts the SQL queries, database, template and cache work of every request, reports it in a Server-Timing header and enforces the QUERY_BUDGETS.
+    "core.middleware.ReplicaMiddleware",  # Sends the database reads of GET requests to the read replicas, and pins a browser that just wrote something to the primary for a few seconds.
     "django.contrib.sessions.middleware.SessionMiddleware",  # Manages sessions across requests, enabling the use of session variables for storing information specific to a session.
     "django.middleware.common.CommonMiddleware",  # Provides common functionalities like URL trailing slash append or prepend and redirecting non-www to www URLs and vice versa.
     "django.middleware.csrf.CsrfViewMiddleware",  # Adds Cross-Site Request Forgery protection by adding hidden form fields to POST forms and checking requests for the correct tokens.
@@ -57,7 +60,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",  # Enables cookie- and session-based message support for one-time notifications to the user.
     "django.middleware.clickjacking.XFrameOptionsMiddleware",  # Prevents clickjacking by adding the X-Frame-Options header to HTTP responses. This header controls whether a browser should be allowed to render a page in a <frame>, <iframe>, <embed>, or <object>.
     "allauth.account.middleware.AccountMiddleware",  # Specific to the django-allauth package, it provides functionalities related to user accounts, such as handling email confirmation.
-    "request.middleware.RequestMiddleware",  # Captures and stores details about each request in the database for debugging and analysis purposes.
+    "core.middleware.BufferedRequestMiddleware",  # Captures details about each request like django-request does, but writes them to the database in batches from a background thread.
     "django_htmx.middleware.HtmxMiddleware",  # Specific to integrating HTMX with Django, it enhances server-side processing by enabling partial page updates and AJAX requests in a more streamlined manner.
 ]
 
@@ -86,15 +89,42 @@ TEMPLATES = [
 WSGI_APPLICATION = "Bloggy.wsgi.application"
 
 
-# Database
+# Database: connections are kept open for CONN_MAX_AGE seconds (checked before reuse) instead
+# of one per request, and get the SQLITE_PRAGMAS when opened (see core/database.py).
 
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": 60,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "temp_store": "memory",
+    "cache_size": -16000,  # KiB
+    "mmap_size": 128 * 1024 * 1024,
+}
+
+# Read replicas: the reads of the GET requests go to the DATABASE_REPLICAS aliases, the writes
+# and the reads of a browser that wrote in the last REPLICA_STICKY_SECONDS (longer than the
+# replication lag) to "default". Locally REPLICA_DATABASE names a second SQLite file, kept a
+# copy of the primary by "manage.py simulate_replica --lag 2".
+REPLICA_DATABASE = os.environ.get("REPLICA_DATABASE")
+if REPLICA_DATABASE:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": REPLICA_DATABASE,
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["core.database.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = 5
+REPLICA_PIN_COOKIE = "pin_primary"
+
 
 # Password validation
 
@@ -135,6 +165,23 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+STATIC_ROOT = BASE_DIR / "staticfiles"  # where collectstatic gathers the hashed and compressed files
+
+
+# collectstatic writes content-hashed copies of every static file (plus .gz and .br versions),
+# and a manifest that {% static %} uses to link to them, so they can be cached forever.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+# hashed files get "Cache-Control: max-age=315360000, public, immutable" from whitenoise,
+# the few unhashed ones (e.g. a favicon linked without {% static %}) are cached for a day.
+WHITENOISE_MAX_AGE = 60 * 60 * 24
 
 
 # Default primary key field type
@@ -157,8 +204,9 @@ ACCOUNT_AUTHENTICATION_METHOD = "username_email"
 ACCOUNT_EMAIL_REQUIRED = True
 # ACCOUNT_EMAIL_VERIFICATION = "mandatory"
 ACCOUNT_EMAIL_UNKNOWN_ACCOUNTS = False
-ACCOUNT_LOGIN_ATTEMPTS_LIMIT = 5
-ACCOUNT_LOGIN_ATTEMPTS_TIMEOUT = 1800
+ACCOUNT_RATE_LIMITS = {
+    "login_failed": "10/m/ip,5/1800s/key",  # 5 failed attempts per 30 minutes
+}
 LOGOUT_REDIRECT_URL = "/"
 ACCOUNT_EMAIL_UNIQUE = True
 ACCOUNT_USERNAME_MIN_LENGTH = 2
@@ -193,3 +241,152 @@ SOCIALACCOUNT_PROVIDERS = {
         },
     },
 }
+
+
+# Vote engine: the article up/down counters are buffered per worker and flushed to the
+# database every VOTES_FLUSH_BATCH_SIZE votes, and by a background thread every
+# VOTES_FLUSH_INTERVAL seconds.
+VOTES_FLUSH_BATCH_SIZE = 64
+VOTES_FLUSH_INTERVAL = 2.0
+
+
+# Search: BM25 ranked results are capped at SEARCH_TOP_K and paginated by SEARCH_PAGE_SIZE,
+# a single query term never reads more than SEARCH_POSTINGS_LIMIT postings.
+SEARCH_TOP_K = 50
+SEARCH_PAGE_SIZE = 10
+SEARCH_POSTINGS_LIMIT = 1000
+
+# Suggestions: the search bar suggests the SUGGESTIONS_LIMIT best categories, authors and
+# articles whose words start with what is typed, from a prefix trie in the memory of each process.
+SUGGESTIONS_LIMIT = 8
+
+# Similar posts: the SIMILAR_ARTICLES closest articles by TF-IDF cosine similarity, the score of
+# the articles of the same category is multiplied by SIMILAR_CATEGORY_BOOST.
+SIMILAR_ARTICLES = 6
+SIMILAR_CATEGORY_BOOST = 1.25
+
+
+# Cache: the landing page fragments are invalidated by bumping per model versions in this
+# cache, when running several workers point it to a shared backend (redis / memcached) so an
+# edit made in one worker is seen by all of them.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "bloggy",
+    }
+}
+
+# Trending: "manage.py update_trending --every 300" adds the new votes, comments and articles
+# (weighted by TRENDING_WEIGHTS, halved every TRENDING_HALF_LIFE seconds) to the scores, up to
+# TRENDING_LAG seconds ago. The blog and category pages list the TRENDING_TOP_N best with
+# ?sort=trending, the landing page the TRENDING_LANDING_ARTICLES best.
+TRENDING_HALF_LIFE = 60 * 60 * 24
+TRENDING_WEIGHTS = {"article": 3.0, "upvote": 1.0, "downvote": -1.0, "comment": 2.0}
+TRENDING_LAG = 10
+TRENDING_TOP_N = 20
+TRENDING_LANDING_ARTICLES = 4
+
+# Landing page fragments live until the models they show change.
+LANDING_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Featured post: every worker shows the same post for FEATURED_ROTATION seconds (0 picks a new
+# one per request), optionally weighted by votes. The pool of article keys is rebuilt when an
+# article is created or deleted, or after FEATURED_POOL_TIMEOUT seconds to pick up new votes.
+FEATURED_ROTATION = 60
+FEATURED_WEIGHTED = False
+FEATURED_POOL_TIMEOUT = 60 * 60
+
+
+# Request analytics: rows are queued in memory and bulk inserted by a background thread every
+# REQUEST_LOG_BATCH_SIZE rows or REQUEST_LOG_FLUSH_INTERVAL milliseconds. Only a
+# REQUEST_LOG_SAMPLE_RATE share of the requests is recorded, and rows are dropped (not waited
+# for) when more than REQUEST_LOG_QUEUE_SIZE are pending.
+REQUEST_LOG_BATCH_SIZE = 100
+REQUEST_LOG_FLUSH_INTERVAL = 500
+REQUEST_LOG_QUEUE_SIZE = 10000
+REQUEST_LOG_SAMPLE_RATE = 1.0
+
+
+# Feeds: the RSS / Atom / JSON feeds list the FEED_ITEMS latest articles with their full content,
+# the generated body is cached for up to FEED_CACHE_TIMEOUT seconds (or until an article,
+# author or category changes) and the responses may be kept FEED_MAX_AGE seconds by clients.
+FEED_ITEMS = 50
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+FEED_MAX_AGE = 5 * 60
+
+
+# Sitemaps: /sitemap.xml indexes sitemaps of SITEMAP_SHARD_SIZE urls at most (the limit of the
+# protocol is 50000), each cached for up to SITEMAP_CACHE_TIMEOUT seconds or until one of its
+# articles changes, and kept SITEMAP_MAX_AGE seconds by the crawlers.
+SITEMAP_SHARD_SIZE = 50000
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24
+SITEMAP_MAX_AGE = 60 * 60
+
+
+# JSON API: the lists return API_PAGE_SIZE rows per page (?limit= up to
+# API_MAX_PAGE_SIZE), and every response may be kept API_MAX_AGE seconds by clients.
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+API_MAX_AGE = 60
+
+
+# Library: the reading list, saved, upvoted and downvoted pages show LIBRARY_PAGE_SIZE articles
+# per page.
+LIBRARY_PAGE_SIZE = 12
+
+
+# Responsive images: WebP / JPEG variants of the uploaded images at these widths are stored under
+# MEDIA_ROOT/derivatives, rendered in a pool of IMAGE_DERIVATIVES_WORKERS processes right after
+# an upload (IMAGE_DERIVATIVES_EAGER) or otherwise on their first request.
+IMAGE_WIDTHS = (320, 640, 960, 1280)
+IMAGE_DERIVATIVES_EAGER = True
+IMAGE_DERIVATIVES_WORKERS = 2
+
+
+# Newsletters: saving a new one mails every subscriber from a background thread, in batches of
+# NEWSLETTER_BATCH_SIZE sent over one SMTP connection each by NEWSLETTER_WORKERS threads. Failed
+# deliveries are retried (by "manage.py send_newsletters") up to NEWSLETTER_MAX_ATTEMPTS times.
+NEWSLETTER_SEND_ON_SAVE = True
+NEWSLETTER_BATCH_SIZE = 100
+NEWSLETTER_WORKERS = 4
+NEWSLETTER_MAX_ATTEMPTS = 3
+
+
+# Instrumentation: every response gets a Server-Timing header with its SQL queries (count and
+# time), template render time and cache hits / misses (SERVER_TIMING = False leaves it out),
+# the per view histograms of a process are served to the staff at /secret/metrics/. A view
+# running more queries than its QUERY_BUDGETS entry is logged, or raises QueryBudgetExceeded
+# with QUERY_BUDGET_ACTION = "raise" (meant for tests, an N+1 query then fails the request).
+# A budget is the most queries of a request to a cold cache by a signed in reader, it's the
+# only query budget, bench_views checks the views against it too.
+SERVER_TIMING = True
+QUERY_BUDGET_ACTION = "log"
+QUERY_BUDGETS = {
+    "index": 12,
+    "blog": 13,  # a search with a prefix, on top of the listing
+    "suggest": 5,
+    "category_posts": 8,
+    "author_posts": 8,
+    "article": 10,
+    "privacy_policy": 3,
+    "contact": 3,
+    "about": 3,
+    "settings": 3,
+    "reading_list": 8,
+    "saved_posts": 8,
+    "upvoted_posts": 8,
+    "downvoted_posts": 8,
+    "image_variant": 2,
+    "feed": 3,
+    "category_feed": 4,
+    "author_feed": 4,
+    "sitemap_index": 8,
+    "sitemap": 4,
+    "api_articles": 3,
+    "api_article": 3,
+    "api_comments": 4,
+    "api_categories": 3,
+    "api_category": 3,
+    "api_authors": 3,
+    "api_author": 3,
+}
@@ -2,8 +2,10 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
+from core.views import MetricsView
 
 urlpatterns = [
+    path("secret/metrics/", MetricsView.as_view(), name="metrics"),
     path("secret/", admin.site.urls),
     path("admin/", include("admin_honeypot.urls", namespace="admin_honeypot")),
     path("", include("core.urls")),
@@ -9,6 +9,7 @@ from .models import (
     Testimonial,
     Profile,
     Newsletter,
+    NewsletterDelivery,
     Subscriber,
     Favourite,
     Vote,
@@ -105,3 +106,13 @@ admin.site.register(Newsletter)
 admin.site.register(Subscriber)
 admin.site.register(Favourite)
 admin.site.register(Vote)
+
+
+class NewsletterDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("newsletter", "subscriber", "status", "attempts", "sent_at")
+    list_filter = ("status", "newsletter")
+    list_select_related = ("subscriber",)
+    readonly_fields = ("newsletter", "subscriber", "attempts", "error", "sent_at")
+
+
+admin.site.register(NewsletterDelivery, NewsletterDeliveryAdmin)
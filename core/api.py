@@ -0,0 +1,281 @@
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .models import Article, Author, Category, Comment
+
+
+# read-only JSON API of the articles, categories, authors and comments of an article. The rows
+# are read with values() over the columns of the requested fields only (?fields=title,slug),
+# the list endpoints never read the article content, and an included relation
+# (?include=author,category) is the join select_related would make, read as extra columns of
+# the same row instead of a model instance. The articles and comments are paginated on the
+# (created_at, pk) indexes with the cursor paginator, the categories and authors in the order
+# of their unique name / username, from the value of the row a page starts after.
+
+
+class ApiError(ValueError):
+    """
+    A malformed request (unknown field, relation or page size), answered with a 400.
+    """
+
+
+class Field:
+    def __init__(self, column, convert=None):
+        self.column = column
+        self.convert = convert  # (value, base) -> json value
+
+
+def _iso(value, base):
+    return value.isoformat()
+
+
+@lru_cache(maxsize=4096)
+def _media_url(name):
+    # the same few author / category images come back on every row
+    return default_storage.url(name)
+
+
+def _media(value, base):
+    return base + _media_url(value) if value else None
+
+
+@lru_cache
+def _prefix(route, kwarg):
+    # one reverse() per route rather than per row
+    return reverse(route, kwargs={kwarg: "key"})[: -len("key")]
+
+
+def _page(route, kwarg):
+    return lambda value, base: base + _prefix(route, kwarg) + quote(value)
+
+
+class Resource:
+    """
+    The fields of a model the API shows.
+
+    Args:
+        model: The model.
+        fields: The fields by name.
+        detail_only: The fields the list endpoints don't show.
+        embeds: The relations that can be included, by name, with their resource.
+        filters: The query parameters a list can be filtered by, with their lookup.
+        key: The unique column a list is ordered and paginated on, None for the cursor
+            paginated ones.
+    """
+
+    def __init__(self, model, fields, detail_only=(), embeds=None, filters=None, key=None):
+        self.model = model
+        self.fields = fields
+        self.detail_only = set(detail_only)
+        self.embeds = embeds or {}
+        self.filters = filters or {}
+        self.key = key
+
+    def filter(self, queryset, params):
+        lookups = {
+            lookup: params[name] for name, lookup in self.filters.items() if name in params
+        }
+        return queryset.filter(**lookups)
+
+    def select(self, params, many):
+        """
+        Returns the (field names, included relations) asked for by the query parameters.
+        """
+        available = [name for name in self.fields if not (many and name in self.detail_only)]
+        names = self._names(params.get("fields"), available)
+        include = [name for name in params.get("include", "").split(",") if name]
+        unknown = set(include) - set(self.embeds)
+        if unknown:
+            raise ApiError(f"Unknown relation: {', '.join(sorted(unknown))}")
+        embedded = {}
+        for name in include:
+            resource = self.embeds[name]
+            embedded[name] = resource._names(params.get(f"fields[{name}]"), list(resource.fields))
+        return names, embedded
+
+    def _names(self, value, available):
+        if not value:
+            return available
+        names = value.split(",")
+        unknown = set(names) - set(available)
+        if unknown:
+            raise ApiError(
+                f"Unknown field: {', '.join(sorted(unknown))} (available: {', '.join(available)})"
+            )
+        return names
+
+    def columns(self, names, embedded, many):
+        """
+        The columns to read, a list also needs the columns it's paginated on.
+        """
+        columns = {self.fields[name].column for name in names if name not in embedded}
+        for relation, related in embedded.items():
+            resource = self.embeds[relation]
+            columns.update(f"{relation}__{resource.fields[name].column}" for name in related)
+        if many:
+            columns.update(("created_at", "pk") if self.key is None else (self.key,))
+        return sorted(columns)
+
+    def serializer(self, names, embedded, base):
+        """
+        Returns the function turning a values() row into the JSON object, base is the scheme
+        and host of the urls.
+        """
+        plan = [
+            (name, self.fields[name].column, self.fields[name].convert)
+            for name in names
+            if name not in embedded
+        ]
+        nested = []
+        for relation, related in embedded.items():
+            fields = self.embeds[relation].fields
+            nested.append(
+                (
+                    relation,
+                    [
+                        (name, f"{relation}__{fields[name].column}", fields[name].convert)
+                        for name in related
+                    ],
+                )
+            )
+
+        def serialize(row):
+            item = {
+                name: convert(row[column], base) if convert else row[column]
+                for name, column, convert in plan
+            }
+            for relation, fields in nested:
+                item[relation] = {
+                    name: convert(row[column], base) if convert else row[column]
+                    for name, column, convert in fields
+                }
+            return item
+
+        return serialize
+
+
+CATEGORIES = Resource(
+    Category,
+    {
+        "id": Field("id"),
+        "name": Field("name"),
+        "description": Field("description"),
+        "image": Field("image", _media),
+        "created_at": Field("created_at", _iso),
+        "url": Field("name", _page("category_posts", "name")),
+    },
+    key="name",
+)
+
+AUTHORS = Resource(
+    Author,
+    {
+        "id": Field("id"),
+        "username": Field("username"),
+        "name": Field("name"),
+        "description": Field("description"),
+        "image": Field("image", _media),
+        "facebook": Field("facebook"),
+        "instagram": Field("instagram"),
+        "twitter": Field("twitter"),
+        "url": Field("username", _page("author_posts", "username")),
+    },
+    key="username",
+)
+
+# the vote tallies are left out: they are flushed without bumping the Article version the
+# ETags are built from
+ARTICLES = Resource(
+    Article,
+    {
+        "id": Field("id"),
+        "slug": Field("slug"),
+        "title": Field("title"),
+        "excerpt": Field("excert"),
+        "content": Field("content"),
+        "image": Field("image", _media),
+        "created_at": Field("created_at", _iso),
+        "updated_at": Field("updated_at", _iso),
+        "author": Field("author_id"),
+        "category": Field("category_id"),
+        "url": Field("slug", _page("article", "slug")),
+    },
+    detail_only=("content",),
+    embeds={"author": AUTHORS, "category": CATEGORIES},
+    filters={"category": "category__name", "author": "author__username"},
+)
+
+COMMENTS = Resource(
+    Comment,
+    {
+        "id": Field("id"),
+        "content": Field("content"),
+        "created_at": Field("created_at", _iso),
+        "user": Field("user__username"),
+    },
+)
+
+RESOURCES = {
+    "articles": ARTICLES,
+    "categories": CATEGORIES,
+    "authors": AUTHORS,
+    "comments": COMMENTS,
+}
+
+
+def get_page_size(params):
+    """
+    The ?limit= of a list, API_PAGE_SIZE by default and API_MAX_PAGE_SIZE at most.
+    """
+    default = getattr(settings, "API_PAGE_SIZE", 20)
+    maximum = getattr(settings, "API_MAX_PAGE_SIZE", 100)
+    try:
+        size = int(params.get("limit", default))
+    except ValueError:
+        raise ApiError("limit must be a number")
+    if not 1 <= size <= maximum:
+        raise ApiError(f"limit must be between 1 and {maximum}")
+    return size
+
+
+def key_page(rows, column, size, params):
+    """
+    One page of the rows in the order of the unique column, ?after= / ?before= hold the value
+    of the row the page starts after / ends before. Returns the (rows, next cursor, previous
+    cursor), the cursors None when there's no such page.
+    """
+    after, before = params.get("after"), params.get("before")
+    if before:
+        found = list(rows.filter(**{f"{column}__lt": before}).order_by(f"-{column}")[: size + 1])
+        page, has_next, has_previous = found[:size][::-1], True, len(found) > size
+    else:
+        if after:
+            rows = rows.filter(**{f"{column}__gt": after})
+        found = list(rows.order_by(column)[: size + 1])
+        page, has_next, has_previous = found[:size], len(found) > size, bool(after)
+    next_cursor = page[-1][column] if has_next and page else None
+    previous_cursor = page[0][column] if has_previous and page else None
+    return page, next_cursor, previous_cursor
+
+
+def page_links(request, next_cursor, previous_cursor):
+    """
+    The urls of the next and previous pages, None when there are none.
+    """
+    params = {
+        name: value for name, value in request.GET.items() if name not in ("after", "before")
+    }
+
+    def link(direction, cursor):
+        if cursor is None:
+            return None
+        return request.build_absolute_uri(
+            "?" + urlencode({**params, direction: cursor})
+        )
+
+    return link("after", next_cursor), link("before", previous_cursor)
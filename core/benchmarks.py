@@ -0,0 +1,133 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import urls
+from .images import get_widths
+from .models import Article, Author, Category
+
+
+# shared helpers for the bench_* management commands
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Runs the enclosed block against a throwaway SQLite file database, so the
+    benchmarks never touch the real data and can be used from several threads.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.settings_dict.setdefault("TEST", {})
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp, "bench.sqlite3")
+        old_name = connection.creation.create_test_db(
+            verbosity=verbosity, autoclobber=True, serialize=False
+        )
+        # every query runs on (and is counted on) this one database, none on the replicas
+        try:
+            with override_settings(DATABASE_REPLICAS=[]):
+                yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Lets bulk_create keep the auto_now_add timestamps set on the seeded instances.
+    """
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now_add", False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def percentile(samples, pct):
+    """
+    Returns the pct-th percentile (nearest rank) of the samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    """
+    Returns the usual latency figures, in milliseconds, for samples in seconds.
+    """
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples, default=0) * 1000, 3),
+    }
+
+
+VIEW_VARIANTS = ("anonymous", "authenticated", "htmx")
+
+# more requests of a view than its plain url, by name: (query string, the extra headers of
+# its htmx request). The search box sends its query as an htmx request with "src: search",
+# the prefix expands to several of the seeded terms.
+VIEW_QUERY_STRINGS = {
+    "blog": {
+        "search": ("query=se", {"src": "search"}),
+        "search_words": ("query=python+se", {"src": "search"}),
+    },
+}
+
+
+def view_cases(user):
+    """
+    Yields a (case name, client, url) per named pattern of core.urls, and query string of
+    VIEW_QUERY_STRINGS, and variant, the url arguments taken from the seeded data.
+    """
+    article = Article.objects.order_by("-created_at").first()
+    category = Category.objects.order_by("pk").first()
+    author = Author.objects.order_by("pk").first()
+    kwargs = {
+        "category_posts": {"name": category.name},
+        "author_posts": {"username": author.username},
+        "feed": {"fmt": "rss"},
+        "category_feed": {"name": category.name, "fmt": "atom"},
+        "author_feed": {"username": author.username, "fmt": "json"},
+        "sitemap": {"section": "articles", "shard": 1},
+        "article": {"slug": article.slug},
+        "api_article": {"slug": article.slug},
+        "api_comments": {"slug": article.slug},
+        "api_category": {"name": category.name},
+        "api_author": {"username": author.username},
+        "image_variant": {
+            "width": get_widths()[0],
+            "fmt": "webp",
+            "name": article.image.name,
+        },
+    }
+    for pattern in urls.urlpatterns:
+        if not pattern.name:
+            continue
+        url = reverse(pattern.name, kwargs=kwargs.get(pattern.name))
+        requests = [(pattern.name, url, {})]
+        for label, (query_string, headers) in VIEW_QUERY_STRINGS.get(pattern.name, {}).items():
+            requests.append((f"{pattern.name}:{label}", f"{url}?{query_string}", headers))
+        for name, request_url, headers in requests:
+            for variant in VIEW_VARIANTS:
+                htmx_headers = {"HX-Request": "true", **headers}
+                client = Client(headers=htmx_headers if variant == "htmx" else {})
+                if variant == "authenticated":
+                    client.force_login(user)
+                yield f"{name}:{variant}", client, request_url
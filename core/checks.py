@@ -0,0 +1,58 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.checks import Error, Tags, register
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+
+STATIC_TAG_RE = re.compile(r"""\{%\s*static\s+(['"])(?P<path>[^'"]+)\1""")
+
+
+def template_static_references():
+    """
+    Yields (template path, line number, static path) for every literal {% static %} in the
+    project and app templates.
+    """
+    directories = []
+    for engine in engines.all():
+        # the engine's DIRS, then with APP_DIRS the templates directory of every installed app
+        directories.extend(getattr(engine, "dirs", ()))
+        if getattr(engine, "app_dirs", False):
+            directories.extend(get_app_template_dirs(engine.app_dirname))
+    for directory in dict.fromkeys(directories):
+        for template in sorted(Path(directory).rglob("*.html")):
+            text = template.read_text(encoding="utf-8", errors="replace")
+            for match in STATIC_TAG_RE.finditer(text):
+                line = text.count("\n", 0, match.start()) + 1
+                yield template, line, match.group("path")
+
+
+# run with "python manage.py check --deploy" after collectstatic
+@register(Tags.staticfiles, deploy=True)
+def check_static_manifest(app_configs, **kwargs):
+    if not isinstance(staticfiles_storage, ManifestFilesMixin):
+        return []
+
+    manifest, _ = staticfiles_storage.load_manifest()
+    if not manifest:
+        return [
+            Error(
+                "The static files manifest is missing or empty.",
+                hint=f"Run collectstatic to build it in {settings.STATIC_ROOT}.",
+                id="core.E001",
+            )
+        ]
+
+    errors = []
+    for template, line, path in template_static_references():
+        if path not in manifest:
+            errors.append(
+                Error(
+                    f"{template}:{line} references static file '{path}' which is not in the manifest.",
+                    hint="Fix the path or add the file to STATICFILES_DIRS and run collectstatic.",
+                    id="core.E002",
+                )
+            )
+    return errors
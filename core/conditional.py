@@ -0,0 +1,152 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .context_processors import get_profile
+from .fragments import aget_versions, get_versions
+from .interactions import aget_states_version, get_states_version
+from .models import Article, Author, Category
+from .votes import vote_engine
+
+
+# conditional GET for the blog, category, author and article pages: before running their
+# queries and rendering, the views compute a weak ETag from a single lightweight query (the
+# latest update of the articles shown, plus the comments and vote tallies of an article) and
+# cached values (the fragment versions of the models shown, the version of the reader's
+# bookmark / vote states and the avatar), and answer 304 Not Modified when the browser
+# already has that version. The ETag also covers what differs between readers and requests:
+# the user, the CSRF cookie the forms embed, the query string and the htmx partials.
+#
+# Last-Modified (the latest article or comment change) is sent too, but the ETag is what
+# browsers revalidate with, If-Modified-Since only counts when no If-None-Match is sent.
+
+VARY = ("Cookie", "HX-Request", "src")
+
+
+def make_etag(*parts):
+    return 'W/"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+
+
+async def aload_user(request):
+    """
+    Loads the user of an async view once: request.auser() and the request.user the templates
+    and context processors read are cached separately, so both are set to the loaded user.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+def _request_parts(request, user, states_version, profile):
+    return (
+        request.get_full_path(),
+        bool(request.htmx),
+        request.headers.get("src"),
+        user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        getattr(profile, "picture", None),
+        states_version,
+    )
+
+
+def _last_modified(*values):
+    values = [value for value in values if value is not None]
+    return int(max(values).timestamp()) if values else None
+
+
+LISTING_MODELS = (Article, Author, Category)
+
+
+def listing_validators(request, articles, models=LISTING_MODELS):
+    """
+    Returns the (etag, last modified timestamp) of a page listing the articles, models are
+    the models whose versions the page depends on.
+    """
+    user = request.user
+    profile = get_profile(user) if user.is_authenticated else None
+    parts = _request_parts(request, user, get_states_version(user), profile)
+    versions = get_versions(*models)
+    latest = articles.aggregate(latest=Max("updated_at"))["latest"]
+    return make_etag(parts, versions, latest), _last_modified(latest)
+
+
+async def alisting_validators(request, articles, models=LISTING_MODELS):
+    """
+    Async version of listing_validators.
+    """
+    user = await aload_user(request)
+    profile = await sync_to_async(get_profile)(user) if user.is_authenticated else None
+    parts = _request_parts(request, user, await aget_states_version(user), profile)
+    versions = await aget_versions(*models)
+    latest = (await articles.aaggregate(latest=Max("updated_at")))["latest"]
+    return make_etag(parts, versions, latest), _last_modified(latest)
+
+
+async def aarticle_validators(request, slug):
+    """
+    Returns the (etag, last modified timestamp) of an article page, None if there's no such
+    article.
+    """
+    rows = (
+        Article.objects.filter(slug=slug)
+        .values("pk", "updated_at", "upvote", "downvote")
+        .annotate(last_comment=Max("comments__created_at"), comments=Count("comments"))
+    )
+    row = [row async for row in rows]
+    if not row:
+        return None
+    row = row[0]
+    user = await aload_user(request)
+    profile = await sync_to_async(get_profile)(user) if user.is_authenticated else None
+    parts = _request_parts(request, user, await aget_states_version(user), profile)
+    versions = await aget_versions(Article, Author, Category)
+    # the votes this worker has not flushed yet are shown on the page too
+    article = Article(pk=row["pk"], upvote=row["upvote"], downvote=row["downvote"])
+    tallies = vote_engine.tallies(article)
+    etag = make_etag(
+        parts, versions, row["updated_at"], row["last_comment"], row["comments"], tallies
+    )
+    return etag, _last_modified(row["updated_at"], row["last_comment"])
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Returns a 304 response when the browser's copy is still fresh, None otherwise.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    if len(get_messages(request)):
+        return None  # the cached page wouldn't show them
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Adds the validators to a full response, the browser revalidates it on every visit.
+    """
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_vary_headers(response, VARY)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def set_public_validators(response, etag, last_modified, max_age):
+    """
+    Adds the validators to a response that's the same for everyone (feeds, sitemaps), shared
+    caches may keep it for max_age seconds.
+    """
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
@@ -1,20 +1,49 @@
-from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import Profile
+
+
+PROFILE_CACHE_KEY = "profile:%s"
+PROFILE_CACHE_TIMEOUT = 60 * 60 * 24
+NO_PROFILE = "none"  # cached marker for users without a profile, None means a cache miss
+
+
+def get_profile(user):
+    """
+    Returns the user's profile (or None), cached across requests until the profile changes.
+    """
+    key = PROFILE_CACHE_KEY % user.pk
+    profile = cache.get(key)
+    if profile is None:
+        profile = Profile.objects.filter(user=user).first() or NO_PROFILE
+        cache.set(key, profile, PROFILE_CACHE_TIMEOUT)
+    return None if profile == NO_PROFILE else profile
+
+
+def invalidate_profile(user_id):
+    cache.delete(PROFILE_CACHE_KEY % user_id)
 
 
 def profile_context_processor(request):
     """
     This context processor adds the user's profile object to the context.
 
+    The profile is resolved lazily, at most once per request (every render of the request
+    shares it) and comes from the cache on later requests.
+
     Args:
         request: The current request object.
 
     Returns:
         A dictionary containing the user's profile object.
     """
-    if request.user.is_authenticated:
-        try:
-            return {"profile": request.user.profile.first()}
-        except User.profile.RelatedObjectDoesNotExist:
-            return {}
-    else:
-        return {}
+    if not hasattr(request, "_profile"):
+
+        def load():
+            if request.user.is_authenticated:
+                return get_profile(request.user)
+            return None
+
+        request._profile = SimpleLazyObject(load)
+    return {"profile": request._profile}
@@ -0,0 +1,103 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+
+# database connection layer: the SQLite pragmas applied to every new connection, and a router
+# sending the reads of the GET / HEAD requests to the read replicas (DATABASE_REPLICAS) while
+# every write, and every read outside of such a request (POST handlers, background threads,
+# management commands), goes to the primary. A browser that just wrote (voted, commented,
+# signed in, ...) is pinned to the primary for REPLICA_STICKY_SECONDS by a cookie (see
+# ReplicaMiddleware), so it reads its own writes while the replicas catch up. The reads filling
+# a cache shared by every reader (the fragments, counts, feeds and sitemaps keyed by the model
+# versions) go to the primary too (see primary()): a lagging replica would store the rows from
+# before an edit under the version bumped by that edit, until the next one.
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "wal",  # readers don't block the writer and the other way around
+    "synchronous": "normal",  # safe with WAL, the last commits may be lost on a power cut
+    "temp_store": "memory",
+}
+
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", DEFAULT_PRAGMAS)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+connection_created.connect(apply_pragmas, dispatch_uid="core.database")
+
+
+def get_replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+
+def use_replica(allowed):
+    """
+    Lets (or stops) the reads of the current request and the threads it runs go to a
+    replica, returns the token to pass to reset_replica.
+    """
+    return _use_replica.set(allowed)
+
+
+def reset_replica(token):
+    _use_replica.reset(token)
+
+
+@contextmanager
+def primary():
+    """
+    Sends the reads of the enclosed block (and of the threads it runs) to the primary.
+    """
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if replicas and _use_replica.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas get the tables from the primary
+        return db not in get_replicas()
+
+
+def replicate(alias):
+    """
+    Copies the primary SQLite database into the replica alias (the local stand-in for
+    streaming replication), returns the number of pages copied.
+    """
+    # through the connections of this thread, they also reach an in memory primary (tests)
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+    primary.ensure_connection()
+    replica.ensure_connection()
+    primary.connection.backup(replica.connection)
+    with primary.cursor() as cursor:
+        cursor.execute("PRAGMA page_count")
+        return cursor.fetchone()[0]
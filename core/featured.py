@@ -0,0 +1,101 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .database import primary
+from .models import Article
+
+
+# featured article picker: instead of sorting the whole table by RANDOM() on every landing
+# page request, the article keys are kept in a small precomputed pool (with a Vose alias
+# table when weighting by votes) and sampled in O(1). With a rotation window the sample is
+# seeded by the window number, so every worker picks the same article until it ends.
+# The pool lives in the memory of each process, only its version is shared through the cache
+# (unpickling the whole pool from the cache on every request would cost O(n) again): a
+# process rebuilds its pool when the version changed, after an article was added or removed
+# or once the version expires after FEATURED_POOL_TIMEOUT seconds.
+
+POOL_VERSION_KEY = "featured:pool:version"
+
+_pool = {"version": None}
+
+
+def _alias_table(weights):
+    # Vose's alias method: O(n) to build, O(1) per weighted sample
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    alias, probability = [0] * n, [0.0] * n
+    small = [i for i, w in enumerate(scaled) if w < 1]
+    large = [i for i, w in enumerate(scaled) if w >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probability[less], alias[less] = scaled[less], more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+    for i in small + large:
+        probability[i] = 1.0
+    return probability, alias
+
+
+def build_pool():
+    """
+    Builds the pool from the articles table, ordered by key so every worker gets the same pool.
+    """
+    with primary():
+        rows = list(Article.objects.order_by("pk").values_list("pk", "upvote", "downvote"))
+    keys, weights = [], []
+    for pk, upvote, downvote in rows:
+        keys.append(pk)
+        weights.append(1 + max(0, upvote - downvote))
+    pool = {"keys": keys, "alias": None}
+    if keys and getattr(settings, "FEATURED_WEIGHTED", False):
+        pool["alias"] = _alias_table(weights)
+    return pool
+
+
+def get_pool():
+    version = cache.get(POOL_VERSION_KEY)
+    if version is None:
+        cache.add(
+            POOL_VERSION_KEY, time.time_ns(), getattr(settings, "FEATURED_POOL_TIMEOUT", 3600)
+        )
+        version = cache.get(POOL_VERSION_KEY)
+    global _pool
+    pool = _pool  # swapped whole, a concurrent request never sees half a pool
+    if pool["version"] != version:
+        pool = _pool = {**build_pool(), "version": version}
+    return pool
+
+
+def invalidate_pool():
+    cache.delete(POOL_VERSION_KEY)
+
+
+def featured_article_pk(now=None):
+    """
+    Picks the key of the featured article.
+
+    Returns:
+        The article pk, or None when there are no articles yet.
+    """
+    pool = get_pool()
+    keys = pool["keys"]
+    if not keys:
+        return None
+
+    rotation = getattr(settings, "FEATURED_ROTATION", 60)
+    if rotation:
+        window = int((now if now is not None else time.time()) // rotation)
+        rng = random.Random(window)
+    else:
+        rng = random  # a new pick on every request
+
+    i = rng.randrange(len(keys))
+    if pool["alias"] is not None:
+        probability, alias = pool["alias"]
+        if rng.random() >= probability[i]:
+            i = alias[i]
+    return keys[i]
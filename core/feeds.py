@@ -0,0 +1,163 @@
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed, rfc3339_date
+from django.utils.xmlutils import SimplerXMLGenerator
+
+
+# RSS 2.0, Atom and JSON Feed documents of the latest articles, overall or of a category or
+# author. The items carry the full article content and are written while they are read from
+# the database (one query, the author and category joined in), so a long feed starts reaching
+# the client before it's complete. The finished body is cached under a key holding the
+# Article / Author / Category fragment versions, so an edit makes it unreachable.
+
+FEED_FLUSH_EVERY = 20  # items per chunk sent to the client
+
+
+class StreamingFeedMixin:
+    """
+    Writes the document item by item instead of collecting every item first.
+    """
+
+    def __init__(self, *args, updated=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.updated = updated
+
+    def latest_post_date(self):
+        # the items aren't known when the header is written
+        return self.updated or super().latest_post_date()
+
+    def stream(self, items):
+        buffer = StringIO()
+        handler = SimplerXMLGenerator(buffer, "utf-8")
+        handler.startDocument()
+        self.open_document(handler)
+        for count, item in enumerate(items, 1):
+            self.add_item(**item)
+            self.write_items(handler)
+            self.items.clear()
+            if count % FEED_FLUSH_EVERY == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        self.close_document(handler)
+        yield buffer.getvalue()
+
+
+class RssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    def rss_attributes(self):
+        # the full content goes in content:encoded, the excerpt in the description
+        return {
+            **super().rss_attributes(),
+            "xmlns:content": "http://purl.org/rss/1.0/modules/content/",
+        }
+
+    def open_document(self, handler):
+        handler.startElement("rss", self.rss_attributes())
+        handler.startElement("channel", self.root_attributes())
+        self.add_root_elements(handler)
+
+    def close_document(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement("rss")
+
+    def add_item_elements(self, handler, item):
+        super().add_item_elements(handler, item)
+        handler.addQuickElement("content:encoded", item["content"])
+
+
+class AtomFeed(StreamingFeedMixin, Atom1Feed):
+    def open_document(self, handler):
+        handler.startElement("feed", self.root_attributes())
+        self.add_root_elements(handler)
+
+    def close_document(self, handler):
+        handler.endElement("feed")
+
+    def add_item_elements(self, handler, item):
+        super().add_item_elements(handler, item)
+        handler.addQuickElement("content", item["content"], {"type": "html"})
+
+
+class JsonFeed:
+    """
+    JSON Feed 1.1 (https://www.jsonfeed.org/version/1.1/), with the same arguments as the
+    Django feed generators.
+    """
+
+    content_type = "application/feed+json; charset=utf-8"
+
+    def __init__(self, title, link, description, feed_url, updated=None, **kwargs):
+        self.head = {
+            "version": "https://jsonfeed.org/version/1.1",
+            "title": title,
+            "home_page_url": link,
+            "feed_url": feed_url,
+            "description": description,
+        }
+
+    def stream(self, items):
+        yield json.dumps(self.head)[:-1] + ', "items": ['
+        chunk, separator = [], ""
+        for item in items:
+            chunk.append(
+                json.dumps(
+                    {
+                        "id": item["unique_id"],
+                        "url": item["link"],
+                        "title": item["title"],
+                        "summary": item["description"],
+                        "content_html": item["content"],
+                        "date_published": rfc3339_date(item["pubdate"]),
+                        "date_modified": rfc3339_date(item["updateddate"]),
+                        "authors": [{"name": item["author_name"], "url": item["author_link"]}],
+                        "tags": list(item["categories"]),
+                    }
+                )
+            )
+            if len(chunk) == FEED_FLUSH_EVERY:
+                yield separator + ",".join(chunk)
+                chunk, separator = [], ","
+        if chunk:
+            yield separator + ",".join(chunk)
+        yield "]}"
+
+
+FEED_TYPES = {"rss": RssFeed, "atom": AtomFeed, "json": JsonFeed}
+
+
+def article_items(articles, absolute):
+    """
+    The feed items of the articles, absolute() turns a path into a full url.
+    """
+    for article in articles:
+        link = absolute(reverse("article", kwargs={"slug": article.slug}))
+        yield {
+            "title": article.title,
+            "link": link,
+            "description": article.excert,
+            "content": article.content,
+            "unique_id": link,
+            "unique_id_is_permalink": True,
+            "author_name": article.author.name,
+            "author_link": absolute(
+                reverse("author_posts", kwargs={"username": article.author.username})
+            ),
+            "pubdate": article.created_at,
+            "updateddate": article.updated_at,
+            "categories": [article.category.name],
+        }
+
+
+def cache_when_complete(chunks, key, last_modified, timeout):
+    """
+    Passes the chunks through, and caches the whole body once the last one was sent (a
+    client leaving halfway doesn't cache a truncated feed).
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ("".join(parts), last_modified), timeout)
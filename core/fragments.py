@@ -0,0 +1,57 @@
+import time
+
+from django.core.cache import cache
+
+
+# per-model versions for the template fragment cache: the cached fragments use the
+# versions of the models they render as part of their key ({% cache ... versions.article %}),
+# and the post_save / post_delete signals bump the version, so an edit makes every
+# fragment built from the old data unreachable without having to know their keys.
+
+VERSION_KEY = "fragments:version:%s"
+
+
+def _key(model):
+    return VERSION_KEY % model._meta.label_lower
+
+
+def get_versions(*models):
+    """
+    Returns the current version of each model, keyed by its model name.
+    """
+    keys = {model._meta.model_name: _key(model) for model in models}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for name, key in keys.items():
+        if key not in found:
+            # a fresh token rather than 1, so an evicted version can never match a
+            # fragment that was cached before the eviction
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+        versions[name] = found[key]
+    return versions
+
+
+async def aget_versions(*models):
+    """
+    Async version of get_versions.
+    """
+    keys = {model._meta.model_name: _key(model) for model in models}
+    found = await cache.aget_many(keys.values())
+    versions = {}
+    for name, key in keys.items():
+        if key not in found:
+            await cache.aadd(key, time.time_ns(), None)
+            found[key] = await cache.aget(key)
+        versions[name] = found[key]
+    return versions
+
+
+def bump_version(model):
+    """
+    Invalidates every fragment rendered from the model.
+    """
+    try:
+        cache.incr(_key(model))
+    except ValueError:
+        cache.set(_key(model), time.time_ns(), None)
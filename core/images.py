@@ -0,0 +1,157 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+# responsive image derivatives: every uploaded image gets width bucketed WebP and JPEG
+# variants stored under MEDIA_ROOT/derivatives and named after the hash of the original's
+# content, so a variant is generated once (eagerly in a process pool after an upload, or
+# lazily by ImageVariantView on its first request) and is never regenerated or invalidated.
+
+VARIANTS_DIR = "derivatives"
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+INFO_CACHE_KEY = "images:info:%s"
+
+_pool = None
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, "IMAGE_WIDTHS", (320, 640, 960, 1280))))
+
+
+def source_info(name):
+    """
+    Returns the content hash and pixel width of an uploaded image, cached by its name
+    (uploads are never overwritten in place, a new file always gets a new name).
+
+    Returns:
+        A {"hash": ..., "width": ...} dict, or None when the file can't be read.
+    """
+    key = INFO_CACHE_KEY % hashlib.md5(name.encode()).hexdigest()
+    info = cache.get(key)
+    if info is None:
+        try:
+            with default_storage.open(name, "rb") as file:
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: file.read(1 << 16), b""):
+                    digest.update(chunk)
+                file.seek(0)
+                with Image.open(file) as image:
+                    width = ImageOps.exif_transpose(image).width
+        except (OSError, ValueError):
+            return None
+        info = {"hash": digest.hexdigest()[:32], "width": width}
+        cache.set(key, info, None)
+    return info
+
+
+def variant_widths(info):
+    """
+    The bucket widths below the original width, plus the original (capped at the largest bucket),
+    images are never upscaled.
+    """
+    widths = get_widths()
+    result = [w for w in widths if w < info["width"]]
+    result.append(min(info["width"], widths[-1]))
+    return sorted(set(result))
+
+
+def variant_name(info, width, fmt):
+    digest = info["hash"]
+    return f"{VARIANTS_DIR}/{digest[:2]}/{digest}-{width}.{fmt}"
+
+
+def render_variant(source_path, target_path, width, fmt):
+    """
+    Writes one resized variant of the image, atomically so a half written file is never served.
+    Runs inside the process pool, so it only deals with plain file paths.
+    """
+    if os.path.exists(target_path):
+        return target_path
+    pil_format = FORMATS[fmt][0]
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if pil_format == "JPEG":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(target_path))
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                image.save(file, pil_format, quality=80, optimize=True)
+            os.replace(temporary, target_path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    return target_path
+
+
+def ensure_variant(name, width, fmt):
+    """
+    Returns the storage name of the variant, generating it in this process if it's missing.
+    """
+    info = source_info(name)
+    if info is None:
+        return None
+    width = min(width, variant_widths(info)[-1])
+    target = variant_name(info, width, fmt)
+    if not default_storage.exists(target):
+        render_variant(default_storage.path(name), default_storage.path(target), width, fmt)
+    return target
+
+
+def variants(name):
+    """
+    Returns {format: [(width, storage name), ...]} for every variant of the image.
+    """
+    info = source_info(name)
+    if info is None:
+        return {}
+    return {
+        fmt: [(width, variant_name(info, width, fmt)) for width in variant_widths(info)]
+        for fmt in FORMATS
+    }
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(getattr(settings, "IMAGE_DERIVATIVES_WORKERS", 2))
+    return _pool
+
+
+def generate_variants(name, wait=False):
+    """
+    Renders every missing variant of the image in the process pool.
+
+    Args:
+        name: The storage name of the original image.
+        wait: Whether to block until all of them are written.
+    """
+    futures = []
+    for fmt, items in variants(name).items():
+        for width, target in items:
+            if not default_storage.exists(target):
+                futures.append(
+                    _get_pool().submit(
+                        render_variant,
+                        default_storage.path(name),
+                        default_storage.path(target),
+                        width,
+                        fmt,
+                    )
+                )
+    if wait:
+        for future in futures:
+            future.result()
+    return len(futures)
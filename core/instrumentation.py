@@ -0,0 +1,275 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+# lightweight per request instrumentation: the number and total time of the SQL queries,
+# the template render time and the cache hits / misses of every request are collected in a
+# RequestMetrics held by a context variable (so the queries an async view runs through
+# sync_to_async in another thread are counted too), sent back in a Server-Timing header
+# and folded into per view histograms (see MetricsView). Views over their query budget
+# (QUERY_BUDGETS) are logged, or raise QueryBudgetExceeded, e.g. in tests.
+
+DURATION_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)  # milliseconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+_missing = object()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # nested renders and cache calls (get_many falling back on get) are only counted once
+        self.template_depth = 0
+        self.cache_depth = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ", ".join(
+            (
+                f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+                f"tpl;dur={self.template_time * 1000:.1f}",
+                f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+                f"total;dur={self.elapsed * 1000:.1f}",
+            )
+        )
+
+
+def start_request():
+    # connections opened before install() (e.g. by the startup checks) are hooked here
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(None, connection)
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    """
+    The metrics of the request being served, None outside of a request.
+    """
+    return _current.get()
+
+
+# the hooks
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.queries += 1
+
+
+def _wrap_connection(sender, connection, **kwargs):
+    # connection_created fires on every (re)connect of the same thread local wrapper
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None or metrics.template_depth:
+            return render(self, *args, **kwargs)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.template_depth -= 1
+
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        metrics = _current.get()
+        if metrics is None or metrics.cache_depth:
+            return get(self, key, default, version)
+        metrics.cache_depth += 1
+        try:
+            value = get(self, key, _missing, version)
+        finally:
+            metrics.cache_depth -= 1
+        if value is _missing:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        metrics = _current.get()
+        if metrics is None or metrics.cache_depth:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        metrics.cache_depth += 1
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            metrics.cache_depth -= 1
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+
+    return wrapper
+
+
+_installed = False
+
+
+def install():
+    """
+    Hooks the database connections, the template backend and the configured cache backends,
+    once per process. The hooks do nothing outside of an instrumented request.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_wrap_connection, dispatch_uid="core.instrumentation")
+    Template.render = _timed_render(Template.render)
+    # the async methods of the cache backends fall back on the sync ones
+    for backend in {options["BACKEND"] for options in settings.CACHES.values()}:
+        cls = import_string(backend)
+        cls.get = _counted_get(cls.get)
+        cls.get_many = _counted_get_many(cls.get_many)
+
+
+# the budgets
+
+
+def get_budget(view_name):
+    return getattr(settings, "QUERY_BUDGETS", {}).get(view_name)
+
+
+def check_budget(view_name, metrics):
+    budget = get_budget(view_name)
+    if budget is None or metrics.queries <= budget:
+        return
+    message = f"{view_name} ran {metrics.queries} queries, its budget is {budget}"
+    action = getattr(settings, "QUERY_BUDGET_ACTION", "log")
+    if action == "raise":
+        raise QueryBudgetExceeded(message)
+    if action != "log":
+        raise ImproperlyConfigured("QUERY_BUDGET_ACTION must be 'log' or 'raise'")
+    logger.warning(message)
+
+
+# the histograms
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one counts what's over every bound
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def as_dict(self):
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {"buckets": dict(zip(labels, self.counts)), "sum": round(self.total, 3)}
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.over_budget = 0
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.db_time = Histogram(DURATION_BUCKETS)
+        self.template_time = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "over_budget": self.over_budget,
+            "duration_ms": self.duration.as_dict(),
+            "db_ms": self.db_time.as_dict(),
+            "template_ms": self.template_time.as_dict(),
+            "queries": self.queries.as_dict(),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+class MetricsRegistry:
+    """
+    The histograms of this process, per view name.
+    """
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def record(self, view_name, metrics, elapsed):
+        budget = get_budget(view_name)
+        with self._lock:
+            stats = self._views.get(view_name)
+            if stats is None:
+                stats = self._views[view_name] = ViewStats()
+            stats.requests += 1
+            stats.over_budget += budget is not None and metrics.queries > budget
+            stats.duration.observe(elapsed * 1000)
+            stats.db_time.observe(metrics.db_time * 1000)
+            stats.template_time.observe(metrics.template_time * 1000)
+            stats.queries.observe(metrics.queries)
+            stats.cache_hits += metrics.cache_hits
+            stats.cache_misses += metrics.cache_misses
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in sorted(self._views.items())}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = MetricsRegistry()
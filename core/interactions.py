@@ -0,0 +1,159 @@
+import time
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db.models import CharField, Value
+
+from .models import Favourite, ReadLater, Vote
+
+
+# per user article state (bookmarked / scheduled for later / voted): all of a user's
+# favourites, read later items and votes are loaded with a single UNION query into sets of
+# article keys, cached per user and dropped whenever one of them changes, so an article page
+# or a whole listing can answer "is this bookmarked / scheduled / voted" in memory. A per user
+# version, bumped with every change like the fragment versions (see fragments.py), lets the
+# conditional GETs tell the states apart without reading them.
+
+CACHE_KEY = "interactions:%s"
+CACHE_TIMEOUT = 60 * 60
+VERSION_KEY = "interactions:version:%s"
+VERSION_TIMEOUT = 60 * 60 * 24
+
+
+@dataclass(frozen=True)
+class ArticleState:
+    is_bookmarked: bool = False
+    is_scheduled: bool = False
+    vote: str = None  # "up", "down" or None
+
+    def __bool__(self):
+        return self.is_bookmarked or self.is_scheduled or self.vote is not None
+
+    @property
+    def upvoted(self):
+        return self.vote == "up"
+
+    @property
+    def downvoted(self):
+        return self.vote == "down"
+
+
+class UserArticleStates:
+    def __init__(self, bookmarked=(), scheduled=(), upvoted=(), downvoted=()):
+        self.bookmarked = frozenset(bookmarked)
+        self.scheduled = frozenset(scheduled)
+        self.upvoted = frozenset(upvoted)
+        self.downvoted = frozenset(downvoted)
+
+    def get(self, pk):
+        """
+        Returns the ArticleState of one article.
+        """
+        vote = "up" if pk in self.upvoted else "down" if pk in self.downvoted else None
+        return ArticleState(pk in self.bookmarked, pk in self.scheduled, vote)
+
+    def annotate(self, articles):
+        """
+        Sets a `state` attribute on each article of a page, without any query.
+        """
+        for article in articles:
+            article.state = self.get(article.pk)
+        return articles
+
+
+EMPTY = UserArticleStates()
+
+
+def _kind(value):
+    return Value(value, output_field=CharField())
+
+
+def _states_query(user):
+    return (
+        Favourite.objects.filter(user=user)
+        .values_list("post_id", _kind("bookmark"))
+        .union(
+            ReadLater.objects.filter(user=user).values_list("post_id", _kind("schedule")),
+            Vote.objects.filter(user=user).values_list("article_id", "vote_type"),
+            all=True,
+        )
+    )
+
+
+def _to_states(rows):
+    sets = {"bookmark": [], "schedule": [], "up": [], "down": []}
+    for pk, key in rows:
+        sets[key].append(pk)
+    return UserArticleStates(sets["bookmark"], sets["schedule"], sets["up"], sets["down"])
+
+
+def load_states(user):
+    """
+    Loads the user's favourites, read later items and votes in one query.
+    """
+    return _to_states(_states_query(user))
+
+
+def get_user_states(user):
+    """
+    Returns the cached UserArticleStates of the user, empty for anonymous users.
+    """
+    if not user.is_authenticated:
+        return EMPTY
+    key = CACHE_KEY % user.pk
+    states = cache.get(key)
+    if states is None:
+        states = load_states(user)
+        cache.set(key, states, CACHE_TIMEOUT)
+    return states
+
+
+async def aget_user_states(user):
+    """
+    Async version of get_user_states, the user must already be loaded (request.auser()).
+    """
+    if not user.is_authenticated:
+        return EMPTY
+    key = CACHE_KEY % user.pk
+    states = await cache.aget(key)
+    if states is None:
+        states = _to_states([row async for row in _states_query(user)])
+        await cache.aset(key, states, CACHE_TIMEOUT)
+    return states
+
+
+def get_states_version(user):
+    """
+    Returns the version of the user's states, None for anonymous users.
+    """
+    if not user.is_authenticated:
+        return None
+    key = VERSION_KEY % user.pk
+    version = cache.get(key)
+    if version is None:
+        # a fresh token, so an evicted version never matches one handed out before
+        cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+async def aget_states_version(user):
+    """
+    Async version of get_states_version.
+    """
+    if not user.is_authenticated:
+        return None
+    key = VERSION_KEY % user.pk
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), VERSION_TIMEOUT)
+        version = await cache.aget(key)
+    return version
+
+
+def invalidate_user_states(user_id):
+    cache.delete(CACHE_KEY % user_id)
+    try:
+        cache.incr(VERSION_KEY % user_id)
+    except ValueError:
+        cache.set(VERSION_KEY % user_id, time.time_ns(), VERSION_TIMEOUT)
@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .database import primary
+from .models import Favourite, ReadLater, Vote
+
+
+# the reader's library: the read later list, the saved posts and the upvoted / downvoted
+# articles are four shelves served by one view. A shelf page is a keyset page on the
+# (user, [vote type,] -timestamp, -id) index, reading only the card columns of the articles
+# with their category joined in. The number of items on each shelf is counted once, cached,
+# and then kept up to date by adding or removing one as items are added or removed (see the
+# Favourite / ReadLater / Vote signals and the vote engine), so it costs no query afterwards.
+
+COUNT_KEY = "library:%s:%s"  # shelf name, user id
+COUNT_TIMEOUT = 60 * 60 * 24  # bounds the drift of a count that missed an update
+
+# the article columns a card shows
+CARD_FIELDS = ("slug", "title", "excert", "image", "category__name")
+
+
+class Shelf:
+    """
+    The items of a model holding the reader's articles.
+
+    Args:
+        name: The url name of the shelf page.
+        title: The page title.
+        model: The model of the items.
+        article: The name of the article foreign key of the model.
+        field: The datetime field the items are ordered by, newest first.
+        filters: Lookups selecting the shelf's items among the user's.
+        empty: The message shown on an empty shelf.
+    """
+
+    def __init__(self, name, title, model, article, field, filters=None, empty=""):
+        self.name = name
+        self.title = title
+        self.model = model
+        self.article = article
+        self.field = field
+        self.filters = filters or {}
+        self.empty = empty
+
+    def items(self, user):
+        return (
+            self.model.objects.filter(user=user, **self.filters)
+            .select_related(f"{self.article}__category")
+            .only(self.field, *(f"{self.article}__{field}" for field in CARD_FIELDS))
+        )
+
+    def count(self, user):
+        return self.model.objects.filter(user=user, **self.filters).count()
+
+    def articles(self, page):
+        return [getattr(item, self.article) for item in page]
+
+
+SHELVES = {
+    shelf.name: shelf
+    for shelf in (
+        Shelf(
+            "reading_list",
+            "Reading list",
+            ReadLater,
+            "post",
+            "added_at",
+            empty="You haven't added any articles to your reading list.",
+        ),
+        Shelf(
+            "saved_posts",
+            "Saved posts",
+            Favourite,
+            "post",
+            "added_at",
+            empty="You haven't saved any articles.",
+        ),
+        Shelf(
+            "upvoted_posts",
+            "Upvoted articles",
+            Vote,
+            "article",
+            "voted_at",
+            {"vote_type": "up"},
+            empty="You haven't upvoted any articles.",
+        ),
+        Shelf(
+            "downvoted_posts",
+            "Downvoted articles",
+            Vote,
+            "article",
+            "voted_at",
+            {"vote_type": "down"},
+            empty="You haven't downvoted any articles.",
+        ),
+    )
+}
+
+# the shelf of each vote type
+VOTE_SHELVES = {"up": "upvoted_posts", "down": "downvoted_posts"}
+
+
+def get_page_size():
+    return getattr(settings, "LIBRARY_PAGE_SIZE", 12)
+
+
+def get_counts(user):
+    """
+    Returns the number of items on each shelf of the user, counting the missing ones.
+    """
+    keys = {name: COUNT_KEY % (name, user.pk) for name in SHELVES}
+    found = cache.get_many(keys.values())
+    counts = {}
+    for name, key in keys.items():
+        if key not in found:
+            with primary():
+                found[key] = SHELVES[name].count(user)
+            cache.set(key, found[key], COUNT_TIMEOUT)
+        counts[name] = found[key]
+    return counts
+
+
+def adjust_count(user_id, name, delta):
+    """
+    Adds delta to the cached count of a shelf, a count that isn't cached is left to be
+    counted on the next visit.
+    """
+    try:
+        cache.incr(COUNT_KEY % (name, user_id), delta)
+    except ValueError:
+        pass
+
+
+def reset_counts(user_id):
+    cache.delete_many([COUNT_KEY % (name, user_id) for name in SHELVES])
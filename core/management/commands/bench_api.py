@@ -0,0 +1,92 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.api import RESOURCES
+from core.benchmarks import benchmark_database, summarize
+from core.models import Article, Author, Category
+from core.seeding import DEFAULT_VOLUMES, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database and measures the throughput of the JSON API list and "
+        "detail endpoints, and of the serialization alone."
+    )
+
+    def add_arguments(self, parser):
+        for name, count in DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=count)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--requests", type=int, default=200, help="requests per case")
+        parser.add_argument("--limit", type=int, default=100, help="rows per list page")
+
+    def handle(self, *args, **options):
+        volumes = {name: options[name] for name in DEFAULT_VOLUMES}
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=["*"]):
+            seed(volumes, seed=options["seed"])
+            self.stdout.write("Endpoints (full requests, no revalidation):")
+            for case, url in self.cases(options["limit"]):
+                self.measure(case, url, options["requests"])
+            self.stdout.write("Serialization alone:")
+            self.serialization(options["limit"], options["requests"])
+
+    def cases(self, limit):
+        article = Article.objects.annotate(comments_count=Count("comments")).order_by(
+            "-comments_count"
+        ).first()
+        category = Category.objects.order_by("pk").first()
+        author = Author.objects.order_by("pk").first()
+        articles = reverse("api_articles")
+        comments = reverse("api_comments", kwargs={"slug": article.slug})
+        detail = reverse("api_article", kwargs={"slug": article.slug})
+        return [
+            ("articles", f"{articles}?limit={limit}"),
+            ("articles+include", f"{articles}?limit={limit}&include=author,category"),
+            ("articles sparse", f"{articles}?limit={limit}&fields=slug,title"),
+            ("articles of category", f"{articles}?limit={limit}&category={category.name}"),
+            ("comments", f"{comments}?limit={limit}"),
+            ("categories", reverse("api_categories")),
+            ("article", detail),
+            ("article+include", f"{detail}?include=author,category"),
+            ("author", reverse("api_author", kwargs={"username": author.username})),
+        ]
+
+    def measure(self, case, url, requests):
+        client = Client()
+        client.get(url)  # warms the versions and the url prefixes up
+        samples, items = [], 0
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(url)
+            samples.append(time.perf_counter() - started)
+            data = json.loads(response.content)["data"]
+            items += len(data) if isinstance(data, list) else 1
+        elapsed = sum(samples)
+        stats = summarize(samples)
+        self.stdout.write(
+            f"  {case:<22} {requests / elapsed:>8.0f} req/s {items / elapsed:>9.0f} items/s  "
+            f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms"
+        )
+
+    def serialization(self, limit, requests):
+        # the rows are read once, only turning them into JSON is timed
+        resource = RESOURCES["articles"]
+        for label, params, many in (
+            ("list rows", {}, True),
+            ("list rows+include", {"include": "author,category"}, True),
+            ("detail rows", {"include": "author,category"}, False),
+        ):
+            names, embedded = resource.select(params, many)
+            columns = resource.columns(names, embedded, many)
+            rows = list(Article.objects.order_by("-created_at").values(*columns)[:limit])
+            serialize = resource.serializer(names, embedded, "http://testserver")
+            started = time.perf_counter()
+            for _ in range(requests):
+                json.dumps([serialize(row) for row in rows])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {label:<22} {requests * len(rows) / elapsed:>9.0f} items/s")
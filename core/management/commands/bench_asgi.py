@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+
+from core.benchmarks import benchmark_database, summarize
+from core.models import Article, Author, Category, Comment, Testimonial
+
+
+class Command(BaseCommand):
+    help = "Compares the read views served through the WSGI and the ASGI handler under concurrent load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=1000, help="requests per path")
+        parser.add_argument(
+            "--paths", nargs="+", default=["/", "/blog/", "/blog/article/article-0"]
+        )
+
+    def handle(self, *args, **options):
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=["*"]):
+            connection.settings_dict["OPTIONS"]["timeout"] = 30
+            self.setup()
+            for path in options["paths"]:
+                self.report("wsgi", path, *self.run_wsgi(path, options))
+                self.report("asgi", path, *asyncio.run(self.run_asgi(path, options)))
+
+    def setup(self):
+        category = Category.objects.create(name="bench", description="bench")
+        author = Author.objects.create(username="bench", name="bench", description="-")
+        Testimonial.objects.create(
+            name="bench", description="-", content="-", image="articles_images/Algeria.jpg"
+        )
+        articles = [
+            Article.objects.create(
+                slug=f"article-{i}",
+                title=f"article {i}",
+                excert="-",
+                content="lorem ipsum " * 200,
+                image="articles_images/Algeria.jpg",
+                category=category,
+                author=author,
+            )
+            for i in range(50)
+        ]
+        reader = get_user_model().objects.create(username="reader")
+        Comment.objects.bulk_create(
+            Comment(article=articles[0], user=reader, content=f"comment {i}")
+            for i in range(30)
+        )
+
+    def run_wsgi(self, path, options):
+        per_thread = options["requests"] // options["concurrency"]
+        samples, errors = [], []
+        lock = threading.Lock()
+
+        def worker():
+            client = Client()
+            local = []
+            try:
+                for _ in range(per_thread):
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    local.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f"{path} answered {response.status_code}")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+            with lock:
+                samples.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise CommandError(f"wsgi {path}: {errors[0]!r}")
+        return samples, time.perf_counter() - started
+
+    async def run_asgi(self, path, options):
+        per_task = options["requests"] // options["concurrency"]
+        samples = []
+
+        async def worker():
+            client = AsyncClient()
+            for _ in range(per_task):
+                started = time.perf_counter()
+                response = await client.get(path)
+                samples.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"{path} answered {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options["concurrency"])))
+        return samples, time.perf_counter() - started
+
+    def report(self, label, path, samples, elapsed):
+        stats = summarize(samples)
+        self.stdout.write(
+            f"{label} {path:<28} {len(samples) / elapsed:7.0f} req/s  p50={stats['p50_ms']}ms "
+            f"p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms"
+        )
@@ -0,0 +1,180 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from core.benchmarks import benchmark_database, summarize
+from core.seeding import DEFAULT_VOLUMES, seed
+
+# the string keyed layout the models had before the integer keys, copied from the seeded
+# tables with the same indexes Django created for them (one per foreign key plus the
+# composite and unique ones), keys mapped to the article slug, category name and username
+LEGACY_SCHEMA = (
+    "CREATE TABLE legacy_category (name varchar(32) NOT NULL PRIMARY KEY)",
+    "CREATE TABLE legacy_author (username varchar(32) NOT NULL PRIMARY KEY)",
+    """CREATE TABLE legacy_article (
+        slug varchar(256) NOT NULL PRIMARY KEY,
+        title varchar(256) NOT NULL,
+        created_at datetime NOT NULL,
+        category_id varchar(32) NOT NULL REFERENCES legacy_category (name),
+        author_id varchar(32) NOT NULL REFERENCES legacy_author (username)
+    )""",
+    "CREATE INDEX legacy_article_category ON legacy_article (category_id)",
+    "CREATE INDEX legacy_article_author ON legacy_article (author_id)",
+    "CREATE INDEX legacy_article_created ON legacy_article (created_at DESC, slug DESC)",
+    """CREATE TABLE legacy_comment (
+        id integer NOT NULL PRIMARY KEY,
+        article_id varchar(256) NOT NULL REFERENCES legacy_article (slug),
+        user_id integer NOT NULL,
+        created_at datetime NOT NULL
+    )""",
+    "CREATE INDEX legacy_comment_article ON legacy_comment (article_id)",
+    "CREATE INDEX legacy_comment_user ON legacy_comment (user_id)",
+    "CREATE INDEX legacy_comment_page ON legacy_comment (article_id, created_at DESC, id DESC)",
+    """CREATE TABLE legacy_vote (
+        id integer NOT NULL PRIMARY KEY,
+        user_id integer NOT NULL,
+        article_id varchar(256) NOT NULL REFERENCES legacy_article (slug),
+        vote_type varchar(4) NOT NULL,
+        UNIQUE (user_id, article_id)
+    )""",
+    "CREATE INDEX legacy_vote_user ON legacy_vote (user_id)",
+    "CREATE INDEX legacy_vote_article ON legacy_vote (article_id)",
+    """CREATE TABLE legacy_favourite (
+        id integer NOT NULL PRIMARY KEY,
+        user_id integer NOT NULL,
+        post_id varchar(256) NOT NULL REFERENCES legacy_article (slug),
+        UNIQUE (user_id, post_id)
+    )""",
+    "CREATE INDEX legacy_favourite_user ON legacy_favourite (user_id)",
+    "CREATE INDEX legacy_favourite_post ON legacy_favourite (post_id)",
+)
+
+LEGACY_COPY = (
+    "INSERT INTO legacy_category SELECT name FROM core_category",
+    "INSERT INTO legacy_author SELECT username FROM core_author",
+    """INSERT INTO legacy_article
+        SELECT a.slug, a.title, a.created_at, c.name, au.username FROM core_article a
+        JOIN core_category c ON c.id = a.category_id JOIN core_author au ON au.id = a.author_id""",
+    """INSERT INTO legacy_comment
+        SELECT m.id, a.slug, m.user_id, m.created_at FROM core_comment m
+        JOIN core_article a ON a.id = m.article_id""",
+    """INSERT INTO legacy_vote
+        SELECT v.id, v.user_id, a.slug, v.vote_type FROM core_vote v
+        JOIN core_article a ON a.id = v.article_id""",
+    """INSERT INTO legacy_favourite
+        SELECT f.id, f.user_id, a.slug FROM core_favourite f
+        JOIN core_article a ON a.id = f.post_id""",
+)
+
+# (table of the integer layout, its legacy copy)
+TABLES = (
+    ("core_article", "legacy_article"),
+    ("core_comment", "legacy_comment"),
+    ("core_vote", "legacy_vote"),
+    ("core_favourite", "legacy_favourite"),
+)
+
+# the joins the pages run, once per layout
+JOINS = {
+    "comments per category": (
+        """SELECT c.id, COUNT(*) FROM core_comment m
+           JOIN core_article a ON a.id = m.article_id
+           JOIN core_category c ON c.id = a.category_id GROUP BY c.id""",
+        """SELECT a.category_id, COUNT(*) FROM legacy_comment m
+           JOIN legacy_article a ON a.slug = m.article_id GROUP BY a.category_id""",
+    ),
+    "votes per article": (
+        """SELECT a.id, a.title, COUNT(*) FROM core_vote v
+           JOIN core_article a ON a.id = v.article_id GROUP BY a.id""",
+        """SELECT a.slug, a.title, COUNT(*) FROM legacy_vote v
+           JOIN legacy_article a ON a.slug = v.article_id GROUP BY a.slug""",
+    ),
+    "favourites of a reader": (
+        """SELECT a.id, a.title, c.name FROM core_favourite f
+           JOIN core_article a ON a.id = f.post_id
+           JOIN core_category c ON c.id = a.category_id WHERE f.user_id = %(user)s""",
+        """SELECT a.slug, a.title, a.category_id FROM legacy_favourite f
+           JOIN legacy_article a ON a.slug = f.post_id WHERE f.user_id = %(user)s""",
+    ),
+    "latest comments of an article": (
+        """SELECT m.id FROM core_comment m JOIN core_article a ON a.id = m.article_id
+           WHERE a.slug = %(slug)s ORDER BY m.created_at DESC, m.id DESC LIMIT 5""",
+        """SELECT m.id FROM legacy_comment m WHERE m.article_id = %(slug)s
+           ORDER BY m.created_at DESC, m.id DESC LIMIT 5""",
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the index sizes and join times of the integer primary keys with the string "
+        "keys (article slug, category name, author username) used before."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--articles", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=100000)
+        parser.add_argument("--votes", type=int, default=50000)
+        parser.add_argument("--favourites", type=int, default=20000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        volumes = dict(DEFAULT_VOLUMES)
+        for name in ("articles", "comments", "votes", "favourites", "users"):
+            volumes[name] = options[name]
+        with benchmark_database():
+            seed(volumes, seed=options["seed"])
+            with connection.cursor() as cursor:
+                for sql in LEGACY_SCHEMA + LEGACY_COPY:
+                    cursor.execute(sql)
+                cursor.execute("ANALYZE")
+                self.report_sizes(cursor)
+                self.report_joins(cursor, options["repeat"])
+
+    def report_sizes(self, cursor):
+        try:
+            cursor.execute("SELECT COUNT(*) FROM dbstat")
+        except DatabaseError:
+            self.stdout.write("SQLite was built without dbstat, the sizes are skipped")
+            return
+        self.stdout.write("Index size (KiB)           integer keys      string keys")
+        for current, legacy in TABLES:
+            sizes = [self.index_size(cursor, table) / 1024 for table in (current, legacy)]
+            self.stdout.write(f"  {current[5:]:<29} {sizes[0]:>10.0f} {sizes[1]:>16.0f}")
+
+    def index_size(self, cursor, table):
+        # every index on the table, the implicit (primary and unique key) ones included
+        cursor.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+            [table],
+        )
+        return cursor.fetchone()[0] or 0
+
+    def report_joins(self, cursor, repeat):
+        cursor.execute(
+            "SELECT user_id FROM core_favourite GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1"
+        )
+        user = (cursor.fetchone() or (0,))[0]
+        cursor.execute(
+            "SELECT a.slug FROM core_comment m JOIN core_article a ON a.id = m.article_id "
+            "GROUP BY a.id ORDER BY COUNT(*) DESC LIMIT 1"
+        )
+        slug = (cursor.fetchone() or ("",))[0]
+        params = {"user": user, "slug": slug}
+
+        self.stdout.write("Joins                      integer keys      string keys")
+        for label, queries in JOINS.items():
+            figures = []
+            for sql in queries:
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    samples.append(time.perf_counter() - started)
+                figures.append(summarize(samples)["p50_ms"])
+            self.stdout.write(f"  {label:<30} p50={figures[0]:>7}ms p50={figures[1]:>7}ms")
@@ -0,0 +1,125 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core.benchmarks import benchmark_database
+from core.models import Newsletter, NewsletterDelivery, Subscriber
+from core.newsletters import NewsletterEngine
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # just enough SMTP to accept and count messages, with an optional per message delay
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 localhost bench")
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    time.sleep(self.server.delay)
+                    with self.server.lock:
+                        self.server.messages += 1
+                    self.reply("250 OK")
+                continue
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 localhost")
+            elif command == b"DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, delay):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+
+class Command(BaseCommand):
+    help = "Sends a newsletter to many subscribers through a local SMTP stand-in."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=2000)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--delay", type=float, default=2.0, help="milliseconds the server spends per message"
+        )
+        parser.add_argument(
+            "--naive",
+            action="store_true",
+            help="also time one send_mail() (and connection) per subscriber for comparison",
+        )
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(options["delay"] / 1000)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        email_settings = {
+            "EMAIL_BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+            "EMAIL_HOST": "127.0.0.1",
+            "EMAIL_PORT": sink.server_address[1],
+            "EMAIL_USE_TLS": False,
+            "EMAIL_USE_SSL": False,
+            "EMAIL_HOST_USER": "",
+            "EMAIL_HOST_PASSWORD": "",
+            "NEWSLETTER_SEND_ON_SAVE": False,
+        }
+        try:
+            with benchmark_database(), override_settings(**email_settings):
+                Subscriber.objects.bulk_create(
+                    Subscriber(email=f"reader{i}@example.com")
+                    for i in range(options["subscribers"])
+                )
+                newsletter = Newsletter.objects.create(
+                    subject="Bench", message="<p>Hello <b>reader</b> &amp; welcome</p>" * 20
+                )
+                if options["naive"]:
+                    self.naive(newsletter, sink)
+                self.engine(newsletter, sink, options)
+        finally:
+            sink.shutdown()
+            sink.server_close()
+
+    def naive(self, newsletter, sink):
+        connections, messages = sink.connections, sink.messages
+        started = time.perf_counter()
+        for email in Subscriber.objects.values_list("email", flat=True):
+            send_mail(newsletter.subject, newsletter.message, None, [email])
+        elapsed = time.perf_counter() - started
+        self.report("naive", sink.messages - messages, 0, elapsed, sink.connections - connections)
+
+    def engine(self, newsletter, sink, options):
+        connections = sink.connections
+        engine = NewsletterEngine(workers=options["workers"], batch_size=options["batch_size"])
+        stats = engine.send(newsletter)
+        self.report("engine", stats.sent, stats.failed, stats.elapsed, sink.connections - connections)
+        # a second run resumes nothing once every delivery went out
+        unsent = NewsletterDelivery.objects.exclude(status=NewsletterDelivery.SENT).count()
+        resumed = engine.send(newsletter)
+        self.stdout.write(f"unsent deliveries: {unsent}, sent again on resume: {resumed.sent}")
+
+    def report(self, label, sent, failed, elapsed, connections):
+        self.stdout.write(
+            f"{label:<7} {sent} sent, {failed} failed in {elapsed:.2f}s "
+            f"({sent / elapsed if elapsed else 0:.0f}/s) over {connections} SMTP connections"
+        )
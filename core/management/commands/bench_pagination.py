@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.utils import timezone
+
+from core.benchmarks import benchmark_database, explicit_timestamps, summarize
+from core.models import Article, Author, Category, Comment
+from core.pagination import CursorPaginator, encode_cursor
+
+
+class Command(BaseCommand):
+    help = "Compares offset and cursor pagination at increasing page depths."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--articles", type=int, default=100000)
+        parser.add_argument("--comments", type=int, default=100000)
+        parser.add_argument("--per-page", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.seed(options)
+            per_page = options["per_page"]
+            article = Article.objects.earliest("created_at")
+            targets = {
+                "articles": Article.objects.select_related("author", "category"),
+                "comments": Comment.objects.select_related("user").filter(article=article),
+            }
+            for label, queryset in targets.items():
+                total = queryset.count()
+                self.stdout.write(f"{label} ({total} rows, {per_page} per page)")
+                depth = 1
+                while (depth - 1) * per_page < total:
+                    self.measure(queryset, per_page, depth, options["repeat"])
+                    depth *= 10
+                self.measure(queryset, per_page, total // per_page, options["repeat"])
+
+    def measure(self, queryset, per_page, number, repeat):
+        offset_samples, cursor_samples = [], []
+        paginator = Paginator(queryset.order_by("-created_at", "-pk"), per_page)
+        # the cursor a reader would carry over from the previous page
+        cursor = None
+        if number > 1:
+            previous = queryset.order_by("-created_at", "-pk")[(number - 1) * per_page - 1]
+            cursor = encode_cursor(previous)
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(paginator.page(number))
+            offset_samples.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            list(CursorPaginator(queryset, per_page).page(after=cursor, number=number))
+            cursor_samples.append(time.perf_counter() - started)
+
+        offset, keyset = summarize(offset_samples), summarize(cursor_samples)
+        self.stdout.write(
+            f"  page {number:>6}: offset p50={offset['p50_ms']}ms "
+            f"cursor p50={keyset['p50_ms']}ms"
+        )
+
+    def seed(self, options):
+        User = get_user_model()
+        user = User.objects.create(username="reader")
+        category = Category.objects.create(name="bench", description="bench")
+        author = Author.objects.create(username="bench", name="bench", description="-")
+        start = timezone.now() - timedelta(days=365)
+        with explicit_timestamps(Article, Comment):
+            Article.objects.bulk_create(
+                (
+                    Article(
+                        slug=f"article-{i}",
+                        title=f"article {i}",
+                        excert="-",
+                        content="x" * 2048,
+                        category=category,
+                        author=author,
+                        created_at=start + timedelta(minutes=i),
+                    )
+                    for i in range(options["articles"])
+                ),
+                batch_size=2000,
+            )
+            article = Article.objects.get(slug="article-0")
+            Comment.objects.bulk_create(
+                (
+                    Comment(
+                        article=article,
+                        user=user,
+                        content=f"comment {i}",
+                        created_at=start + timedelta(seconds=i),
+                    )
+                    for i in range(options["comments"])
+                ),
+                batch_size=2000,
+            )
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from request.models import Request
+
+from core.benchmarks import benchmark_database, summarize
+from core.middleware import request_log
+from core.models import Article, Author, Category
+
+MIDDLEWARES = {
+    "django-request": "request.middleware.RequestMiddleware",
+    "buffered": "core.middleware.BufferedRequestMiddleware",
+}
+
+
+class Command(BaseCommand):
+    help = "Compares request latency with django-request's middleware and the buffered one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=200, help="requests per thread")
+        parser.add_argument("--path", default="/blog/")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            connection.settings_dict["OPTIONS"]["timeout"] = 30
+            category = Category.objects.create(name="bench", description="bench")
+            author = Author.objects.create(username="bench", name="bench", description="-")
+            for i in range(20):
+                Article.objects.create(
+                    slug=f"article-{i}",
+                    title=f"article {i}",
+                    excert="-",
+                    content="-",
+                    image="articles_images/Algeria.jpg",
+                    category=category,
+                    author=author,
+                )
+            for label, middleware in MIDDLEWARES.items():
+                self.run(label, middleware, options)
+
+    def run(self, label, middleware, options):
+        logging_middlewares = set(MIDDLEWARES.values())
+        stack = [m for m in settings.MIDDLEWARE if m not in logging_middlewares]
+        stack.append(middleware)
+        Request.objects.all().delete()
+        samples, errors = [], []
+        lock = threading.Lock()
+
+        def worker():
+            client = Client()
+            local = []
+            try:
+                for _ in range(options["requests"]):
+                    started = time.perf_counter()
+                    response = client.get(options["path"])
+                    local.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(f"{options['path']} answered {response.status_code}")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+            with lock:
+                samples.extend(local)
+
+        with override_settings(MIDDLEWARE=stack, ALLOWED_HOSTS=["*"]):
+            threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            request_log.drain()
+
+        if errors:
+            raise CommandError(f"{label}: {errors[0]!r}")
+        stats = summarize(samples)
+        self.stdout.write(
+            f"{label:<15} {len(samples) / elapsed:7.0f} req/s  p50={stats['p50_ms']}ms "
+            f"p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms  "
+            f"logged={Request.objects.count()} dropped={request_log.dropped}"
+        )
@@ -0,0 +1,84 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import benchmark_database, summarize
+from core.models import Article, Author, Category
+from core.suggestions import build_trie, get_limit
+
+
+class Command(BaseCommand):
+    help = "Measures the build time, memory and lookup latency of the suggestion trie."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="500,5000,50000",
+            help="comma separated article counts to measure at",
+        )
+        parser.add_argument("--repeat", type=int, default=1000, help="runs per query")
+        parser.add_argument("--vocabulary", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        # zipf-like vocabulary so a few words are very common and most are rare
+        words = [self.word(rng) for _ in range(options["vocabulary"])]
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+        queries = {
+            "one letter": words[0][:1],
+            "prefix": words[10][:3],
+            "common word": words[0],
+            "rare word": words[-1],
+            "two words": f"{words[0]} {words[1][:2]}",
+        }
+
+        with benchmark_database():
+            category = Category.objects.create(name="bench", description="bench")
+            author = Author.objects.create(username="bench", name="bench", description="-")
+            total = 0
+            for size in sorted(int(s) for s in options["sizes"].split(",")):
+                Article.objects.bulk_create(
+                    (
+                        Article(
+                            slug=f"article-{i}",
+                            title=" ".join(rng.choices(words, weights, k=6)),
+                            excert="-",
+                            content="-",
+                            category=category,
+                            author=author,
+                        )
+                        for i in range(total, size)
+                    ),
+                    batch_size=2000,
+                )
+                total = size
+                started = time.perf_counter()
+                trie = build_trie(get_limit())
+                elapsed = time.perf_counter() - started
+                # built again to trace its memory, tracing slows the build down
+                del trie
+                tracemalloc.start()
+                trie = build_trie(get_limit())
+                memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+                self.stdout.write(
+                    f"{size} articles: trie built in {elapsed:.2f}s, "
+                    f"{memory / 2**20:.1f} MiB"
+                )
+                for label, query in queries.items():
+                    samples = []
+                    for _ in range(options["repeat"]):
+                        started = time.perf_counter()
+                        trie.suggest(query, get_limit())
+                        samples.append(time.perf_counter() - started)
+                    stats = summarize(samples)
+                    self.stdout.write(
+                        f"  {label:<12} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms"
+                    )
+
+    @staticmethod
+    def word(rng):
+        return "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(4, 9)))
@@ -0,0 +1,150 @@
+import json
+import platform
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmarks import benchmark_database, summarize, view_cases
+from core.instrumentation import get_budget
+from core.seeding import DEFAULT_VOLUMES, seed
+
+# the latency budgets per case, the query budgets are the QUERY_BUDGETS of the settings
+DEFAULT_BUDGETS = settings.BASE_DIR / "core" / "view_budgets.json"
+# --update-budgets leaves this much room over the measured p95, timings are noisy
+LATENCY_HEADROOM = 3
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database and measures the queries, latency and size of every named "
+        "view, optionally against stored budgets."
+    )
+
+    def add_arguments(self, parser):
+        for name, count in DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=count)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--requests", type=int, default=20, help="measured requests per case")
+        parser.add_argument("--output", help="writes the results to this JSON file")
+        parser.add_argument("--budgets", default=str(DEFAULT_BUDGETS))
+        parser.add_argument(
+            "--check", action="store_true", help="fails when a view goes over its budget"
+        )
+        parser.add_argument(
+            "--update-budgets",
+            action="store_true",
+            help="stores the measured p95 latencies as the new latency budgets",
+        )
+
+    def handle(self, *args, **options):
+        volumes = {name: options[name] for name in DEFAULT_VOLUMES}
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=["*"]):
+            seed(volumes, seed=options["seed"])
+            results = self.run(options["requests"])
+
+        for case, result in results.items():
+            self.stdout.write(
+                f"{case:<32} {result['status']} {result['queries']:>3} queries "
+                f"(cold {result['cold_queries']:>3})  p50={result['p50_ms']}ms "
+                f"p95={result['p95_ms']}ms  {result['bytes']} bytes"
+            )
+
+        if options["output"]:
+            report = {
+                "meta": {
+                    "volumes": volumes,
+                    "seed": options["seed"],
+                    "requests": options["requests"],
+                    "django": django.get_version(),
+                    "python": platform.python_version(),
+                },
+                "results": results,
+            }
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if options["update_budgets"]:
+            budgets = {
+                case: {"p95_ms": round(max(result["p95_ms"] * LATENCY_HEADROOM, 10), 1)}
+                for case, result in results.items()
+            }
+            with open(options["budgets"], "w") as file:
+                json.dump(budgets, file, indent=2, sort_keys=True)
+                file.write("\n")
+            self.stdout.write(self.style.SUCCESS(f"Updated {options['budgets']}"))
+        elif options["check"]:
+            self.check_budgets(results, options["budgets"])
+
+    def run(self, requests):
+        user = get_user_model().objects.filter(username__startswith="reader").first()
+        if user is None:
+            raise CommandError("The authenticated cases need at least one seeded user")
+        results = {}
+        for case, client, url in view_cases(user):
+            # the first request fills the caches, it's reported on its own
+            with CaptureQueriesContext(connection) as cold:
+                response = self.fetch(client, url)
+            samples, queries = [], 0
+            for _ in range(requests):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = self.fetch(client, url)
+                    samples.append(time.perf_counter() - started)
+                queries = max(queries, len(captured))
+            if response.status_code >= 400:
+                raise CommandError(f"{case} ({url}) answered {response.status_code}")
+            stats = summarize(samples)
+            results[case] = {
+                "url": url,
+                "status": response.status_code,
+                "cold_queries": len(cold),
+                "queries": queries,
+                "p50_ms": stats["p50_ms"],
+                "p95_ms": stats["p95_ms"],
+                "bytes": response.bytes,
+            }
+        return results
+
+    def fetch(self, client, url):
+        response = client.get(url)
+        # FileResponse and the like only get read when they're consumed
+        if response.streaming:
+            response.bytes = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            response.bytes = len(response.content)
+        return response
+
+    def check_budgets(self, results, path):
+        try:
+            with open(path) as file:
+                budgets = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(f"No budgets at {path}, create them with --update-budgets")
+
+        violations = []
+        for case, result in results.items():
+            # the cold request fills the caches and runs the most queries
+            view_name = case.split(":")[0]
+            queries = max(result["queries"], result["cold_queries"])
+            query_budget = get_budget(view_name)
+            if query_budget is None:
+                self.stdout.write(self.style.WARNING(f"{view_name} has no QUERY_BUDGETS entry"))
+            elif queries > query_budget:
+                violations.append(f"{case}: {queries} queries, the budget is {query_budget}")
+            budget = budgets.get(case)
+            if budget is None:
+                self.stdout.write(self.style.WARNING(f"{case} has no latency budget"))
+            elif result["p95_ms"] > budget["p95_ms"]:
+                violations.append(
+                    f"{case}: p95 of {result['p95_ms']}ms, the budget is {budget['p95_ms']}ms"
+                )
+        if violations:
+            raise CommandError("Over budget:\n" + "\n".join(violations))
+        self.stdout.write(self.style.SUCCESS(f"All {len(results)} cases within budget"))
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+
+from core.benchmarks import benchmark_database, summarize
+from core.models import Article, Author, Category, Vote
+from core.votes import VoteEngine
+
+
+class Command(BaseCommand):
+    help = "Hammers one article with concurrent votes and checks the counters stay exact."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--votes", type=int, default=5, help="votes cast per user")
+        parser.add_argument("--batch-size", type=int, default=64)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--legacy",
+            action="store_true",
+            help="also run the old load/mutate/save() voting for comparison",
+        )
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            # waiting on the write lock instead of failing fast under contention
+            connection.settings_dict["OPTIONS"]["timeout"] = 30
+            self.setup()
+            self.run("engine", self.engine_vote, options)
+            if options["legacy"]:
+                self.run("legacy", self.legacy_vote, options)
+
+    def setup(self):
+        category = Category.objects.create(name="bench", description="bench")
+        author = Author.objects.create(username="bench", name="bench", description="-")
+        self.article = Article.objects.create(
+            slug="viral",
+            title="viral",
+            excert="-",
+            content="x" * 8192,
+            category=category,
+            author=author,
+        )
+
+    def run(self, label, vote, options):
+        User = get_user_model()
+        User.objects.filter(username__startswith="voter").delete()
+        Vote.objects.all().delete()
+        Article.objects.filter(pk=self.article.pk).update(upvote=0, downvote=0)
+        User.objects.bulk_create(
+            User(username=f"voter{i}") for i in range(options["users"])
+        )
+        users = list(User.objects.filter(username__startswith="voter"))
+
+        rng = random.Random(options["seed"])
+        plan = [(user, rng.choice(["up", "down"])) for user in users for _ in range(options["votes"])]
+        rng.shuffle(plan)
+
+        self.engine = VoteEngine(batch_size=options["batch_size"], flush_interval=60)
+        samples = []
+        samples_lock = threading.Lock()
+        errors = []
+        locked = []
+
+        def worker(chunk):
+            local = []
+            failed = 0
+            try:
+                for user, vote_type in chunk:
+                    started = time.perf_counter()
+                    try:
+                        vote(user, vote_type)
+                    except OperationalError:
+                        # "database is locked": the vote is lost, as it was for the reader
+                        failed += 1
+                        continue
+                    local.append(time.perf_counter() - started)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                close_old_connections()
+                connection.close()
+            with samples_lock:
+                samples.extend(local)
+                locked.append(failed)
+
+        threads = [
+            threading.Thread(target=worker, args=(plan[i :: options["threads"]],))
+            for i in range(options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.engine.flush()
+        elapsed = time.perf_counter() - started
+
+        if errors:
+            raise CommandError(f"{label}: {len(errors)} worker(s) failed: {errors[0]!r}")
+
+        article = Article.objects.get(pk=self.article.pk)
+        expected_up = Vote.objects.filter(article=article, vote_type="up").count()
+        expected_down = Vote.objects.filter(article=article, vote_type="down").count()
+        exact = (article.upvote, article.downvote) == (expected_up, expected_down)
+
+        stats = summarize(samples)
+        failed = sum(locked)
+        self.stdout.write(
+            f"{label}: {len(plan)} votes in {elapsed:.2f}s "
+            f"({len(plan) / elapsed:.0f} votes/s) "
+            f"p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms, "
+            f"{failed} failed on a locked database"
+        )
+        message = (
+            f"{label}: counters up={article.upvote} down={article.downvote}, "
+            f"votes up={expected_up} down={expected_down}"
+        )
+        self.stdout.write(self.style.SUCCESS(message) if exact else self.style.ERROR(message))
+        if label == "engine" and not exact:
+            raise CommandError("vote counters drifted from the recorded votes")
+        if label == "engine" and failed:
+            raise CommandError(f"{failed} engine vote(s) failed on a locked database")
+
+    def engine_vote(self, user, vote_type):
+        article = Article.objects.only("pk", "upvote", "downvote").get(pk=self.article.pk)
+        self.engine.cast(user, article, vote_type)
+
+    def legacy_vote(self, user, vote_type):
+        # the pre vote-engine algorithm from ArticleView.post
+        article = Article.objects.get(pk=self.article.pk)
+        user_vote, created = Vote.objects.get_or_create(
+            user=user, article=article, defaults={"vote_type": vote_type}
+        )
+        if not created:
+            if user_vote.vote_type != vote_type:
+                if vote_type == "up":
+                    article.upvote += 1
+                    article.downvote -= 1
+                else:
+                    article.upvote -= 1
+                    article.downvote += 1
+                user_vote.vote_type = vote_type
+                user_vote.save()
+        else:
+            if vote_type == "up":
+                article.upvote += 1
+            else:
+                article.downvote += 1
+        article.save()
@@ -0,0 +1,115 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmarks import benchmark_database, view_cases
+from core.seeding import DEFAULT_VOLUMES, seed
+
+# tables that stay a few dozen rows long (edited by hand in the admin), scanning them is fine
+SMALL_TABLES = {"core_author", "core_category", "core_testimonial", "django_site"}
+
+# the queries meant to read a whole table, they run once per cache period or process
+WHOLE_TABLE_READS = (
+    # the featured article pool, see core/featured.py
+    'SELECT "core_article"."id", "core_article"."upvote", "core_article"."downvote" '
+    'FROM "core_article" ORDER BY "core_article"."id" ASC',
+    # the suggestion trie, built once per process, see core/suggestions.py
+    'SELECT "core_article"."id", "core_article"."title", "core_article"."slug" '
+    'FROM "core_article" ORDER BY "core_article"."id" DESC',
+)
+
+# the queries that sort an index range rather than a table: the completions of a search box
+# prefix, most frequent first (see core/search.py), only the terms starting with it get sorted
+RANGE_SORTS = (
+    'SELECT "core_searchterm"."term", "core_searchterm"."documents" FROM "core_searchterm" '
+    'WHERE ("core_searchterm"."term" >= ',
+)
+
+# a table read from start to end without an index ("SCAN core_article"; a walk along an
+# index, "SCAN ... USING INDEX", stops early on a LIMIT and is allowed), or a sort of the
+# rows in a temporary b-tree instead of reading them in index order
+FULL_SCAN = re.compile(r"^SCAN (?P<table>\w+)(?: AS \w+)?$")
+TABLE = re.compile(r"^(?:SCAN|SEARCH) (?P<table>\w+)")
+TEMP_SORT = "USE TEMP B-TREE"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database, runs EXPLAIN QUERY PLAN on the queries of every named "
+        "view and fails when one scans a whole table or sorts in a temporary b-tree."
+    )
+
+    def add_arguments(self, parser):
+        for name, count in DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=count)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="runs ANALYZE first, the planner then uses the table statistics",
+        )
+
+    def handle(self, *args, **options):
+        volumes = {name: options[name] for name in DEFAULT_VOLUMES}
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=["*"]):
+            seed(volumes, seed=options["seed"])
+            if options["analyze"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+            problems = self.run(options["verbosity"])
+
+        if problems:
+            raise CommandError(
+                f"{len(problems)} queries without a usable index:\n\n" + "\n\n".join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS("Every query plan uses an index"))
+
+    def run(self, verbosity):
+        user = get_user_model().objects.filter(username__startswith="reader").first()
+        if user is None:
+            raise CommandError("The authenticated cases need at least one seeded user")
+        problems, explained = [], set()
+        for case, client, url in view_cases(user):
+            # the first request runs the queries whose results get cached, the second the
+            # ones of every request, both are checked
+            with CaptureQueriesContext(connection) as captured:
+                for _ in range(2):
+                    client.get(url).close()
+            checked = 0
+            for query in captured:
+                sql = query["sql"]
+                if not sql.startswith("SELECT") or sql in explained or sql in WHOLE_TABLE_READS:
+                    continue
+                explained.add(sql)
+                checked += 1
+                plan = self.explain(sql)
+                if verbosity > 1:
+                    self.stdout.write(f"{case}: {sql}\n    " + "\n    ".join(plan))
+                issues = self.issues(plan, sorts=sql.startswith(RANGE_SORTS))
+                if issues:
+                    problems.append(
+                        f"{case} ({', '.join(issues)}):\n{sql}\n    " + "\n    ".join(plan)
+                    )
+            self.stdout.write(f"{case:<32} {checked} new queries explained")
+        return problems
+
+    def explain(self, sql):
+        # the captured sql has its parameters inlined, quoted the way SQLite reads them
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[3] for row in cursor.fetchall()]
+
+    def issues(self, plan, sorts=False):
+        tables = {match["table"] for match in map(TABLE.match, plan) if match}
+        issues = []
+        for detail in plan:
+            match = FULL_SCAN.match(detail)
+            if match and match["table"] not in SMALL_TABLES:
+                issues.append(f"full scan of {match['table']}")
+            elif detail.startswith(TEMP_SORT) and not sorts and not tables <= SMALL_TABLES:
+                issues.append(detail.lower())
+        return issues
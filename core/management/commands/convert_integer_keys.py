@@ -0,0 +1,255 @@
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+
+from core.models import Article, Author, Category, Testimonial, Vote
+
+# the models that used their lookup column as primary key, and that column
+CONVERTED = {Author: "username", Category: "name", Testimonial: "name", Article: "slug"}
+
+
+# the value of a column added to an existing table, where the field default would be wrong:
+# an old vote was cast after its article was published, the earliest time it can have (a
+# conversion date would put every old vote in the trending window)
+BACKFILL = {
+    (Vote, "voted_at"): lambda: Subquery(
+        Article.objects.filter(pk=OuterRef("article")).values("created_at")[:1]
+    ),
+}
+
+
+class DryRun(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts a database created with the string primary keys (article slug, category and "
+        "testimonial name, author username) to the integer keys, and adds the columns and "
+        "indexes the models gained since, in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="converts and verifies everything, then rolls it back",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Only SQLite databases can be converted with this command")
+        converted = "id" in self.columns(Article._meta.db_table)
+        # a database older than some of the models has no table for them, those are left to
+        # migrate --run-syncdb, which can create them once the keys are integers
+        tables = set(connection.introspection.table_names())
+        try:
+            with connection.schema_editor(atomic=True) as editor:
+                added = []
+                if not converted:
+                    models = [m for m in self.rebuilt_models() if m._meta.db_table in tables]
+                    added += self.convert(editor, models)
+                    # the indexes of the rebuilt tables
+                    for sql in editor.deferred_sql:
+                        editor.execute(sql)
+                    editor.deferred_sql = []
+                added += self.add_columns(editor, tables)
+                indexes = self.add_indexes(editor, tables)
+                self.backfill(added)
+                connection.check_constraints()
+                if options["dry_run"]:
+                    raise DryRun  # rolls everything back
+        except DryRun:
+            self.stdout.write(self.style.WARNING("Dry run, rolled back"))
+            return
+
+        if not converted:
+            # the featured pool and the per user states hold the old keys
+            cache.clear()
+            self.stdout.write(
+                self.style.SUCCESS("Converted, restart the workers so they drop their cached keys")
+            )
+        elif added or indexes:
+            self.stdout.write(self.style.SUCCESS("Upgraded"))
+        else:
+            self.stdout.write("The database already uses integer keys and has every column")
+        missing = [
+            model._meta.db_table
+            for model in apps.get_app_config("core").get_models()
+            if model._meta.db_table not in tables
+        ]
+        if missing:
+            self.stdout.write(
+                f"Not in the database yet, run migrate --run-syncdb: {', '.join(missing)}"
+            )
+
+    def convert(self, editor, models):
+        """
+        Rebuilds the tables with the integer keys, returns the (model, field) of the columns
+        the old tables didn't have.
+        """
+        counts = {model: self.count(model._meta.db_table) for model in models}
+        old_columns = {model: self.columns(model._meta.db_table) for model in models}
+        # set the old tables aside, their index names would clash with the new ones
+        for model in models:
+            table = model._meta.db_table
+            for index in self.indexes(table):
+                editor.execute(f"DROP INDEX {editor.quote_name(index)}")
+            editor.execute(
+                f"ALTER TABLE {editor.quote_name(table)} "
+                f"RENAME TO {editor.quote_name(table + '__old')}"
+            )
+        for model in models:
+            editor.create_model(model)
+        for model in models:
+            editor.execute(*self.copy_sql(model, old_columns[model], editor))
+            copied = self.count(model._meta.db_table)
+            if copied != counts[model]:
+                raise CommandError(
+                    f"{model._meta.db_table}: {copied} of {counts[model]} rows copied, "
+                    "the others point to missing rows. Nothing was changed."
+                )
+            self.stdout.write(f"{model._meta.db_table:<24} {copied} rows")
+        for model in reversed(models):
+            editor.execute(f"DROP TABLE {editor.quote_name(model._meta.db_table + '__old')}")
+        return [
+            (model, field)
+            for model in models
+            for field in model._meta.local_concrete_fields
+            if field.column not in old_columns[model]
+        ]
+
+    def add_columns(self, editor, tables):
+        """
+        Adds the columns missing from the existing tables, filled with the field default,
+        returns their (model, field).
+        """
+        added = []
+        for model in apps.get_app_config("core").get_models():
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            columns = self.columns(table)
+            for field in model._meta.local_concrete_fields:
+                if field.column in columns:
+                    continue
+                # SQLite adds a NOT NULL column with a default only, which it then keeps
+                # (Django sets every column on insert, it's never used)
+                definition, params = editor.column_sql(model, field, include_default=True)
+                editor.execute(
+                    f"ALTER TABLE {editor.quote_name(table)} "
+                    f"ADD COLUMN {editor.quote_name(field.column)} {definition}",
+                    params,
+                )
+                self.stdout.write(f"{table}.{field.column} added")
+                added.append((model, field))
+        return added
+
+    def add_indexes(self, editor, tables):
+        """
+        Creates the Meta.indexes missing from the existing tables, returns how many.
+        """
+        created = 0
+        for model in apps.get_app_config("core").get_models():
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            existing = set(self.indexes(table))
+            for index in model._meta.indexes:
+                if index.name not in existing:
+                    editor.add_index(model, index)
+                    self.stdout.write(f"{table} index {index.name} added")
+                    created += 1
+        return created
+
+    def backfill(self, added):
+        for model, field in added:
+            value = BACKFILL.get((model, field.name))
+            if value is not None:
+                model.objects.update(**{field.name: value()})
+
+    def rebuilt_models(self):
+        # the converted tables, and every table pointing to one of the rebuilt tables (the
+        # rename rewrites their foreign keys), parents first
+        models = list(CONVERTED)
+        changed = True
+        while changed:
+            changed = False
+            for model in apps.get_models():
+                if model in models:
+                    continue
+                if any(
+                    field.is_relation and field.concrete and field.related_model in models
+                    for field in model._meta.local_fields
+                ):
+                    models.append(model)
+                    changed = True
+        return models
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0]
+
+    def columns(self, table):
+        with connection.cursor() as cursor:
+            description = connection.introspection.get_table_description(cursor, table)
+        return {column.name for column in description}
+
+    def indexes(self, table):
+        # the explicit indexes, SQLite names the implicit (sqlite_autoindex_*) ones per table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s "
+                "AND sql IS NOT NULL",
+                [table],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def copy_sql(self, model, old_columns, editor):
+        """
+        INSERT ... SELECT from the old table, the references to the converted models are
+        looked up by their (old primary key) lookup column. The columns added to the model
+        after the old table was created get their default.
+        """
+        qn = editor.quote_name
+        columns, values, params, joins = [], [], [], []
+        for field in model._meta.local_concrete_fields:
+            if model in CONVERTED and field.primary_key:
+                continue  # the new integer key, numbered by the insert
+            columns.append(qn(field.column))
+            target = field.related_model if field.is_relation else None
+            if field.column not in old_columns:
+                values.append("%s")
+                params.append(editor.effective_default(field))
+            elif target in CONVERTED:
+                alias = f"k{len(joins)}"
+                join = "LEFT JOIN" if field.null else "JOIN"
+                target_field = target._meta.get_field(CONVERTED[target])
+                joins.append(
+                    f"{join} {qn(target._meta.db_table)} {alias} "
+                    f"ON {alias}.{qn(target_field.column)} = old.{qn(field.column)}"
+                )
+                values.append(f"{alias}.{qn(target._meta.pk.column)}")
+            else:
+                values.append(f"old.{qn(field.column)}")
+
+        order = ""
+        if model in CONVERTED:
+            # numbered oldest first where there's a creation date
+            key = qn(model._meta.get_field(CONVERTED[model]).column)
+            created = [
+                f.column
+                for f in model._meta.local_fields
+                if f.name == "created_at" and f.column in old_columns
+            ]
+            order = "ORDER BY " + ", ".join([f"old.{qn(c)}" for c in created] + [f"old.{key}"])
+
+        sql = (
+            f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(columns)}) "
+            f"SELECT {', '.join(values)} FROM {qn(model._meta.db_table + '__old')} old "
+            f"{' '.join(joins)} {order}"
+        )
+        return sql, params
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.images import generate_variants
+from core.models import Article, Author, Category, Testimonial
+
+
+class Command(BaseCommand):
+    help = "Renders the missing responsive variants of every uploaded image."
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Article, Author, Category, Testimonial):
+            names.update(model.objects.exclude(image="").values_list("image", flat=True))
+        rendered = 0
+        for name in sorted(names):
+            rendered += generate_variants(name, wait=True)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered {rendered} variants for {len(names)} images")
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild_index
+from core.similar import rebuild_similar
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the article full-text search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} articles"))
+        # the similar posts are computed from the index
+        rebuild_similar(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Rebuilt the similar articles"))
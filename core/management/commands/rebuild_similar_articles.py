@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.similar import rebuild_similar
+
+
+class Command(BaseCommand):
+    help = "Recomputes the similar articles of every article from the search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        processed = rebuild_similar(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Computed the similar articles of {processed} articles")
+        )
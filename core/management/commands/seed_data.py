@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seeding import DEFAULT_VOLUMES, SEEDED_PASSWORD, check_empty, seed
+
+
+class Command(BaseCommand):
+    help = "Fills an empty database with deterministic synthetic users, articles and interactions."
+
+    def add_arguments(self, parser):
+        for name, count in DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=count)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        non_empty = check_empty()
+        if non_empty:
+            raise CommandError(f"Refusing to seed, these tables have rows: {', '.join(non_empty)}")
+        volumes = {name: options[name] for name in DEFAULT_VOLUMES}
+        created = seed(volumes, seed=options["seed"], batch_size=options["batch_size"])
+        for name, count in created.items():
+            self.stdout.write(f"{name:<13} {count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Seeded, the readers sign in with the password {SEEDED_PASSWORD!r}")
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Newsletter
+from core.newsletters import NewsletterEngine
+
+
+class Command(BaseCommand):
+    help = "Sends (or resumes) the newsletters that still have pending or failed deliveries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("newsletters", nargs="*", type=int, help="newsletter ids")
+        parser.add_argument("--workers", type=int)
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        engine = NewsletterEngine(workers=options["workers"], batch_size=options["batch_size"])
+        if options["newsletters"]:
+            newsletters = Newsletter.objects.filter(pk__in=options["newsletters"])
+            if len(newsletters) != len(set(options["newsletters"])):
+                raise CommandError("Unknown newsletter id")
+        else:
+            newsletters = engine.unfinished()
+        for newsletter in newsletters:
+            stats = engine.send(newsletter)
+            style = self.style.SUCCESS if not stats.failed else self.style.WARNING
+            self.stdout.write(style(str(stats)))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.database import get_replicas, replicate
+
+
+class Command(BaseCommand):
+    help = (
+        "Stands in for replication between two local SQLite files: copies the primary into "
+        "the replicas every --lag seconds, so the replicas are up to that much behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lag", type=float, default=2.0, help="seconds between copies")
+        parser.add_argument("--once", action="store_true", help="copies once and exits")
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError("No replica configured, set REPLICA_DATABASE to a file name")
+        for alias in replicas:
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(f"{alias} is not an SQLite database")
+
+        while True:
+            for alias in replicas:
+                started = time.perf_counter()
+                pages = replicate(alias)
+                self.stdout.write(
+                    f"{alias}: {pages} pages copied in "
+                    f"{(time.perf_counter() - started) * 1000:.1f}ms"
+                )
+            if options["once"]:
+                return
+            time.sleep(options["lag"])
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the votes, comments and articles since the last run to the trending scores, "
+        "once or every --every seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=float, help="seconds between updates")
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="recomputes every score (first update only when repeating)",
+        )
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        while True:
+            started = time.perf_counter()
+            changed = update_trending(full=full)
+            self.stdout.write(
+                f"{changed} scores updated in {(time.perf_counter() - started) * 1000:.1f}ms"
+            )
+            if not options["every"]:
+                return
+            full = False
+            time.sleep(options["every"])
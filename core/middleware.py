@@ -0,0 +1,306 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections
+from django.utils.deprecation import MiddlewareMixin
+from request import settings as request_settings
+from request.models import Request
+from request.router import Patterns
+from request.utils import request_is_ajax
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .database import get_replicas, reset_replica, use_replica
+from .instrumentation import check_budget, end_request, install, registry, start_request
+
+logger = logging.getLogger(__name__)
+
+
+# drop-in replacement for request.middleware.RequestMiddleware: the same Request rows are
+# recorded, but instead of one INSERT (plus a user lookup from full_clean) inside every
+# request, the rows go into a bounded in-memory queue that a background thread drains with
+# bulk_create every REQUEST_LOG_BATCH_SIZE rows or REQUEST_LOG_FLUSH_INTERVAL milliseconds.
+# When the queue is full new rows are dropped (and counted) rather than blocking the request.
+
+
+class RequestLogBuffer:
+    def __init__(self, batch_size=None, flush_interval=None, max_size=None):
+        self.batch_size = batch_size or getattr(settings, "REQUEST_LOG_BATCH_SIZE", 100)
+        self.flush_interval = (
+            flush_interval or getattr(settings, "REQUEST_LOG_FLUSH_INTERVAL", 500)
+        ) / 1000
+        self.queue = queue.Queue(
+            max_size or getattr(settings, "REQUEST_LOG_QUEUE_SIZE", 10000)
+        )
+        self.dropped = 0
+        self.written = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def put(self, record):
+        """
+        Queues a Request row, returns False if it was dropped because the queue is full.
+        """
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_worker(self):
+        # (re)starting the worker lazily, also in a process forked after it was started
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="request-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self):
+        # waiting for the first row, then gathering up to batch_size rows or until the interval ends
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            close_old_connections()
+            Request.objects.bulk_create(batch)
+            self.written += len(batch)
+        except Exception:
+            logger.exception("could not write %d request log rows", len(batch))
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self):
+        """
+        Writes everything still queued from the calling thread.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start : start + self.batch_size])
+
+    def drain(self):
+        """
+        Blocks until the worker has written every queued row.
+        """
+        self.queue.join()
+
+
+request_log = RequestLogBuffer()
+atexit.register(request_log.flush)
+
+
+class BufferedRequestMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        # the same filters as request.middleware.RequestMiddleware
+        if request.method.lower() not in request_settings.VALID_METHOD_NAMES:
+            return response
+
+        if response.status_code < 400 and request_settings.ONLY_ERRORS:
+            return response
+
+        if Patterns(False, *request_settings.IGNORE_PATHS).resolve(request.path[1:]):
+            return response
+
+        if request_is_ajax(request) and request_settings.IGNORE_AJAX:
+            return response
+
+        if request.META.get("REMOTE_ADDR") in request_settings.IGNORE_IP:
+            return response
+
+        user_agents = Patterns(False, *request_settings.IGNORE_USER_AGENTS)
+        if user_agents.resolve(request.META.get("HTTP_USER_AGENT", "")):
+            return response
+
+        if getattr(request, "user", False):
+            if request.user.get_username() in request_settings.IGNORE_USERNAME:
+                return response
+
+        # sampling, the analytics are statistics anyway
+        sample_rate = getattr(settings, "REQUEST_LOG_SAMPLE_RATE", 1.0)
+        if sample_rate < 1 and random.random() >= sample_rate:
+            return response
+
+        record = Request()
+        record.from_http_request(request, response, commit=False)
+        # the user was just authenticated, checking it exists would cost a query per request
+        try:
+            record.full_clean(exclude=["user"], validate_unique=False)
+        except ValidationError as exc:
+            logger.warning(
+                "Bad request: %s",
+                str(exc),
+                exc_info=exc,
+                extra={"status_code": 400, "request": request},
+            )
+            return response
+
+        # what Request.save() would do, bulk_create does not call it
+        if not request_settings.LOG_IP:
+            record.ip = request_settings.IP_DUMMY
+        elif request_settings.ANONYMOUS_IP:
+            record.ip = ".".join(record.ip.split(".")[:-1] + ["1"])
+        if not request_settings.LOG_USER:
+            record.user = None
+
+        request_log.put(record)
+        return response
+
+
+# async capable version of whitenoise's middleware, the only sync only one left in the stack:
+# with a sync middleware Django runs the rest of the chain through async_to_sync /
+# sync_to_async, so an ASGI request would be handed to a thread (and back) before it reaches
+# the async views
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+# per request query / template / cache instrumentation (see core.instrumentation), placed
+# right after the static files so they aren't measured
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        elapsed = metrics.elapsed
+        if getattr(settings, "SERVER_TIMING", True):
+            response["Server-Timing"] = metrics.server_timing()
+        match = request.resolver_match
+        if match is not None:
+            registry.record(match.view_name, metrics, elapsed)
+            check_budget(match.view_name, metrics)
+        return response
+
+
+# read replicas (see core.database): the reads of a GET / HEAD request go to a replica, unless
+# the browser wrote something in the last REPLICA_STICKY_SECONDS. Any other request reads
+# from the primary and pins the browser to it, with a cookie rather than the session since
+# the session itself is read from the database.
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.cookie = getattr(settings, "REPLICA_PIN_COOKIE", "pin_primary")
+        self.sticky = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = use_replica(self.reads_from_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_replica(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = use_replica(self.reads_from_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_replica(token)
+        return self.pin(request, response)
+
+    def reads_from_replica(self, request):
+        return (
+            bool(get_replicas())
+            and request.method in SAFE_METHODS
+            and self.cookie not in request.COOKIES
+        )
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and get_replicas():
+            response.set_cookie(
+                self.cookie, "1", max_age=self.sticky, httponly=True, samesite="Lax"
+            )
+        return response
@@ -5,11 +5,13 @@ from allauth.account.auth_backends import get_user_model
 
 # DB modles:
 
+# Author, Category, Testimonial and Article have integer primary keys, every foreign key and
+# join index stores them, while the username / name / slug they are looked up by in the urls
+# are unique columns (see "manage.py convert_integer_keys" for databases created before).
+
 
 class Author(models.Model):
-    username = models.CharField(
-        primary_key=True, max_length=32, null=False, blank=False
-    )
+    username = models.CharField(unique=True, max_length=32, null=False, blank=False)
     name = models.CharField(max_length=64, null=False, blank=False)
     description = models.TextField(max_length=255, null=False, blank=False)
     image = models.ImageField(upload_to="authors_images")
@@ -22,7 +24,7 @@ class Author(models.Model):
 
 
 class Category(models.Model):
-    name = models.CharField(max_length=32, null=False, blank=False, primary_key=True)
+    name = models.CharField(max_length=32, null=False, blank=False, unique=True)
     description = models.CharField(max_length=128, null=False, blank=False)
     image = models.ImageField(upload_to="categories_images")
     created_at = models.DateTimeField(auto_now_add=True, null=False, blank=False)
@@ -35,7 +37,7 @@ class Category(models.Model):
 
 
 class Article(models.Model):
-    slug = models.SlugField(max_length=256, null=False, blank=False, primary_key=True)
+    slug = models.SlugField(max_length=256, null=False, blank=False, unique=True)
     title = models.CharField(max_length=256, null=False, blank=False)
     excert = models.TextField(max_length=512, null=False, blank=False)
     content = RichTextField(max_length=8192, null=False, blank=False)
@@ -52,6 +54,7 @@ class Article(models.Model):
         null=False,
         blank=False,
         related_name="articles",  # relationship reverse description
+        db_index=False,  # leads the (category, -created_at, -id) index
     )
     author = models.ForeignKey(
         Author,
@@ -59,11 +62,22 @@ class Article(models.Model):
         blank=False,
         on_delete=models.CASCADE,
         related_name="articles",
+        db_index=False,  # leads the (author, -created_at, -id) index
     )
 
     def __str__(self) -> str:
         return self.title
 
+    class Meta:
+        # cursor pagination walks the articles newest first, overall and per category /
+        # author, the conditional GET validators read the latest update
+        indexes = [
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["category", "-created_at", "-id"]),
+            models.Index(fields=["author", "-created_at", "-id"]),
+            models.Index(fields=["-updated_at"]),
+        ]
+
 
 class Comment(models.Model):
     content = models.TextField(max_length=2048, null=False, blank=False)
@@ -73,6 +87,7 @@ class Comment(models.Model):
         null=False,
         blank=False,
         related_name="comments",
+        db_index=False,  # leads the (article, -created_at, -id) index
     )
     created_at = models.DateTimeField(auto_now_add=True, null=False, blank=False)
     user = models.ForeignKey(
@@ -88,6 +103,14 @@ class Comment(models.Model):
             self.content[:10] + "..."
         )  # overrding comment content display on the admin panel
 
+    class Meta:
+        indexes = [
+            # cursor pagination walks the comments of an article newest first
+            models.Index(fields=["article", "-created_at", "-id"]),
+            # the comments posted since the last trending update
+            models.Index(fields=["created_at"]),
+        ]
+
 
 class Contact(models.Model):
     name = models.CharField(max_length=64, null=False, blank=False)
@@ -98,7 +121,7 @@ class Contact(models.Model):
 
 
 class Testimonial(models.Model):
-    name = models.CharField(max_length=32, null=False, blank=False, primary_key=True)
+    name = models.CharField(max_length=32, null=False, blank=False, unique=True)
     image = models.ImageField(upload_to="testimonials_images")
     description = models.CharField(max_length=128, null=False, blank=False)
     content = models.TextField(blank=False, max_length=200, null=False)
@@ -122,24 +145,30 @@ class Profile(models.Model):
 
 
 class Favourite(models.Model):
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    # the (user, post) and (user, -added_at) indexes lead with the user
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, db_index=False)
     post = models.ForeignKey(Article, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("user", "post")
+        # the library pages list a reader's posts, latest added first, a page at a time
+        indexes = [models.Index(fields=["user", "-added_at", "-id"])]
 
     def __str__(self):
         return f"{self.user.username} - {self.post.title}"
 
 
 class ReadLater(models.Model):
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    # the (user, post) and (user, -added_at) indexes lead with the user
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, db_index=False)
     post = models.ForeignKey(Article, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("user", "post")
+        # the library pages list a reader's posts, latest added first, a page at a time
+        indexes = [models.Index(fields=["user", "-added_at", "-id"])]
 
     def __str__(self):
         return f"{self.user.username} - {self.post.title}"
@@ -150,18 +179,128 @@ class Newsletter(models.Model):
     message = RichTextField(max_length=8192, null=False, blank=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def __str__(self):
+        return self.subject
+
 
 class Subscriber(models.Model):
     email = models.EmailField(max_length=64, blank=False, null=False)
     subscribed_at = models.DateTimeField(auto_now_add=True)
 
 
+class NewsletterDelivery(models.Model):
+    # one row per newsletter and subscriber, so a crashed send resumes where it stopped
+    PENDING, SENT, FAILED = "pending", "sent", "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (SENT, "Sent"), (FAILED, "Failed")]
+
+    newsletter = models.ForeignKey(
+        Newsletter, on_delete=models.CASCADE, related_name="deliveries"
+    )
+    subscriber = models.ForeignKey(Subscriber, on_delete=models.CASCADE)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(max_length=255, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("newsletter", "subscriber")
+        indexes = [models.Index(fields=["newsletter", "status", "id"])]
+
+    def __str__(self):
+        return f"{self.subscriber.email} - {self.status}"
+
+
 class Vote(models.Model):
     VOTE_CHOICES = [("up", "Upvote"), ("down", "Downvote")]
 
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    # the (user, article) and (user, vote_type) indexes lead with the user
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, db_index=False)
     article = models.ForeignKey(Article, on_delete=models.CASCADE)
     vote_type = models.CharField(max_length=4, choices=VOTE_CHOICES)
+    voted_at = models.DateTimeField(auto_now_add=True)  # set again when the vote is switched
 
     class Meta:
         unique_together = ("user", "article")
+        indexes = [
+            # the upvoted / downvoted pages, latest vote first, a page at a time
+            models.Index(fields=["user", "vote_type", "-voted_at", "-id"]),
+            # the votes cast since the last trending update
+            models.Index(fields=["voted_at"]),
+        ]
+
+
+# Full-text search index (see core/search.py), kept up to date from the Article signals
+
+
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=64, primary_key=True)
+    documents = models.PositiveIntegerField(default=0)  # document frequency of the term
+
+    def __str__(self) -> str:
+        return self.term
+
+
+class SearchDocument(models.Model):
+    article = models.OneToOneField(
+        Article,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+    )
+    length = models.PositiveIntegerField(default=0)  # weighted number of indexed terms
+    norm = models.FloatField(default=0)  # length of the TF-IDF vector (see core/similar.py)
+
+
+class SearchPosting(models.Model):
+    term = models.CharField(max_length=64)
+    article = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        related_name="search_postings",
+    )
+    frequency = models.PositiveIntegerField()  # field weighted term frequency
+
+    class Meta:
+        unique_together = ("term", "article")
+        indexes = [models.Index(fields=["term", "-frequency"])]
+
+
+# Precomputed "similar posts" (see core/similar.py), the top SIMILAR_ARTICLES of each article
+
+
+class SimilarArticle(models.Model):
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="similar_articles"
+    )
+    similar = models.ForeignKey(Article, on_delete=models.CASCADE, related_name="similar_to")
+    score = models.FloatField()  # category boosted cosine similarity
+
+    class Meta:
+        unique_together = ("article", "similar")
+        indexes = [models.Index(fields=["article", "-score"])]
+
+
+# Materialized "trending" ranking (see core/trending.py), updated by "manage.py update_trending"
+
+
+class TrendingScore(models.Model):
+    article = models.OneToOneField(
+        Article, on_delete=models.CASCADE, primary_key=True, related_name="trending"
+    )
+    # a copy of the article's category, so a category's top articles are an index range
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    score = models.FloatField(default=0)  # time-decayed activity, scaled to TrendingClock.epoch
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score"]),
+            models.Index(fields=["category", "-score"]),
+        ]
+
+
+class TrendingClock(models.Model):
+    # a single row: the scores are relative to the epoch, and count the events up to "until"
+    epoch = models.DateTimeField()
+    until = models.DateTimeField()
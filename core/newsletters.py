@@ -0,0 +1,248 @@
+import html
+import logging
+import smtplib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import Newsletter, NewsletterDelivery, Subscriber
+
+logger = logging.getLogger(__name__)
+
+
+# newsletter delivery engine: saving a new Newsletter queues one NewsletterDelivery row per
+# subscriber (streamed with iterator(), so the subscriber list is never loaded at once) and
+# hands the newsletter to a background thread. The message is rendered once, the pending rows
+# are read in NEWSLETTER_BATCH_SIZE batches and every batch is sent by one of NEWSLETTER_WORKERS
+# threads over a single SMTP connection. The rows record the outcome of every delivery, so an
+# interrupted send is picked up again by "manage.py send_newsletters" (at most the batches that
+# were in flight are sent twice), and failed ones are retried up to NEWSLETTER_MAX_ATTEMPTS times.
+
+
+@dataclass
+class DeliveryStats:
+    newsletter: int
+    sent: int = 0
+    failed: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self):
+        """
+        Sent emails per second.
+        """
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"newsletter {self.newsletter}: {self.sent} sent, {self.failed} failed in "
+            f"{self.batches} batches, {self.elapsed:.2f}s ({self.rate:.0f}/s)"
+        )
+
+
+def render_message(newsletter):
+    """
+    Returns the (subject, text body, html body) of the newsletter, rendered once per send.
+    """
+    body = newsletter.message
+    return newsletter.subject, html.unescape(strip_tags(body)).strip(), body
+
+
+def queue_deliveries(newsletter, chunk_size=500):
+    """
+    Creates the missing delivery rows of the newsletter, for everyone who had subscribed when
+    it was written. Safe to run again, existing rows are left as they are.
+    """
+    subscribers = (
+        Subscriber.objects.filter(subscribed_at__lte=newsletter.created_at)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    chunk = []
+    for subscriber_id in subscribers.iterator(chunk_size=chunk_size):
+        chunk.append(
+            NewsletterDelivery(newsletter_id=newsletter.pk, subscriber_id=subscriber_id)
+        )
+        if len(chunk) >= chunk_size:
+            NewsletterDelivery.objects.bulk_create(chunk, ignore_conflicts=True)
+            chunk = []
+    if chunk:
+        NewsletterDelivery.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+def send_batch(message, batch):
+    """
+    Sends the rendered message to a batch of subscribers over one connection of the email
+    backend and records the outcome of every delivery.
+
+    Args:
+        message: The (subject, text, html) tuple from render_message.
+        batch: A list of (delivery pk, email) pairs.
+
+    Returns:
+        A (sent, failed) pair of counts.
+    """
+    subject, text, body = message
+    sent, failed = [], {}
+    connection = get_connection()
+    try:
+        try:
+            connection.open()
+        except Exception as exc:
+            failed = {pk: exc for pk, _ in batch}
+            batch = []
+        for index, (pk, email) in enumerate(batch):
+            email_message = EmailMultiAlternatives(
+                subject, text, settings.DEFAULT_FROM_EMAIL, [email], connection=connection
+            )
+            email_message.attach_alternative(body, "text/html")
+            try:
+                connection.send_messages([email_message])
+                sent.append(pk)
+            except smtplib.SMTPServerDisconnected as exc:
+                failed[pk] = exc
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception as exc:
+                    # the server is gone, the rest of the batch is retried later
+                    failed.update((pk, exc) for pk, _ in batch[index + 1 :])
+                    break
+            except Exception as exc:
+                failed[pk] = exc
+    finally:
+        connection.close()
+
+    try:
+        now = timezone.now()
+        NewsletterDelivery.objects.filter(pk__in=sent).update(
+            status=NewsletterDelivery.SENT,
+            attempts=F("attempts") + 1,
+            error="",
+            sent_at=now,
+        )
+        if failed:
+            NewsletterDelivery.objects.filter(pk__in=failed).update(
+                status=NewsletterDelivery.FAILED, attempts=F("attempts") + 1
+            )
+            NewsletterDelivery.objects.bulk_update(
+                [
+                    NewsletterDelivery(pk=pk, error=repr(exc)[:255])
+                    for pk, exc in failed.items()
+                ],
+                ["error"],
+            )
+    finally:
+        # the pool threads must not keep their own database connections open
+        connections.close_all()
+    return len(sent), len(failed)
+
+
+class NewsletterEngine:
+    def __init__(self, workers=None, batch_size=None, max_attempts=None):
+        self.workers = workers or getattr(settings, "NEWSLETTER_WORKERS", 4)
+        self.batch_size = batch_size or getattr(settings, "NEWSLETTER_BATCH_SIZE", 100)
+        self.max_attempts = max_attempts or getattr(settings, "NEWSLETTER_MAX_ATTEMPTS", 3)
+        self._lock = threading.Lock()
+        self._dispatcher = None
+
+    def submit(self, newsletter_id):
+        """
+        Sends the newsletter in the background, one newsletter at a time.
+
+        Returns:
+            A Future resolving to the DeliveryStats of the send.
+        """
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = ThreadPoolExecutor(1, thread_name_prefix="newsletter")
+        return self._dispatcher.submit(self._run, newsletter_id)
+
+    def _run(self, newsletter_id):
+        try:
+            return self.send(Newsletter.objects.get(pk=newsletter_id))
+        except Exception:
+            logger.exception("could not send newsletter %s", newsletter_id)
+            raise
+        finally:
+            connections.close_all()
+
+    def send(self, newsletter):
+        """
+        Queues and sends every pending (or retryable) delivery of the newsletter, blocking
+        until they are all done.
+
+        Returns:
+            The DeliveryStats of this run.
+        """
+        started = time.perf_counter()
+        queue_deliveries(newsletter)
+        message = render_message(newsletter)
+        stats = DeliveryStats(newsletter.pk)
+
+        def record(future):
+            sent, failed = future.result()
+            stats.sent += sent
+            stats.failed += failed
+            stats.batches += 1
+
+        # a couple of batches per worker in flight, the rest stays in the database
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="newsletter-batch") as pool:
+            in_flight = deque()
+            for batch in self.pending_batches(newsletter):
+                in_flight.append(pool.submit(send_batch, message, batch))
+                if len(in_flight) >= 2 * self.workers:
+                    record(in_flight.popleft())
+            while in_flight:
+                record(in_flight.popleft())
+
+        stats.elapsed = time.perf_counter() - started
+        logger.info("%s", stats)
+        return stats
+
+    def pending_batches(self, newsletter):
+        """
+        Yields the deliveries still to be sent as lists of (pk, email) pairs, walking the
+        rows by primary key so each one is read once per run.
+        """
+        deliveries = (
+            NewsletterDelivery.objects.filter(newsletter=newsletter)
+            .filter(
+                Q(status=NewsletterDelivery.PENDING)
+                | Q(status=NewsletterDelivery.FAILED, attempts__lt=self.max_attempts)
+            )
+            .order_by("pk")
+            .values_list("pk", "subscriber__email")
+        )
+        last = 0
+        while True:
+            batch = list(deliveries.filter(pk__gt=last)[: self.batch_size])
+            if not batch:
+                return
+            yield batch
+            last = batch[-1][0]
+
+    def unfinished(self):
+        """
+        Returns the newsletters that still have deliveries to send.
+        """
+        return Newsletter.objects.filter(
+            Q(deliveries__status=NewsletterDelivery.PENDING)
+            | Q(
+                deliveries__status=NewsletterDelivery.FAILED,
+                deliveries__attempts__lt=self.max_attempts,
+            )
+        ).distinct()
+
+
+newsletter_engine = NewsletterEngine()
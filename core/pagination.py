@@ -0,0 +1,227 @@
+import base64
+import json
+import math
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .database import primary
+
+
+# keyset (cursor) pagination on (created_at, pk): a page is fetched with
+# "WHERE (created_at, pk) < cursor ORDER BY created_at DESC, pk DESC LIMIT n", which walks the
+# index from the cursor instead of counting and skipping every row before it, so page N costs
+# the same as page 1. The total count is optional and is cached when asked for.
+
+COMMENTS_COUNT_KEY = "count:comments:%s"  # cached number of comments of an article
+
+
+def encode_cursor(obj, field="created_at"):
+    # obj is a model instance, or a values() row holding the field and "pk"
+    if isinstance(obj, dict):
+        value, pk = obj[field], obj["pk"]
+    else:
+        value, pk = getattr(obj, field), obj.pk
+    raw = json.dumps([value.isoformat(), pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (created_at, pk) pair of the cursor, or None if it's not a valid cursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        if not isinstance(pk, int):
+            return None  # e.g. a link from before the integer article keys
+        return datetime.fromisoformat(value), pk
+    except (TypeError, ValueError):
+        return None
+
+
+def cached_count(queryset, key, timeout=None):
+    """
+    Counts the queryset once and keeps the result in the cache under key, the caller is
+    responsible for deleting the key (or changing it) when the rows change.
+    """
+    count = cache.get(key)
+    if count is None:
+        with primary():
+            count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+async def acached_count(queryset, key, timeout=None):
+    """
+    Async version of cached_count.
+    """
+    count = await cache.aget(key)
+    if count is None:
+        with primary():
+            count = await queryset.acount()
+        await cache.aset(key, count, timeout)
+    return count
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f"<CursorPage {self.number}>"
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], self.paginator.field)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], self.paginator.field)
+        return None
+
+
+class CursorPaginator:
+    """
+    Paginates a queryset newest first on (field, pk).
+
+    Args:
+        queryset: The rows to paginate, without ordering.
+        per_page: The number of rows per page.
+        field: The datetime field to order by.
+        count: Optional total number of rows (or a callable returning it), only needed to
+            show the number of pages and to size the last page.
+    """
+
+    def __init__(self, queryset, per_page, field="created_at", count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self._count = count
+
+    @property
+    def count(self):
+        if callable(self._count):
+            self._count = self._count()
+        return self._count
+
+    @property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def _newest_first(self):
+        return self.queryset.order_by(f"-{self.field}", "-pk")
+
+    def _oldest_first(self):
+        return self.queryset.order_by(self.field, "pk")
+
+    # the redundant "<=" / ">=" bound is what lets the database turn the OR into an index range
+    def _older_than(self, position):
+        value, pk = position
+        return Q(**{f"{self.field}__lte": value}) & (
+            Q(**{f"{self.field}__lt": value}) | Q(pk__lt=pk)
+        )
+
+    def _newer_than(self, position):
+        value, pk = position
+        return Q(**{f"{self.field}__gte": value}) & (
+            Q(**{f"{self.field}__gt": value}) | Q(pk__gt=pk)
+        )
+
+    def _window(self, after, before, last, number):
+        # the query for one more row than a page (to know whether there is another page)
+        # and the function turning its rows into the page
+        try:
+            number = max(1, int(number))
+        except (TypeError, ValueError):
+            number = 1
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+        size = self.per_page
+
+        if after:
+            rows = self._newest_first().filter(self._older_than(after))[: size + 1]
+            return rows, lambda r: CursorPage(r[:size], self, number, len(r) > size, True)
+
+        if before:
+            rows = self._oldest_first().filter(self._newer_than(before))[: size + 1]
+            return rows, lambda r: CursorPage(r[:size][::-1], self, number, True, len(r) > size)
+
+        if last:
+            # sizing the last page like offset pagination would when the count is known
+            if self.count:
+                size = self.count - (self.num_pages - 1) * self.per_page
+                number = self.num_pages
+            rows = self._oldest_first()[: size + 1]
+            return rows, lambda r: CursorPage(r[:size][::-1], self, number, False, len(r) > size)
+
+        rows = self._newest_first()[: size + 1]
+        return rows, lambda r: CursorPage(r[:size], self, 1, len(r) > size, False)
+
+    def page(self, after=None, before=None, last=False, number=1):
+        """
+        Returns one page of rows.
+
+        Args:
+            after: Cursor of the last row of the previous page, to move forward.
+            before: Cursor of the first row of the next page, to move backward.
+            last: Whether to return the last (oldest) page.
+            number: The page number, only used for display.
+        """
+        rows, to_page = self._window(after, before, last, number)
+        return to_page(list(rows))
+
+    async def apage(self, after=None, before=None, last=False, number=1):
+        """
+        Async version of page(), the count has to be given as a number (see acached_count).
+        """
+        rows, to_page = self._window(after, before, last, number)
+        return to_page([row async for row in rows])
+
+    def get_page(self, params):
+        """
+        Returns the page described by the request query parameters (after, before, last, page).
+        """
+        return self.page(
+            after=params.get("after"),
+            before=params.get("before"),
+            last="last" in params,
+            number=params.get("page", 1),
+        )
+
+    async def aget_page(self, params):
+        return await self.apage(
+            after=params.get("after"),
+            before=params.get("before"),
+            last="last" in params,
+            number=params.get("page", 1),
+        )
@@ -0,0 +1,268 @@
+import heapq
+import html
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection, connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.utils.html import strip_tags
+
+from .database import primary
+from .models import Article, SearchDocument, SearchPosting, SearchTerm
+
+
+# inverted index over the article title, excerpt and html stripped content, ranked with BM25.
+# the postings live in the database so every worker shares the same index, and each
+# article is re-indexed incrementally from the Article post_save / pre_delete signals.
+
+FIELD_WEIGHTS = (("title", 3), ("excert", 2), ("content", 1))
+MAX_TERM_LENGTH = 64
+PREFIX_EXPANSIONS = 16  # how many indexed terms the last (partial) query word may expand to
+K1 = 1.2
+B = 0.75
+STATS_CACHE_KEY = "search:stats"
+
+STOP_WORDS = frozenset(
+    """
+    a an and are as at be but by for from has have in is it its of on or that the
+    their this to was were will with you your
+    """.split()
+)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Splits the text into lowercase index terms, dropping stop words and single characters.
+    """
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def article_terms(article):
+    """
+    Returns the field weighted term frequencies of the article.
+    """
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        text = getattr(article, field) or ""
+        if field == "content":
+            text = html.unescape(strip_tags(text))
+        for token in tokenize(text):
+            counts[token] += weight
+    return counts
+
+
+def index_article(article):
+    """
+    Adds or refreshes the postings of one article, only touching the terms that changed.
+    """
+    counts = article_terms(article)
+    with transaction.atomic():
+        old = dict(
+            SearchPosting.objects.filter(article=article).values_list("term", "frequency")
+        )
+        added = counts.keys() - old.keys()
+        removed = old.keys() - counts.keys()
+        changed = [t for t in counts.keys() & old.keys() if counts[t] != old[t]]
+
+        if removed:
+            SearchPosting.objects.filter(article=article, term__in=removed).delete()
+            _release_terms(removed)
+        if added:
+            SearchPosting.objects.bulk_create(
+                SearchPosting(term=term, article=article, frequency=counts[term])
+                for term in added
+            )
+            SearchTerm.objects.bulk_create(
+                (SearchTerm(term=term) for term in added), ignore_conflicts=True
+            )
+            SearchTerm.objects.filter(term__in=added).update(documents=F("documents") + 1)
+        for term in changed:
+            SearchPosting.objects.filter(article=article, term=term).update(
+                frequency=counts[term]
+            )
+        SearchDocument.objects.update_or_create(
+            article=article, defaults={"length": sum(counts.values())}
+        )
+    cache.delete(STATS_CACHE_KEY)
+
+
+def unindex_article(article):
+    """
+    Removes the article from the index.
+    """
+    with transaction.atomic():
+        terms = list(
+            SearchPosting.objects.filter(article=article).values_list("term", flat=True)
+        )
+        SearchPosting.objects.filter(article=article).delete()
+        SearchDocument.objects.filter(article=article).delete()
+        _release_terms(terms)
+    cache.delete(STATS_CACHE_KEY)
+
+
+def _release_terms(terms):
+    SearchTerm.objects.filter(term__in=terms).update(documents=F("documents") - 1)
+    SearchTerm.objects.filter(term__in=terms, documents__lte=0).delete()
+
+
+def rebuild_index(batch_size=2000):
+    """
+    Drops and rebuilds the whole index, streaming the articles in batches.
+
+    Returns:
+        The number of indexed articles.
+    """
+    document_frequency = Counter()
+    indexed = 0
+    with transaction.atomic():
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+        SearchTerm.objects.all().delete()
+
+        # plain executemany() batches, instantiating millions of postings is the slow part
+        insert_posting = "INSERT INTO %s (term, article_id, frequency) VALUES (%%s, %%s, %%s)" % (
+            SearchPosting._meta.db_table
+        )
+        insert_document = "INSERT INTO %s (article_id, length, norm) VALUES (%%s, %%s, 0)" % (
+            SearchDocument._meta.db_table
+        )
+        postings, documents = [], []
+        articles = Article.objects.values_list("pk", "title", "excert", "content")
+        with connection.cursor() as cursor:
+            for pk, title, excert, content in articles.iterator(chunk_size=batch_size):
+                counts = article_terms(Article(title=title, excert=excert, content=content))
+                document_frequency.update(counts.keys())
+                documents.append((pk, sum(counts.values())))
+                postings.extend((term, pk, frequency) for term, frequency in counts.items())
+                indexed += 1
+                if len(postings) >= batch_size * 10:
+                    cursor.executemany(insert_posting, postings)
+                    cursor.executemany(insert_document, documents)
+                    postings, documents = [], []
+            cursor.executemany(insert_posting, postings)
+            cursor.executemany(insert_document, documents)
+        SearchTerm.objects.bulk_create(
+            (SearchTerm(term=t, documents=n) for t, n in document_frequency.items()),
+            batch_size=batch_size,
+        )
+    cache.delete(STATS_CACHE_KEY)
+    return indexed
+
+
+def _stats():
+    # (number of documents, average document length), cached until the index changes
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        with primary():
+            totals = SearchDocument.objects.aggregate(count=Count("pk"), length=Sum("length"))
+        count = totals["count"] or 0
+        stats = (count, (totals["length"] or 0) / count if count else 0.0)
+        cache.set(STATS_CACHE_KEY, stats, None)
+    return stats
+
+
+def _query_terms(query):
+    # every word is an exact term except the last one, which is still being typed
+    # and matches as a prefix of the indexed terms
+    tokens = tokenize(query)
+    if not tokens:
+        return {}
+    exact = set(tokens[:-1])
+    if query[-1:].isspace():
+        exact.add(tokens[-1])
+        prefix = None
+    else:
+        prefix = tokens[-1]
+    terms = dict(SearchTerm.objects.filter(term__in=exact).values_list("term", "documents"))
+    if prefix:
+        # the most frequent completions, rather than the first ones alphabetically
+        terms.update(
+            SearchTerm.objects.filter(term__gte=prefix, term__lt=prefix + "\uffff")
+            .order_by("-documents", "term")
+            .values_list("term", "documents")[:PREFIX_EXPANSIONS]
+        )
+    return terms
+
+
+def _postings(terms, limit):
+    # impact ordered postings: the highest frequencies of each term first, so a very common
+    # term costs at most limit rows however large the catalogue grows. One query for all the
+    # terms (a prefix expands to up to PREFIX_EXPANSIONS of them) and the document lengths,
+    # the ORM can't slice the parts of a UNION on SQLite.
+    select = (
+        "SELECT * FROM (SELECT term, article_id, frequency FROM %s "
+        "WHERE term = %%s ORDER BY frequency DESC LIMIT %%s)" % SearchPosting._meta.db_table
+    )
+    sql = (
+        "SELECT posting.term, posting.article_id, posting.frequency, document.length "
+        "FROM (%s) AS posting LEFT JOIN %s AS document "
+        "ON document.article_id = posting.article_id"
+        % (" UNION ALL ".join([select] * len(terms)), SearchDocument._meta.db_table)
+    )
+    params = [param for term in terms for param in (term, limit)]
+    # plain rows from the routed database, a model instance per posting (.raw()) more than
+    # doubles the time of a search
+    with connections[router.db_for_read(SearchPosting)].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search(query, limit=None):
+    """
+    Ranks the articles matching the query with BM25.
+
+    Args:
+        query: The raw search box input.
+        limit: How many results to keep, defaults to settings.SEARCH_TOP_K.
+
+    Returns:
+        A list of (article pk, score) tuples, best match first.
+    """
+    limit = limit or getattr(settings, "SEARCH_TOP_K", 50)
+    postings_limit = getattr(settings, "SEARCH_POSTINGS_LIMIT", 1000)
+    terms = _query_terms(query)
+    if not terms:
+        return []
+
+    count, average_length = _stats()
+    idfs = {
+        term: math.log(1 + (count - documents + 0.5) / (documents + 0.5))
+        for term, documents in terms.items()
+    }
+    weights = defaultdict(list)  # article pk -> [(idf, frequency), ...]
+    lengths = {}
+    for term, pk, frequency, length in _postings(list(idfs), postings_limit):
+        weights[pk].append((idfs[term], frequency))
+        lengths[pk] = length
+    if not weights:
+        return []
+
+    scores = []
+    for pk, matches in weights.items():
+        length = lengths[pk] if lengths[pk] is not None else average_length
+        norm = K1 * (1 - B + B * length / (average_length or 1))
+        score = sum(idf * f * (K1 + 1) / (f + norm) for idf, f in matches)
+        scores.append((pk, score))
+    return heapq.nlargest(limit, scores, key=lambda item: item[1])
+
+
+def search_articles(query, page_number=1, per_page=None):
+    """
+    Returns one page of the ranked articles matching the query, with author and category loaded.
+    """
+    per_page = per_page or getattr(settings, "SEARCH_PAGE_SIZE", 10)
+    page = Paginator(search(query), per_page).get_page(page_number)
+    pks = [pk for pk, _ in page.object_list]
+    articles = Article.objects.select_related("author", "category").in_bulk(pks)
+    page.object_list = [articles[pk] for pk in pks if pk in articles]
+    return page
@@ -0,0 +1,243 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .benchmarks import explicit_timestamps
+from .featured import invalidate_pool
+from .fragments import bump_version
+from .models import (
+    Article,
+    Author,
+    Category,
+    Comment,
+    Favourite,
+    ReadLater,
+    Subscriber,
+    Testimonial,
+    Vote,
+)
+from .search import rebuild_index
+from .similar import rebuild_similar
+from .trending import update_trending
+
+
+# deterministic synthetic data: the same volumes and seed always produce the same rows, so
+# benchmark runs against a seeded database can be compared with each other
+
+DEFAULT_VOLUMES = {
+    "users": 200,
+    "authors": 20,
+    "categories": 8,
+    "articles": 2000,
+    "comments": 10000,
+    "votes": 10000,
+    "favourites": 2000,
+    "read_later": 2000,
+    "subscribers": 1000,
+    "testimonials": 5,
+}
+SEEDED_PASSWORD = "seeded-password"
+
+WORDS = """
+    python django database query index cache latency throughput server client request
+    response template view model migration async thread process memory storage image
+    network socket protocol cookie session security token search ranking vector article
+    travel food health sports history science music design garden coffee mountain river
+    """.split()
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _images(folder):
+    try:
+        _, files = default_storage.listdir(folder)
+    except FileNotFoundError:
+        return [""]
+    return [f"{folder}/{name}" for name in sorted(files)] or [""]
+
+
+def _pairs(rng, count, left, right):
+    # distinct (left, right) pairs, for the tables with a unique_together
+    count = min(count, len(left) * len(right))
+    pairs = set()
+    while len(pairs) < count:
+        pairs.add((rng.choice(left), rng.choice(right)))
+    return sorted(pairs)
+
+
+def check_empty():
+    """
+    Returns the names of the seeded tables that already have rows.
+    """
+    models = (Article, Author, Category, Comment, Subscriber, Testimonial)
+    return [str(model._meta.verbose_name_plural) for model in models if model.objects.exists()]
+
+
+def seed(volumes=None, seed=42, batch_size=1000):
+    """
+    Fills an empty database with synthetic data, with bulk_create only.
+
+    Args:
+        volumes: Row counts overriding DEFAULT_VOLUMES.
+        seed: The random seed.
+        batch_size: The bulk_create batch size.
+
+    Returns:
+        The number of rows created per table.
+    """
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    rng = random.Random(seed)
+    now = timezone.now().replace(microsecond=0)
+    User = get_user_model()
+    created = {}
+
+    with transaction.atomic(), explicit_timestamps(Article, Comment, Category, Testimonial, Vote):
+        password = make_password(SEEDED_PASSWORD)  # hashed once, it's the slow part
+        User.objects.bulk_create(
+            (
+                User(username=f"reader{i}", email=f"reader{i}@example.com", password=password)
+                for i in range(volumes["users"])
+            ),
+            batch_size=batch_size,
+        )
+        users = list(
+            User.objects.filter(username__startswith="reader").values_list("pk", flat=True)
+        )
+
+        images = _images("authors_images")
+        authors = Author.objects.bulk_create(
+            Author(
+                username=f"author{i}",
+                name=f"Author {i}",
+                description=_text(rng, 20),
+                image=images[i % len(images)],
+            )
+            for i in range(volumes["authors"])
+        )
+        images = _images("categories_images")
+        categories = Category.objects.bulk_create(
+            Category(
+                name=f"category{i}",
+                description=_text(rng, 10),
+                image=images[i % len(images)],
+                created_at=now - timedelta(days=i),
+            )
+            for i in range(volumes["categories"])
+        )
+
+        titles = [_text(rng, 6).capitalize() for _ in range(volumes["articles"])]
+        slugs = [f"{slugify(title)}-{i}" for i, title in enumerate(titles)]
+        votes = [
+            (user, slug, rng.choice(("up", "up", "down")))
+            for user, slug in _pairs(rng, volumes["votes"], users, slugs)
+        ]
+        tallies = {slug: [0, 0] for slug in slugs}
+        for _, slug, vote_type in votes:
+            tallies[slug][vote_type == "down"] += 1
+
+        images = _images("articles_images")
+        Article.objects.bulk_create(
+            (
+                Article(
+                    slug=slug,
+                    title=titles[i],
+                    excert=_text(rng, 30),
+                    content="".join(f"<p>{_text(rng, 60)}</p>" for _ in range(rng.randint(3, 12))),
+                    upvote=tallies[slug][0],
+                    downvote=tallies[slug][1],
+                    image=images[i % len(images)],
+                    # an article every 10 minutes, newest first
+                    created_at=now - timedelta(minutes=10 * i),
+                    category=rng.choice(categories),
+                    author=rng.choice(authors),
+                )
+                for i, slug in enumerate(slugs)
+            ),
+            batch_size=batch_size,
+        )
+        ids = dict(Article.objects.values_list("slug", "pk"))
+        articles = [ids[slug] for slug in slugs]
+        Vote.objects.bulk_create(
+            (
+                Vote(
+                    user_id=u,
+                    article_id=ids[slug],
+                    vote_type=t,
+                    voted_at=now - timedelta(seconds=rng.randint(0, 10**6)),
+                )
+                for u, slug, t in votes
+            ),
+            batch_size=batch_size,
+        )
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    user_id=rng.choice(users),
+                    article_id=rng.choice(articles),
+                    content=_text(rng, rng.randint(5, 40)),
+                    created_at=now - timedelta(seconds=rng.randint(0, 10**7)),
+                )
+                for _ in range(volumes["comments"] if users and articles else 0)
+            ),
+            batch_size=batch_size,
+        )
+        Favourite.objects.bulk_create(
+            (
+                Favourite(user_id=u, post_id=a)
+                for u, a in _pairs(rng, volumes["favourites"], users, articles)
+            ),
+            batch_size=batch_size,
+        )
+        ReadLater.objects.bulk_create(
+            (
+                ReadLater(user_id=u, post_id=a)
+                for u, a in _pairs(rng, volumes["read_later"], users, articles)
+            ),
+            batch_size=batch_size,
+        )
+        Subscriber.objects.bulk_create(
+            (Subscriber(email=f"subscriber{i}@example.com") for i in range(volumes["subscribers"])),
+            batch_size=batch_size,
+        )
+        images = _images("testimonials_images")
+        Testimonial.objects.bulk_create(
+            Testimonial(
+                name=f"Reader {i}",
+                description=_text(rng, 5),
+                content=_text(rng, 25),
+                image=images[i % len(images)],
+                created_at=now - timedelta(days=i),
+            )
+            for i in range(volumes["testimonials"])
+        )
+
+    # bulk_create sends no signals, doing what the receivers would have done
+    rebuild_index(batch_size=batch_size)
+    rebuild_similar(batch_size=batch_size)
+    update_trending(now=timezone.now(), full=True)
+    for model in (Article, Author, Category, Testimonial):
+        bump_version(model)
+    invalidate_pool()
+
+    for name, model in (
+        ("users", User),
+        ("authors", Author),
+        ("categories", Category),
+        ("articles", Article),
+        ("comments", Comment),
+        ("votes", Vote),
+        ("favourites", Favourite),
+        ("read_later", ReadLater),
+        ("subscribers", Subscriber),
+        ("testimonials", Testimonial),
+    ):
+        created[name] = model.objects.count()
+    return created
@@ -1,7 +1,34 @@
 from allauth.account.signals import user_signed_up
 from django.dispatch import receiver
-from .models import Profile, Newsletter
-from django.db.models.signals import post_save
+from .models import (
+    Profile,
+    Newsletter,
+    Article,
+    Author,
+    Category,
+    Testimonial,
+    Comment,
+    Favourite,
+    ReadLater,
+    Vote,
+    TrendingScore,
+)
+from django.db.models.signals import post_save, post_delete, pre_delete
+from .search import index_article, unindex_article
+from .similar import update_similar
+from .fragments import bump_version
+from .featured import invalidate_pool
+from .sitemaps import bump_shard
+from .pagination import COMMENTS_COUNT_KEY
+from .interactions import invalidate_user_states
+from .library import VOTE_SHELVES, adjust_count, reset_counts
+from .context_processors import invalidate_profile
+from .suggestions import suggestion_index, suggestion_of
+from django.core.cache import cache
+from django.db import transaction
+from django.conf import settings
+from .images import generate_variants
+from .newsletters import newsletter_engine
 
 
 @receiver(user_signed_up)
@@ -18,6 +45,128 @@ def create_user_profile(sender, user, **kwargs):
 
 
 @receiver(post_save, sender=Newsletter)
-def sendLetter(sender, instance, created, *args, **kwargs):
-    print(instance.message)
-    # TODO: send a notification  to the user
\ No newline at end of file
+def sendLetter(sender, instance, created, raw=False, *args, **kwargs):
+    # mailing the subscribers in the background once the newsletter is committed,
+    # editing it later doesn't send it again
+    if not created or raw or not settings.NEWSLETTER_SEND_ON_SAVE:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: newsletter_engine.submit(pk))
+
+
+# keeping the search index in sync with the articles
+@receiver(post_save, sender=Article)
+def reindex_article(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_article(instance)
+
+
+@receiver(pre_delete, sender=Article)
+def remove_article_from_index(sender, instance, **kwargs):
+    unindex_article(instance)
+
+
+# refreshing the precomputed similar posts, registered after reindex_article which it reads
+@receiver(post_save, sender=Article)
+def refresh_similar_articles(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_similar(instance)
+
+
+# invalidating the cached landing page fragments built from the edited model
+@receiver([post_save, post_delete], sender=Article)
+@receiver([post_save, post_delete], sender=Author)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Testimonial)
+def bump_fragments_version(sender, **kwargs):
+    bump_version(sender)
+
+
+# only the sitemap shard holding the article is regenerated
+@receiver([post_save, post_delete], sender=Article)
+def bump_sitemap_shard(sender, instance, **kwargs):
+    bump_shard(instance.pk)
+
+
+# refreshing the featured article pool when an article is added or removed
+@receiver(post_save, sender=Article)
+def refresh_featured_pool(sender, created, **kwargs):
+    if created:
+        invalidate_pool()
+
+
+@receiver(post_delete, sender=Article)
+def shrink_featured_pool(sender, **kwargs):
+    invalidate_pool()
+
+
+# the trending scores keep a copy of the article's category
+@receiver(post_save, sender=Article)
+def move_trending_score(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    TrendingScore.objects.filter(article=instance).exclude(
+        category_id=instance.category_id
+    ).update(category_id=instance.category_id)
+
+
+# keeping this process' suggestion trie up to date once the edit is committed, registered
+# after bump_fragments_version so the trie takes the bumped version as applied
+@receiver([post_save, post_delete], sender=Article)
+@receiver([post_save, post_delete], sender=Author)
+@receiver([post_save, post_delete], sender=Category)
+def update_suggestions(sender, instance, created=None, **kwargs):
+    key, suggestion = suggestion_of(instance)
+    if created is None:  # deleted
+        suggestion = None
+    transaction.on_commit(lambda: suggestion_index.update(sender, key, suggestion))
+
+
+# the comments count of an article is cached for its comment pages
+@receiver([post_save, post_delete], sender=Comment)
+def reset_comments_count(sender, instance, **kwargs):
+    cache.delete(COMMENTS_COUNT_KEY % instance.article_id)
+
+
+# dropping the cached bookmark / read later / vote state of the user
+@receiver([post_save, post_delete], sender=Favourite)
+@receiver([post_save, post_delete], sender=ReadLater)
+@receiver([post_save, post_delete], sender=Vote)
+def reset_user_states(sender, instance, **kwargs):
+    invalidate_user_states(instance.user_id)
+
+
+# keeping the cached number of items on each library shelf up to date
+@receiver([post_save, post_delete], sender=Favourite)
+@receiver([post_save, post_delete], sender=ReadLater)
+@receiver([post_save, post_delete], sender=Vote)
+def count_library_items(sender, instance, created=None, raw=False, **kwargs):
+    if sender is Vote:
+        shelf = VOTE_SHELVES.get(instance.vote_type)
+    else:
+        shelf = "saved_posts" if sender is Favourite else "reading_list"
+    if created is None:  # deleted
+        adjust_count(instance.user_id, shelf, -1)
+    elif created and not raw:
+        adjust_count(instance.user_id, shelf, 1)
+    else:
+        # loaded from a fixture, or an edited vote that may have changed shelves
+        reset_counts(instance.user_id)
+
+
+# the navbar avatar is cached per user
+@receiver([post_save, post_delete], sender=Profile)
+def reset_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+
+# rendering the responsive variants of a new upload in the background
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Testimonial)
+def render_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image or not settings.IMAGE_DERIVATIVES_EAGER:
+        return
+    name = instance.image.name
+    transaction.on_commit(lambda: generate_variants(name))
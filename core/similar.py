@@ -0,0 +1,231 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Article, SearchDocument, SearchPosting, SearchTerm, SimilarArticle
+from .search import _stats
+
+
+# "similar posts": cosine similarity of TF-IDF vectors built from the search index postings
+# (the field weighted term frequencies of the title, excerpt and content), boosted for
+# articles of the same category. The top SIMILAR_ARTICLES of every article are stored in the
+# SimilarArticle table and served with one indexed query. Saving an article refreshes its own
+# list and patches the lists it enters, leaves or moves in; the document frequencies drift as
+# the catalogue grows, "manage.py rebuild_similar_articles" recomputes everything.
+#
+# Candidates only come from the article's MAX_TERMS strongest terms, and for each of them
+# from the CANDIDATE_POSTINGS articles using it the most, so an update costs the same
+# whatever the size of the catalogue.
+
+MAX_TERMS = 32
+CANDIDATE_POSTINGS = 200
+
+
+def get_limit():
+    return getattr(settings, "SIMILAR_ARTICLES", 6)
+
+
+def _idf(documents, count):
+    return math.log((1 + count) / (1 + documents)) + 1
+
+
+def _weight(frequency, idf):
+    return (1 + math.log(frequency)) * idf
+
+
+def article_vector(article_pk):
+    """
+    Returns the {term: weight} TF-IDF vector of an indexed article.
+    """
+    count, _ = _stats()
+    frequencies = dict(
+        SearchPosting.objects.filter(article_id=article_pk).values_list("term", "frequency")
+    )
+    documents = dict(
+        SearchTerm.objects.filter(term__in=list(frequencies)).values_list("term", "documents")
+    )
+    return {
+        term: _weight(frequency, _idf(documents.get(term, 1), count))
+        for term, frequency in frequencies.items()
+    }
+
+
+def _norm(vector):
+    return math.sqrt(sum(weight * weight for weight in vector.values()))
+
+
+def _boost(score, category, other_category):
+    if category == other_category:
+        return score * getattr(settings, "SIMILAR_CATEGORY_BOOST", 1.25)
+    return score
+
+
+def similarity_scores(article, vector, norm):
+    """
+    Scores the candidate articles against the article.
+
+    Returns:
+        A {article pk: score} dict.
+    """
+    if not norm:
+        return {}
+    count, _ = _stats()
+    documents = dict(
+        SearchTerm.objects.filter(term__in=list(vector)).values_list("term", "documents")
+    )
+    dots = defaultdict(float)
+    for term, weight in heapq.nlargest(MAX_TERMS, vector.items(), key=lambda item: item[1]):
+        idf = _idf(documents.get(term, 1), count)
+        postings = (
+            SearchPosting.objects.filter(term=term)
+            .exclude(article_id=article.pk)
+            .order_by("-frequency")
+            .values_list("article_id", "frequency")[:CANDIDATE_POSTINGS]
+        )
+        for pk, frequency in postings:
+            dots[pk] += weight * _weight(frequency, idf)
+    if not dots:
+        return {}
+
+    candidates = SearchDocument.objects.filter(pk__in=list(dots)).values_list(
+        "pk", "norm", "article__category_id"
+    )
+    return {
+        pk: _boost(dots[pk] / (norm * other_norm), article.category_id, category)
+        for pk, other_norm, category in candidates
+        if other_norm
+    }
+
+
+def update_similar(article):
+    """
+    Recomputes the similar articles of one (just indexed) article, and patches the lists of
+    the articles it is now, or was, similar to.
+    """
+    limit = get_limit()
+    vector = article_vector(article.pk)
+    norm = _norm(vector)
+    with transaction.atomic():
+        SearchDocument.objects.filter(pk=article.pk).update(norm=norm)
+        scores = similarity_scores(article, vector, norm)
+
+        # its own list
+        SimilarArticle.objects.filter(article=article).delete()
+        SimilarArticle.objects.bulk_create(
+            SimilarArticle(article=article, similar_id=pk, score=score)
+            for pk, score in heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        )
+
+        # the lists of the others: the (boosted) similarity is symmetric, so the scores
+        # above are also their scores for this article
+        lists = defaultdict(dict)  # article pk -> {similar pk: (row pk, score)}
+        rows = SimilarArticle.objects.filter(article_id__in=list(scores)).values_list(
+            "pk", "article_id", "similar_id", "score"
+        )
+        for row_pk, pk, similar_pk, score in rows:
+            lists[pk][similar_pk] = (row_pk, score)
+        listing = SimilarArticle.objects.filter(similar=article).exclude(
+            article_id__in=list(scores)
+        )
+        listing.delete()  # no longer a candidate of theirs
+
+        stale, added = [], []
+        for pk, score in scores.items():
+            entries = lists[pk]
+            if article.pk in entries:
+                row_pk, _ = entries.pop(article.pk)
+                stale.append(row_pk)
+            ranked = sorted(entries.items(), key=lambda item: item[1][1], reverse=True)
+            if len(ranked) < limit or score > ranked[limit - 1][1][1]:
+                added.append(SimilarArticle(article_id=pk, similar_id=article.pk, score=score))
+                stale.extend(row_pk for _, (row_pk, _) in ranked[limit - 1 :])
+        SimilarArticle.objects.filter(pk__in=stale).delete()
+        SimilarArticle.objects.bulk_create(added)
+
+
+def rebuild_similar(batch_size=2000):
+    """
+    Recomputes the norms and the similar articles of every indexed article, in memory from
+    one pass over the postings.
+
+    Returns:
+        The number of articles processed.
+    """
+    limit = get_limit()
+    count, _ = _stats()
+    idfs = {
+        term: _idf(documents, count)
+        for term, documents in SearchTerm.objects.values_list("term", "documents").iterator(
+            chunk_size=batch_size
+        )
+    }
+    categories = dict(Article.objects.values_list("pk", "category_id"))
+
+    # the norms, the strongest terms of every article and the strongest postings of every term
+    norms, strongest = {}, {}
+    postings = defaultdict(list)  # term -> [(weight, article pk)], a bounded min-heap
+    current, vector = None, {}
+
+    def finish(pk, vector):
+        norms[pk] = _norm(vector)
+        strongest[pk] = heapq.nlargest(MAX_TERMS, vector.items(), key=lambda item: item[1])
+
+    rows = SearchPosting.objects.order_by("article_id").values_list(
+        "article_id", "term", "frequency"
+    )
+    for pk, term, frequency in rows.iterator(chunk_size=batch_size):
+        if pk != current:
+            if current is not None:
+                finish(current, vector)
+            current, vector = pk, {}
+        weight = _weight(frequency, idfs.get(term, 1.0))
+        vector[term] = weight
+        heap = postings[term]
+        if len(heap) < CANDIDATE_POSTINGS:
+            heapq.heappush(heap, (weight, pk))
+        elif weight > heap[0][0]:
+            heapq.heapreplace(heap, (weight, pk))
+    if current is not None:
+        finish(current, vector)
+
+    with transaction.atomic():
+        update_norm = "UPDATE %s SET norm = %%s WHERE article_id = %%s" % (
+            SearchDocument._meta.db_table
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(update_norm, [(norm, pk) for pk, norm in norms.items()])
+
+        SimilarArticle.objects.all().delete()
+        batch = []
+        for pk, terms in strongest.items():
+            dots = defaultdict(float)
+            for term, weight in terms:
+                for other_weight, other in postings[term]:
+                    if other != pk:
+                        dots[other] += weight * other_weight
+            scores = (
+                (other, _boost(dot / (norms[pk] * norms[other]), categories[pk], categories[other]))
+                for other, dot in dots.items()
+                if norms[pk] and norms[other]
+            )
+            for other, score in heapq.nlargest(limit, scores, key=lambda item: item[1]):
+                batch.append(SimilarArticle(article_id=pk, similar_id=other, score=score))
+            if len(batch) >= batch_size:
+                SimilarArticle.objects.bulk_create(batch)
+                batch = []
+        SimilarArticle.objects.bulk_create(batch)
+    return len(norms)
+
+
+def similar_articles(article):
+    """
+    The precomputed similar articles of the article, best match first.
+    """
+    return (
+        Article.objects.select_related("category")
+        .filter(similar_to__article=article)
+        .order_by("-similar_to__score")[: get_limit()]
+    )
@@ -0,0 +1,175 @@
+import time
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.urls import reverse
+
+from .database import primary
+from .fragments import get_versions
+from .models import Article, Author, Category
+
+
+# sitemap index and sharded sitemaps of the article, category and author pages. Each section
+# is cut into shards of SITEMAP_SHARD_SIZE primary keys (an article stays in its shard for
+# good), a shard is written while its rows are read through a chunked cursor over the two
+# columns it needs, then cached. Each article shard has its own version, bumped by the
+# Article signals for the shard of the saved / deleted article, so an edit regenerates that
+# shard only; the category and author shards follow the fragment versions.
+
+SHARD_VERSION_KEY = "sitemap:articles:%d"
+ROWS_PER_CHUNK = 1000
+CONTENT_TYPE = "application/xml; charset=utf-8"
+
+
+def get_shard_size():
+    return getattr(settings, "SITEMAP_SHARD_SIZE", 50000)
+
+
+def shard_of(pk):
+    return (pk - 1) // get_shard_size() + 1
+
+
+def bump_shard(pk):
+    """
+    Invalidates the sitemap shard holding the article.
+    """
+    key = SHARD_VERSION_KEY % shard_of(pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+class Section:
+    """
+    The pages of a model, looked up by one column, with the latest update of their articles
+    (found through `articles_by`, the article column holding the model key) as lastmod.
+    """
+
+    def __init__(self, model, column, route, articles_by):
+        self.model = model
+        self.column = column
+        self.route = route
+        self.articles_by = articles_by
+
+    def shard_count(self):
+        last = self.model.objects.aggregate(last=Max("pk"))["last"]
+        return shard_of(last) if last else 0
+
+    def bounds(self, shard):
+        size = get_shard_size()
+        return {"gt": (shard - 1) * size, "lte": shard * size}
+
+    def version(self, shard):
+        return "-".join(map(str, get_versions(Article, self.model).values()))
+
+    def lastmod(self, shard):
+        lookups = {f"{self.articles_by}__{op}": value for op, value in self.bounds(shard).items()}
+        return Article.objects.filter(**lookups).aggregate(latest=Max("updated_at"))["latest"]
+
+    def rows(self, shard):
+        lookups = {f"pk__{op}": value for op, value in self.bounds(shard).items()}
+        # read while the cached body is streamed, from the primary like every cache fill
+        return (
+            self.model.objects.using(DEFAULT_DB_ALIAS)
+            .filter(**lookups)
+            .order_by("pk")
+            .annotate(lastmod=Max("articles__updated_at"))
+            .values_list(self.column, "lastmod")
+            .iterator(chunk_size=ROWS_PER_CHUNK)
+        )
+
+    def locator(self):
+        # the function returning the path of a row's page
+        return lambda key: reverse(self.route, kwargs={self.column: key})
+
+
+class ArticleSection(Section):
+    def version(self, shard):
+        key = SHARD_VERSION_KEY % shard
+        # a fresh token rather than 1, like the fragment versions
+        cache.add(key, time.time_ns(), None)
+        return cache.get(key)
+
+    def rows(self, shard):
+        lookups = {f"pk__{op}": value for op, value in self.bounds(shard).items()}
+        return (
+            Article.objects.using(DEFAULT_DB_ALIAS)
+            .filter(**lookups)
+            .order_by("pk")
+            .values_list("slug", "updated_at")
+            .iterator(chunk_size=ROWS_PER_CHUNK)
+        )
+
+    def locator(self):
+        # one reverse() per shard rather than per article, the slugs need no quoting
+        prefix = reverse(self.route, kwargs={"slug": "slug"})[: -len("slug")]
+        return lambda slug: prefix + slug
+
+
+SECTIONS = {
+    "articles": ArticleSection(Article, "slug", "article", "pk"),
+    "categories": Section(Category, "name", "category_posts", "category"),
+    "authors": Section(Author, "username", "author_posts", "author"),
+}
+
+
+def _lastmod(value):
+    return f"<lastmod>{value.isoformat(timespec='seconds')}</lastmod>" if value else ""
+
+
+def stream_urlset(section, shard, base):
+    """
+    Yields the sitemap of a shard in chunks, base is the scheme and host of the urls.
+    """
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    )
+    location, chunk = section.locator(), []
+    for key, lastmod in section.rows(shard):
+        loc = escape(base + location(key))
+        chunk.append(f"<url><loc>{loc}</loc>{_lastmod(lastmod)}</url>\n")
+        if len(chunk) == ROWS_PER_CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("</urlset>\n")
+    yield "".join(chunk)
+
+
+def shard_lastmod(name, shard):
+    """
+    The latest update of the articles shown in a shard, cached until the shard changes.
+    """
+    section = SECTIONS[name]
+    key = f"sitemap:lastmod:{name}:{shard}:{section.version(shard)}"
+    found = cache.get(key)
+    if found is None:
+        with primary():
+            found = (section.lastmod(shard),)  # a tuple, so a shard without articles is cached too
+        cache.set(key, found, getattr(settings, "SITEMAP_CACHE_TIMEOUT", 60 * 60 * 24))
+    return found[0]
+
+
+def render_index(base):
+    """
+    Returns the sitemap index and its latest lastmod, one entry per shard of each section.
+    """
+    entries, latest = [], None
+    for name, section in SECTIONS.items():
+        for shard in range(1, section.shard_count() + 1):
+            lastmod = shard_lastmod(name, shard)
+            if lastmod is not None and (latest is None or lastmod > latest):
+                latest = lastmod
+            loc = escape(base + reverse("sitemap", kwargs={"section": name, "shard": shard}))
+            entries.append(f"<sitemap><loc>{loc}</loc>{_lastmod(lastmod)}</sitemap>\n")
+    body = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        + "".join(entries)
+        + "</sitemapindex>\n"
+    )
+    return body, latest
@@ -0,0 +1,325 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections
+
+from .database import primary
+from .fragments import get_versions
+from .models import Article, Author, Category
+from .search import MAX_TERM_LENGTH, STOP_WORDS, TOKEN_RE
+
+
+# search-as-you-type suggestions: the words of the article titles and of the category and
+# author names are kept in a compressed prefix trie (a radix tree) in the memory of each
+# process, so a suggestion is a walk down the trie that never reaches the database. Every node
+# keeps the SUGGESTIONS_LIMIT best entries below it (categories, then authors, then the newest
+# articles), so the suggestions for a prefix are read off the node it ends at, however many
+# words share it. The trie is built on first use and kept up to date by the Article / Author /
+# Category signals; the edits made by another process are noticed from the fragment versions
+# of the three models and picked up by a rebuild in the background, the old trie answering
+# meanwhile.
+
+SUGGESTION_MODELS = (Article, Author, Category)
+KIND_ORDER = {"category": 0, "author": 1, "article": 2}
+SCAN_LIMIT = 5000  # entries of a complete word checked by a several words suggestion
+
+# one suggestion: arg is what its page url is reversed with (name, username or slug), rank
+# orders the suggestions and words are the indexed words of the label
+Suggestion = namedtuple("Suggestion", "kind label arg rank words")
+
+
+def get_limit():
+    return getattr(settings, "SUGGESTIONS_LIMIT", 8)
+
+
+def words_of(*texts):
+    """
+    The distinct lowercase words of the texts, stop words left out.
+    """
+    return frozenset(
+        word[:MAX_TERM_LENGTH]
+        for text in texts
+        for word in TOKEN_RE.findall(text.lower())
+        if word not in STOP_WORDS
+    )
+
+
+def article_suggestion(pk, title, slug):
+    return Suggestion("article", title, slug, (KIND_ORDER["article"], -pk), words_of(title))
+
+
+def category_suggestion(name):
+    return Suggestion(
+        "category", name, name, (KIND_ORDER["category"], name.lower()), words_of(name)
+    )
+
+
+def author_suggestion(name, username):
+    return Suggestion(
+        "author", name, username, (KIND_ORDER["author"], name.lower()), words_of(name, username)
+    )
+
+
+def suggestion_of(instance):
+    """
+    The entry of an article, author or category, keyed by (kind, pk).
+    """
+    if isinstance(instance, Article):
+        suggestion = article_suggestion(instance.pk, instance.title, instance.slug)
+    elif isinstance(instance, Author):
+        suggestion = author_suggestion(instance.name, instance.username)
+    else:
+        suggestion = category_suggestion(instance.name)
+    return (suggestion.kind, instance.pk), suggestion
+
+
+class Node:
+    __slots__ = ("children", "items", "top")
+
+    def __init__(self):
+        self.children = {}  # first character of the edge -> (edge label, child)
+        self.items = []  # the (rank, key) of the entries having the word ending here, sorted
+        self.top = []  # the best (rank, key) of the subtree, sorted, at most top_k
+
+
+def _common_length(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class Trie:
+    """
+    A radix tree mapping words to the entries having them, with the best entries of every
+    subtree kept on its root.
+    """
+
+    def __init__(self, top_k):
+        self.top_k = top_k
+        self.root = Node()
+        self.entries = {}  # key -> Suggestion
+
+    def add(self, key, suggestion):
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = suggestion
+        item = (suggestion.rank, key)
+        for word in suggestion.words:
+            self._insert(word, item)
+
+    def remove(self, key):
+        suggestion = self.entries.get(key)
+        if suggestion is None:
+            return
+        item = (suggestion.rank, key)
+        for word in suggestion.words:
+            self._delete(word, item)
+        del self.entries[key]
+
+    def _push(self, node, item):
+        top = node.top
+        if (len(top) == self.top_k and item > top[-1]) or item in top:
+            return
+        insort(top, item)
+        del top[self.top_k :]
+
+    def _insert(self, word, item):
+        node, rest = self.root, word
+        while rest:
+            edge = node.children.get(rest[0])
+            if edge is None:
+                child = Node()
+                node.children[rest[0]] = (rest, child)
+                node, rest = child, ""
+            else:
+                label, child = edge
+                common = len(label) if rest.startswith(label) else _common_length(label, rest)
+                if common < len(label):
+                    # splitting the edge, the new node has the same subtree as the child
+                    middle = Node()
+                    middle.children[label[common]] = (label[common:], child)
+                    middle.top = list(child.top)
+                    node.children[rest[0]] = (label[:common], middle)
+                    child = middle
+                node, rest = child, rest[common:]
+            self._push(node, item)
+        insort(node.items, item)
+
+    def _best(self, node):
+        # an entry with several words of the subtree is in several of the children's tops
+        items = set(node.items[: self.top_k])
+        items.update(*(child.top for _, child in node.children.values()))
+        return heapq.nsmallest(self.top_k, items)
+
+    def _delete(self, word, item):
+        path, node, rest = [], self.root, word
+        while rest:
+            edge = node.children.get(rest[0])
+            if edge is None or not rest.startswith(edge[0]):
+                return
+            path.append((node, rest[0]))
+            node, rest = edge[1], rest[len(edge[0]) :]
+        items = node.items
+        i = bisect_left(items, item)
+        if i < len(items) and items[i] == item:
+            del items[i]
+        # fixing the tops bottom up, then dropping the emptied node or merging it into its
+        # only child so the edges stay compressed
+        for parent, first in reversed(path):
+            label, child = parent.children[first]
+            if item in child.top:
+                child.top = self._best(child)
+            if not child.items and not child.children:
+                del parent.children[first]
+            elif not child.items and len(child.children) == 1:
+                (child_label, grandchild), = child.children.values()
+                parent.children[first] = (label + child_label, grandchild)
+
+    def _find(self, prefix):
+        # the node of the subtree of the words starting with prefix
+        node, rest = self.root, prefix
+        while rest:
+            edge = node.children.get(rest[0])
+            if edge is None:
+                return None
+            label, child = edge
+            if rest.startswith(label):
+                node, rest = child, rest[len(label) :]
+            elif label.startswith(rest):
+                return child
+            else:
+                return None
+        return node
+
+    def _exact(self, word):
+        node, rest = self.root, word
+        while rest:
+            edge = node.children.get(rest[0])
+            if edge is None or not rest.startswith(edge[0]):
+                return []
+            node, rest = edge[1], rest[len(edge[0]) :]
+        return node.items
+
+    def suggest(self, query, limit):
+        """
+        The best entries having every word of the query, the last one as a prefix.
+        """
+        words = [word[:MAX_TERM_LENGTH] for word in TOKEN_RE.findall(query.lower())]
+        if not words:
+            return []
+        *complete, partial = words
+        complete = [word for word in complete if word not in STOP_WORDS]
+        node = self._find(partial)
+        if node is None:
+            return []
+        if not complete:
+            return [self.entries[key] for _, key in node.top[:limit]]
+        # the entries of the rarest complete word in rank order, until limit of them have the
+        # other words, at most SCAN_LIMIT of them are looked at
+        candidates = min((self._exact(word) for word in complete), key=len)
+        found = []
+        for _, key in islice(candidates, SCAN_LIMIT):
+            entry = self.entries[key]
+            if all(word in entry.words for word in complete) and any(
+                word.startswith(partial) for word in entry.words
+            ):
+                found.append(entry)
+                if len(found) == limit:
+                    break
+        return found
+
+
+def build_trie(top_k):
+    """
+    Reads the titles and names from the database into a new trie.
+    """
+    entries = [
+        (("category", pk), category_suggestion(name))
+        for pk, name in Category.objects.values_list("pk", "name").iterator()
+    ]
+    entries += [
+        (("author", pk), author_suggestion(name, username))
+        for pk, name, username in Author.objects.values_list("pk", "name", "username").iterator()
+    ]
+    # the newest articles first, so every insertion lands at the end of the sorted lists
+    articles = Article.objects.order_by("-pk").values_list("pk", "title", "slug")
+    entries += [
+        (("article", pk), article_suggestion(pk, title, slug))
+        for pk, title, slug in articles.iterator(chunk_size=2000)
+    ]
+    trie = Trie(top_k)
+    for key, suggestion in entries:
+        trie.add(key, suggestion)
+    return trie
+
+
+class SuggestionIndex:
+    """
+    The trie of this process, with the fragment versions of the models it was built from.
+    """
+
+    def __init__(self):
+        self.trie = None
+        self.versions = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    @property
+    def built(self):
+        return self.trie is not None
+
+    def build(self, versions=None):
+        if versions is None:
+            versions = get_versions(*SUGGESTION_MODELS)
+        with primary():
+            trie = build_trie(max(get_limit(), 1))
+        with self._lock:
+            self.trie, self.versions = trie, dict(versions)
+
+    def refresh(self, versions):
+        """
+        Rebuilds the trie in the background when another process edited the models, the
+        current one answering until the new one is ready.
+        """
+        with self._lock:
+            if versions == self.versions or self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, args=(versions,), daemon=True).start()
+
+    def _rebuild(self, versions):
+        try:
+            self.build(versions)
+        finally:
+            self._rebuilding = False
+            connections.close_all()
+
+    def suggest(self, query, limit=None):
+        if self.trie is None:
+            return []
+        with self._lock:
+            return self.trie.suggest(query, limit or get_limit())
+
+    def update(self, model, key, suggestion=None):
+        """
+        Adds, replaces (or without a suggestion removes) one entry after a local edit, then
+        takes the bumped version of the model as applied.
+        """
+        if self.trie is None:
+            return
+        version = get_versions(model)[model._meta.model_name]
+        with self._lock:
+            if suggestion is None:
+                self.trie.remove(key)
+            else:
+                self.trie.add(key, suggestion)
+            self.versions[model._meta.model_name] = version
+
+
+suggestion_index = SuggestionIndex()
@@ -0,0 +1,92 @@
+from django import template
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.urls import reverse
+from django.utils.html import format_html
+
+from core.images import FORMATS, variants
+
+register = template.Library()
+
+READY_CACHE_KEY = "images:ready:%s"
+
+
+def _variant_urls(name):
+    # {format: [(width, url), ...]}, pointing at the generated files when they all exist and
+    # at the lazy ImageVariantView for the ones that don't yet
+    found = variants(name)
+    if not found:
+        return {}
+    targets = [target for items in found.values() for _, target in items]
+    ready_key = READY_CACHE_KEY % targets[0]
+    ready = cache.get(ready_key)
+    if not ready:
+        ready = all(default_storage.exists(target) for target in targets)
+        if ready:
+            cache.set(ready_key, True, None)
+    urls = {}
+    for fmt, items in found.items():
+        urls[fmt] = [
+            (
+                width,
+                default_storage.url(target)
+                if ready
+                else reverse("image_variant", args=[width, fmt, name]),
+            )
+            for width, target in items
+        ]
+    return urls
+
+
+@register.simple_tag
+def responsive_image(image, alt="", sizes="100vw", **attrs):
+    """
+    Renders a lazy loaded <picture> with WebP and JPEG srcsets for an ImageField value.
+
+    Usage: {% responsive_image article.image alt="post" sizes="(max-width: 768px) 100vw, 400px" %}
+    """
+    if not image:
+        return ""
+    urls = _variant_urls(image.name)
+    if not urls:
+        # unreadable original, serving it as is
+        return format_html(
+            '<img loading="lazy" src="{}" alt="{}"{} />', image.url, alt, flatatt(attrs)
+        )
+
+    def srcset(fmt):
+        return ", ".join(f"{url} {width}w" for width, url in urls[fmt])
+
+    fallback = urls["jpeg"][len(urls["jpeg"]) // 2][1]
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="{}" srcset="{}" sizes="{}" />'
+        '<img loading="lazy" src="{}" srcset="{}" sizes="{}" alt="{}"{} />'
+        "</picture>",
+        FORMATS["webp"][1],
+        srcset("webp"),
+        sizes,
+        fallback,
+        srcset("jpeg"),
+        sizes,
+        alt,
+        flatatt(attrs),
+    )
+
+
+@register.filter
+def variant_url(image, width):
+    """
+    The URL of the JPEG variant closest to width, for places that can't use a srcset
+    (css backgrounds).
+    """
+    if not image:
+        return ""
+    urls = _variant_urls(image.name)
+    if not urls:
+        return image.url
+    for candidate, url in urls["jpeg"]:
+        if candidate >= int(width):
+            return url
+    return urls["jpeg"][-1][1]
@@ -1,3 +1,545 @@
-from django.test import TestCase
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .benchmarks import view_cases
+from .checks import template_static_references
+from .database import replicate, reset_replica, use_replica
+from .images import VARIANTS_DIR
+from .models import (
+    Article,
+    Author,
+    Category,
+    Favourite,
+    Newsletter,
+    NewsletterDelivery,
+    Subscriber,
+    Testimonial,
+    Vote,
+)
+from .newsletters import NewsletterEngine, queue_deliveries
+from .pagination import CursorPaginator, cached_count
+from .search import search
+from .seeding import check_empty, seed
+from .suggestions import Trie, article_suggestion, category_suggestion, suggestion_index
+from .templatetags.responsive import responsive_image
+from .votes import VoteEngine
+
+
+# a small deterministic catalogue, seeded once per test case class
+VOLUMES = {
+    "users": 10,
+    "authors": 3,
+    "categories": 3,
+    "articles": 30,
+    "comments": 60,
+    "votes": 40,
+    "favourites": 10,
+    "read_later": 10,
+    "subscribers": 5,
+    "testimonials": 2,
+}
+
+
+SRCSET_RE = re.compile(r'srcset="([^"]+)"')
+
+
+# the settings of the tests rendering pages: the test runner turns DEBUG off, the pages then
+# need the collectstatic manifest, and the request log thread can't write to the test database
+VIEW_SETTINGS = {
+    "STORAGES": {
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+    "REQUEST_LOG_SAMPLE_RATE": 0,
+}
+
+
+class SeededTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the image variants the pages and views render go to a copy of the uploaded originals
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root)
+        shutil.copytree(
+            settings.MEDIA_ROOT,
+            media_root,
+            ignore=shutil.ignore_patterns(VARIANTS_DIR),
+            dirs_exist_ok=True,
+        )
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        cls.addClassCleanup(media.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.created = seed(VOLUMES, seed=7)
+
+    def setUp(self):
+        # the versions, counts and user states cached by other tests
+        cache.clear()
+
+
+class SeedingTests(SeededTestCase):
+    def test_volumes(self):
+        for name, count in VOLUMES.items():
+            self.assertEqual(self.created[name], count, name)
+        self.assertTrue(check_empty())
+
+    def test_tallies_match_votes(self):
+        for article in Article.objects.all():
+            votes = Vote.objects.filter(article=article)
+            self.assertEqual(article.upvote, votes.filter(vote_type="up").count())
+            self.assertEqual(article.downvote, votes.filter(vote_type="down").count())
+
+    def test_same_seed_same_rows(self):
+        def rows():
+            return list(Article.objects.order_by("slug").values_list("slug", "excert"))
+
+        before = rows()
+        for model in (Article, Author, Category, Subscriber, Testimonial, get_user_model()):
+            model.objects.all().delete()  # the votes, comments and bookmarks cascade
+        seed(VOLUMES, seed=7)
+        self.assertEqual(rows(), before)
+
+
+class CursorPaginatorTests(SeededTestCase):
+    def setUp(self):
+        super().setUp()
+        self.expected = list(
+            Article.objects.order_by("-created_at", "-pk").values_list("pk", flat=True)
+        )
+        self.paginator = CursorPaginator(Article.objects.all(), 7, count=len(self.expected))
+
+    def pks(self, page):
+        return [article.pk for article in page]
+
+    def test_forward_then_backward(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(after=pages[-1].next_cursor))
+        self.assertEqual(sum((self.pks(page) for page in pages), []), self.expected)
+        self.assertEqual(len(pages), self.paginator.num_pages)
+
+        # walking back from the last page gives the same pages
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            back.append(self.paginator.page(before=back[-1].previous_cursor))
+        self.assertEqual([self.pks(page) for page in back[::-1]], [self.pks(p) for p in pages])
+        self.assertFalse(back[-1].has_previous())
+
+    def test_last_page(self):
+        page = self.paginator.page(last=True)
+        self.assertEqual(self.pks(page), self.expected[28:])
+        self.assertEqual(page.number, 5)
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+    def test_invalid_cursor_is_the_first_page(self):
+        page = self.paginator.page(after="not-a-cursor")
+        self.assertEqual(self.pks(page), self.expected[:7])
+
+
+class VoteEngineTests(SeededTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user("voter", password="pw")
+        self.article = Article.objects.order_by("pk").first()
+        # large enough that only the explicit flush() writes
+        self.engine = VoteEngine(batch_size=1000, flush_interval=3600)
+
+    def test_cast_switch_and_flush(self):
+        up, down = self.article.upvote, self.article.downvote
+
+        result = self.engine.cast(self.user, self.article, "up")
+        self.assertEqual((result.upvote, result.downvote), (up + 1, down))
+        self.assertTrue(result.upvoted)
+        # buffered, not written yet
+        self.assertEqual(Article.objects.get(pk=self.article.pk).upvote, up)
+
+        result = self.engine.cast(self.user, self.article, "down")
+        self.assertEqual((result.upvote, result.downvote), (up, down + 1))
+        self.assertEqual(Vote.objects.get(user=self.user, article=self.article).vote_type, "down")
+
+        # the same vote again changes nothing
+        result = self.engine.cast(self.user, self.article, "down")
+        self.assertEqual((result.upvote, result.downvote), (up, down + 1))
+
+        self.assertEqual(self.engine.flush(), 1)
+        self.article.refresh_from_db()
+        self.assertEqual((self.article.upvote, self.article.downvote), (up, down + 1))
+        self.assertEqual(self.engine.tallies(self.article), (up, down + 1))
+
+    def test_unknown_vote_type(self):
+        with self.assertRaises(ValueError):
+            self.engine.cast(self.user, self.article, "sideways")
+
+
+# the engine sends from a pool of threads, each with its own database connection: they'd wait
+# on the transaction of a TestCase
+@override_settings(NEWSLETTER_SEND_ON_SAVE=False)
+class NewsletterEngineTests(TransactionTestCase):
+    def setUp(self):
+        # the test database is in memory with a shared cache, where reading the deliveries
+        # fails on the table lock of a batch thread's write instead of waiting for it; one
+        # batch thread, and this thread's reads don't take the lock
+        self.set_read_uncommitted(True)
+        self.addCleanup(self.set_read_uncommitted, False)
+        self.emails = [f"reader{i}@example.com" for i in range(5)]
+        Subscriber.objects.bulk_create(Subscriber(email=email) for email in self.emails)
+        self.newsletter = Newsletter.objects.create(subject="News", message="<p>Hello</p>")
+        self.engine = NewsletterEngine(workers=1, batch_size=2)
+
+    def set_read_uncommitted(self, enabled):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA read_uncommitted = {int(enabled)}")
+
+    def test_send_records_every_delivery(self):
+        stats = self.engine.send(self.newsletter)
+
+        self.assertEqual((stats.sent, stats.failed, stats.batches), (5, 0, 3))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), self.emails)
+        self.assertEqual(mail.outbox[0].alternatives, [("<p>Hello</p>", "text/html")])
+        # one connection per batch, reused for its messages
+        self.assertEqual(len({id(m.connection) for m in mail.outbox}), 3)
+        deliveries = NewsletterDelivery.objects.filter(newsletter=self.newsletter)
+        self.assertEqual(
+            sorted(deliveries.values_list("subscriber__email", "status", "attempts")),
+            [(email, NewsletterDelivery.SENT, 1) for email in self.emails],
+        )
+        self.assertFalse(deliveries.filter(sent_at=None).exists())
+
+    def test_resume_after_a_partial_send(self):
+        queue_deliveries(self.newsletter)
+        # an interrupted run got through the first two
+        done = NewsletterDelivery.objects.filter(subscriber__email__in=self.emails[:2])
+        done.update(status=NewsletterDelivery.SENT, attempts=1)
+
+        stats = self.engine.send(self.newsletter)
+        self.assertEqual(stats.sent, 3)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), self.emails[2:])
+        self.assertFalse(self.engine.unfinished().exists())
+
+        # nothing left to send
+        self.assertEqual(self.engine.send(self.newsletter).sent, 0)
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class SearchTests(SeededTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = Author.objects.first()
+        self.category = Category.objects.first()
+
+    def article(self, slug, title, content):
+        return Article.objects.create(
+            slug=slug,
+            title=title,
+            excert="-",
+            content=f"<p>{content}</p>",
+            author=self.author,
+            category=self.category,
+        )
+
+    def test_ranking(self):
+        once = self.article("once", "Notes", "quokka")
+        often = self.article("often", "Quokka", "quokka quokka quokka")
+        ranked = [pk for pk, _ in search("quokka")]
+        self.assertEqual(ranked, [often.pk, once.pk])
+
+    def test_prefix_and_removal(self):
+        article = self.article("prefix", "Platypus facts", "platypus")
+        self.assertEqual([pk for pk, _ in search("platy")], [article.pk])
+        self.assertEqual(search("platy "), [])  # a finished word is an exact term
+        article.delete()
+        self.assertEqual(search("platypus"), [])
+
+
+@override_settings(**VIEW_SETTINGS)
+class ConditionalGetTests(SeededTestCase):
+    def revalidate(self, url):
+        self.client.get(url)  # sets the CSRF cookie the ETag covers
+        etag = self.client.get(url)["ETag"]
+        return self.client.get(url, headers={"if-none-match": etag})
+
+    def test_unchanged_pages_answer_304(self):
+        article = Article.objects.first()
+        for url in (
+            reverse("blog"),
+            reverse("category_posts", kwargs={"name": article.category.name}),
+            reverse("author_posts", kwargs={"username": article.author.username}),
+            reverse("article", kwargs={"slug": article.slug}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url).status_code, 304)
+
+    def test_edit_changes_the_etag(self):
+        url = reverse("blog")
+        self.client.get(url)
+        etag = self.client.get(url)["ETag"]
+        article = Article.objects.order_by("-created_at").first()
+        article.title = "A new title"
+        article.save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "A new title")
+
+    def test_bookmark_changes_the_etag(self):
+        user = get_user_model().objects.filter(username__startswith="reader").first()
+        article = Article.objects.exclude(favourite__user=user).first()
+        self.client.force_login(user)
+        url = reverse("blog")
+        self.client.get(url)
+        etag = self.client.get(url)["ETag"]
+        Favourite.objects.create(user=user, post=article)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(**VIEW_SETTINGS)
+class LandingTests(SeededTestCase):
+    def test_testimonials_fragment_keyed_on_the_page_shown(self):
+        client = Client(headers={"HX-Request": "true"})
+        url = reverse("index")
+        client.get(url, {"page": 1})
+        client.get(url, {"page": VOLUMES["testimonials"]})
+        # the first and last pages, already cached
+        for page in ("", "x", 0, 1000):
+            with self.subTest(page=page), self.assertNumQueries(0):
+                self.assertEqual(client.get(url, {"page": page}).status_code, 200)
+
+
+@override_settings(**VIEW_SETTINGS)
+class ImageVariantTests(SeededTestCase):
+    def test_every_srcset_url_is_served(self):
+        images = {
+            obj.image
+            for model in (Article, Category, Author, Testimonial)
+            for obj in model.objects.all()
+            if obj.image
+        }
+        self.assertTrue(images)
+        for image in images:
+            with self.subTest(image=image.name):
+                picture = responsive_image(image)
+                urls = {
+                    candidate.split()[0]
+                    for srcset in SRCSET_RE.findall(picture)
+                    for candidate in srcset.split(", ")
+                }
+                self.assertTrue(urls)
+                for url in urls:
+                    response = self.client.get(url)
+                    response.close()
+                    self.assertEqual(response.status_code, 200, url)
+
+
+# a second SQLite file as the replica, copied from the primary by replicate() and behind it
+# in between; rows are committed for the copy, hence no TestCase transaction
+@override_settings(**VIEW_SETTINGS, DATABASE_REPLICAS=["replica"])
+class ReplicaTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # added after the test case guards the configured databases, it's not a test database
+        super().setUpClass()
+        directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, directory)
+        connections.settings["replica"] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            "NAME": os.path.join(directory, "replica.sqlite3"),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        seed(VOLUMES, seed=7)
+        replicate("replica")
+        self.article = Article.objects.order_by("pk").first()
+
+    def add_article(self):
+        # on the primary only, the replica is behind until the next replicate()
+        return Article.objects.create(
+            slug="behind",
+            title="Only on the primary",
+            excert="-",
+            content="-",
+            category=self.article.category,
+            author=self.article.author,
+        )
+
+    def test_listing_reads_go_to_the_replica(self):
+        self.add_article()
+        self.assertNotContains(self.client.get(reverse("blog")), "Only on the primary")
+        replicate("replica")
+        self.assertContains(self.client.get(reverse("blog")), "Only on the primary")
+
+    def test_cache_fills_read_the_primary(self):
+        article = self.add_article()
+        category = article.category.name
+        for url, text in (
+            (reverse("index"), article.title),
+            (reverse("feed", kwargs={"fmt": "rss"}), article.title),
+            (reverse("category_feed", kwargs={"name": category, "fmt": "atom"}), article.title),
+            (reverse("sitemap", kwargs={"section": "articles", "shard": 1}), article.slug),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), text)
+        self.assertEqual(self.client.get(reverse("sitemap_index")).status_code, 200)
+        token = use_replica(True)
+        try:
+            count = cached_count(Article.objects.all(), "count")
+        finally:
+            reset_replica(token)
+        self.assertEqual(count, VOLUMES["articles"] + 1)
+
+    def test_writer_pinned_to_the_primary(self):
+        # the comments only show to signed in readers
+        writer, reader = get_user_model().objects.filter(username__startswith="reader")[:2]
+        self.client.force_login(writer)
+        other = Client()
+        other.force_login(reader)
+        replicate("replica")  # the sessions
+        url = reverse("article", kwargs={"slug": self.article.slug})
+        response = self.client.post(
+            url, {"comment": "Read your writes"}, headers={"HX-Request": "true", "src": "comment"}
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        # the writer reads the primary, everyone else the replica that doesn't have it yet
+        self.assertContains(self.client.get(url), "Read your writes")
+        self.assertNotContains(other.get(url), "Read your writes")
+        # and so does the writer once the pin expires
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertNotContains(self.client.get(url), "Read your writes")
+
+        replicate("replica")
+        self.assertContains(other.get(url), "Read your writes")
+
+
+@override_settings(**VIEW_SETTINGS, QUERY_BUDGET_ACTION="raise")
+class QueryBudgetTests(SeededTestCase):
+    def test_every_view_within_its_budget(self):
+        user = get_user_model().objects.filter(username__startswith="reader").first()
+        for case, client, url in view_cases(user):
+            with self.subTest(case=case):
+                # cold caches run the most queries, the suggestion trie is built again in the
+                # request rather than in a background thread
+                cache.clear()
+                suggestion_index.trie = None
+                for _ in range(2):
+                    response = client.get(url)
+                    response.close()  # the image variants are FileResponses
+                    self.assertLess(response.status_code, 400)
+
+
+@override_settings(**VIEW_SETTINGS)
+class ApiTests(SeededTestCase):
+    def walk(self, url, direction):
+        # the data of every page, following the links in one direction
+        pages = []
+        while url:
+            body = self.client.get(url).json()
+            pages.append(body["data"])
+            url = body[direction]
+        return pages
+
+    def test_categories_and_authors_are_paged(self):
+        for name, key, model in (
+            ("api_categories", "name", Category),
+            ("api_authors", "username", Author),
+        ):
+            with self.subTest(name=name):
+                expected = list(model.objects.order_by(key).values_list(key, flat=True))
+                pages = self.walk(reverse(name) + "?limit=2", "next")
+                self.assertEqual([len(page) for page in pages], [2, 1])
+                self.assertEqual([row[key] for page in pages for row in page], expected)
+                # back from the last page
+                last = self.client.get(reverse(name) + f"?limit=2&after={expected[1]}").json()
+                back = self.walk(last["previous"], "previous")
+                self.assertEqual([row[key] for row in back[0]], expected[:2])
+
+
+class StaticManifestCheckTests(TestCase):
+    def test_project_and_app_templates_are_scanned(self):
+        scanned = {Path(template) for template, _, _ in template_static_references()}
+        self.assertIn(settings.BASE_DIR / "templates" / "base.html", scanned)
+        # django.contrib.admin's templates, from APP_DIRS
+        self.assertTrue(any(template.match("admin/templates/admin/*.html") for template in scanned))
+
+
+class SuggestionTests(TestCase):
+    def setUp(self):
+        self.trie = Trie(3)
+        titles = ["Django tips", "Django testing", "Dining out", "Testing tools", "Diving"]
+        for pk, title in enumerate(titles, 1):
+            self.trie.add(("article", pk), article_suggestion(pk, title, f"a{pk}"))
+        self.trie.add(("category", 1), category_suggestion("Design"))
+
+    def labels(self, query, limit=3):
+        return [suggestion.label for suggestion in self.trie.suggest(query, limit)]
+
+    def test_prefix(self):
+        # the categories first, then the newest articles
+        self.assertEqual(self.labels("d"), ["Design", "Diving", "Dining out"])
+        self.assertEqual(self.labels("dj"), ["Django testing", "Django tips"])
+        self.assertEqual(self.labels("TEST"), ["Testing tools", "Django testing"])
+        self.assertEqual(self.labels("x"), [])
+
+    def test_several_words(self):
+        self.assertEqual(self.labels("django te"), ["Django testing"])
+        self.assertEqual(self.labels("tools test"), ["Testing tools"])
+        self.assertEqual(self.labels("unknown te"), [])
+
+    def test_remove_and_replace(self):
+        self.trie.remove(("article", 5))
+        self.trie.remove(("category", 1))
+        self.assertEqual(self.labels("d"), ["Dining out", "Django testing", "Django tips"])
+        self.trie.add(("article", 3), article_suggestion(3, "Hiking", "a3"))
+        self.assertEqual(self.labels("di"), [])
+        self.assertEqual(self.labels("hi"), ["Hiking"])
+
+        # the edges stay compressed, no node without entries has a single child
+        def check(node):
+            for label, child in node.children.values():
+                self.assertTrue(child.items or len(child.children) > 1)
+                check(child)
+
+        check(self.trie.root)
+
+    def test_signals_update_the_index(self):
+        cache.clear()
+        author = Author.objects.create(username="ann", name="Ann Lee", description="-")
+        category = Category.objects.create(name="Birds", description="-")
+        suggestion_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            article = Article.objects.create(
+                slug="owls",
+                title="Owls at night",
+                excert="-",
+                content="-",
+                author=author,
+                category=category,
+            )
+        self.assertEqual([s.label for s in suggestion_index.suggest("owl")], ["Owls at night"])
+        self.assertEqual([s.label for s in suggestion_index.suggest("ann")], ["Ann Lee"])
+        with self.captureOnCommitCallbacks(execute=True):
+            article.delete()
+        self.assertEqual(suggestion_index.suggest("owl"), [])
@@ -0,0 +1,149 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .fragments import bump_version
+from .models import Article, Comment, TrendingClock, TrendingScore, Vote
+
+
+# "trending": every publication, vote and comment adds its weight to the article's score, and
+# that weight halves every TRENDING_HALF_LIFE seconds. Instead of decaying every score on each
+# update, an event at time t adds weight * 2 ** ((t - epoch) / half life): the scores all
+# shrink by the same factor over time, so their order is the same as the decayed scores, and
+# an update only has to read the events since the previous one (on the created_at / voted_at
+# indexes) and add them to the scores they touch. When the factors grow too large the scores
+# are rescaled to a new epoch, dropping the ones that have decayed to nothing.
+#
+# The scores live in the TrendingScore table with the (-score) and (category, -score) indexes,
+# so the top articles overall or of a category are one indexed query. Deleted votes and
+# switched votes aren't taken back, "manage.py update_trending --full" recomputes the scores
+# from the activity of the last FULL_WINDOW half-lives.
+
+DEFAULT_WEIGHTS = {"article": 3.0, "upvote": 1.0, "downvote": -1.0, "comment": 2.0}
+REBASE_AFTER = 32  # half-lives since the epoch, the factors then reach 2 ** 32
+FULL_WINDOW = 10  # half-lives of activity read by a full update, older events weigh < 0.1%
+PRUNE_BELOW = 1e-3  # scores closer to zero are deleted on a rebase
+BATCH_SIZE = 500
+
+
+def get_half_life():
+    return getattr(settings, "TRENDING_HALF_LIFE", 60 * 60 * 24)
+
+
+def get_weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, "TRENDING_WEIGHTS", {})}
+
+
+def get_top_n():
+    return getattr(settings, "TRENDING_TOP_N", 20)
+
+
+def _growth(at, epoch, half_life):
+    return 2 ** ((at - epoch).total_seconds() / half_life)
+
+
+def events(since, until, weights):
+    """
+    Yields the (article pk, time, weight) of the publications, votes and comments in
+    (since, until].
+    """
+    articles = Article.objects.filter(created_at__gt=since, created_at__lte=until)
+    for pk, at in articles.values_list("pk", "created_at").iterator():
+        yield pk, at, weights["article"]
+    votes = Vote.objects.filter(voted_at__gt=since, voted_at__lte=until)
+    for pk, at, vote_type in votes.values_list("article_id", "voted_at", "vote_type").iterator():
+        yield pk, at, weights["upvote" if vote_type == "up" else "downvote"]
+    comments = Comment.objects.filter(created_at__gt=since, created_at__lte=until)
+    for pk, at in comments.values_list("article_id", "created_at").iterator():
+        yield pk, at, weights["comment"]
+
+
+def _rebase(clock, now, half_life):
+    factor = _growth(clock.epoch, now, half_life)
+    TrendingScore.objects.update(score=F("score") * factor)
+    TrendingScore.objects.filter(score__gt=-PRUNE_BELOW, score__lt=PRUNE_BELOW).delete()
+    clock.epoch = now
+
+
+def _add(totals):
+    pks = list(totals)
+    for start in range(0, len(pks), BATCH_SIZE):
+        batch = pks[start : start + BATCH_SIZE]
+        current = dict(TrendingScore.objects.filter(pk__in=batch).values_list("pk", "score"))
+        # the articles deleted since are left out
+        categories = dict(Article.objects.filter(pk__in=batch).values_list("pk", "category_id"))
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(
+                    article_id=pk, category_id=categories[pk], score=current.get(pk, 0) + totals[pk]
+                )
+                for pk in batch
+                if pk in categories
+            ],
+            update_conflicts=True,
+            unique_fields=["article"],
+            update_fields=["category", "score"],
+        )
+
+
+def update_trending(now=None, full=False):
+    """
+    Adds the activity since the last update to the scores, or recomputes them all.
+
+    Args:
+        now: The end of the activity to count, by default TRENDING_LAG seconds ago (a vote
+            stamped just before may not be committed yet).
+        full: Whether to recompute the scores from the last FULL_WINDOW half-lives.
+
+    Returns:
+        The number of articles whose score changed.
+    """
+    half_life = get_half_life()
+    if now is None:
+        now = timezone.now() - timedelta(seconds=getattr(settings, "TRENDING_LAG", 10))
+    with transaction.atomic():
+        clock = TrendingClock.objects.first()
+        if clock is None or full:
+            TrendingScore.objects.all().delete()
+            TrendingClock.objects.all().delete()
+            clock = TrendingClock(epoch=now, until=now - timedelta(seconds=half_life * FULL_WINDOW))
+        if now <= clock.until:
+            return 0
+        if (now - clock.epoch).total_seconds() > half_life * REBASE_AFTER:
+            _rebase(clock, now, half_life)
+
+        totals = defaultdict(float)
+        for pk, at, weight in events(clock.until, now, get_weights()):
+            totals[pk] += weight * _growth(at, clock.epoch, half_life)
+        _add(totals)
+        clock.until = now
+        clock.save()
+        transaction.on_commit(lambda: bump_version(TrendingScore))
+    return len(totals)
+
+
+def _top(category, limit):
+    rows = TrendingScore.objects.filter(score__gt=0)
+    if category is not None:
+        rows = rows.filter(category=category)
+    return rows.select_related("article__author", "article__category").order_by("-score")[
+        : limit or get_top_n()
+    ]
+
+
+def trending_articles(category=None, limit=None):
+    """
+    Returns the top trending articles, overall or of a category, in one query.
+    """
+    return [row.article for row in _top(category, limit)]
+
+
+async def atrending_articles(category=None, limit=None):
+    """
+    Async version of trending_articles.
+    """
+    return [row.article async for row in _top(category, limit)]
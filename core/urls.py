@@ -1,33 +1,76 @@
 from django.urls import path
 from .views import (
-    DownvotedPostsView,
     IndexView,
     BlogView,
+    SuggestionsView,
     CategoryPostsView,
     AuthorPostsView,
     ArticleView,
     PrivacyPolicyView,
     ContactView,
     AboutView,
-    SavedPostsView,
     SettingsView,
-    ReadingListView,
-    UpvotedPostsView,
+    LibraryView,
+    ImageVariantView,
+    FeedView,
+    SitemapIndexView,
+    SitemapView,
+    ApiView,
+    ApiCommentsView,
 )
+from .models import Author, Category
 
 
 urlpatterns = [
     path("", IndexView.as_view(), name="index"),
     path("blog/", BlogView.as_view(), name="blog"),
-    path("blog/category/<str:pk>", CategoryPostsView.as_view(), name="category_posts"),
-    path("blog/author/<str:pk>", AuthorPostsView.as_view(), name="author_posts"),
-    path("blog/article/<slug:pk>", ArticleView.as_view(), name="article"),
+    path("blog/suggest", SuggestionsView.as_view(), name="suggest"),
+    path("blog/category/<str:name>", CategoryPostsView.as_view(), name="category_posts"),
+    path("blog/author/<str:username>", AuthorPostsView.as_view(), name="author_posts"),
+    path("blog/article/<slug:slug>", ArticleView.as_view(), name="article"),
+    path("blog/feed/<str:fmt>", FeedView.as_view(), name="feed"),
+    path("blog/category/<str:name>/feed/<str:fmt>", FeedView.as_view(), name="category_feed"),
+    path("blog/author/<str:username>/feed/<str:fmt>", FeedView.as_view(), name="author_feed"),
+    path("sitemap.xml", SitemapIndexView.as_view(), name="sitemap_index"),
+    path("sitemap-<str:section>-<int:shard>.xml", SitemapView.as_view(), name="sitemap"),
+    path("api/articles", ApiView.as_view(resource="articles", many=True), name="api_articles"),
+    path("api/articles/<slug:slug>", ApiView.as_view(resource="articles"), name="api_article"),
+    path("api/articles/<slug:slug>/comments", ApiCommentsView.as_view(), name="api_comments"),
+    path(
+        "api/categories",
+        ApiView.as_view(resource="categories", many=True, models=(Category,)),
+        name="api_categories",
+    ),
+    path(
+        "api/categories/<str:name>",
+        ApiView.as_view(resource="categories", models=(Category,)),
+        name="api_category",
+    ),
+    path(
+        "api/authors",
+        ApiView.as_view(resource="authors", many=True, models=(Author,)),
+        name="api_authors",
+    ),
+    path(
+        "api/authors/<str:username>",
+        ApiView.as_view(resource="authors", models=(Author,)),
+        name="api_author",
+    ),
     path("privacy_policy", PrivacyPolicyView.as_view(), name="privacy_policy"),
     path("contact", ContactView.as_view(), name="contact"),
     path("about", AboutView.as_view(), name="about"),
     path("accounts/settings", SettingsView.as_view(), name="settings"),
-    path("accounts/reading_list", ReadingListView.as_view(), name="reading_list"),
-    path("accounts/saved_posts", SavedPostsView.as_view(), name="saved_posts"),
-    path("accounts/upvoted_posts", UpvotedPostsView.as_view(), name="upvoted_posts"),
-    path("accounts/downvoted_posts", DownvotedPostsView.as_view(), name="downvoted_posts"),
+    path("accounts/reading_list", LibraryView.as_view(shelf="reading_list"), name="reading_list"),
+    path("accounts/saved_posts", LibraryView.as_view(shelf="saved_posts"), name="saved_posts"),
+    path(
+        "accounts/upvoted_posts",
+        LibraryView.as_view(shelf="upvoted_posts"),
+        name="upvoted_posts",
+    ),
+    path(
+        "accounts/downvoted_posts",
+        LibraryView.as_view(shelf="downvoted_posts"),
+        name="downvoted_posts",
+    ),
+    path("images/<int:width>/<str:fmt>/<path:name>", ImageVariantView.as_view(), name="image_variant"),
 ]
@@ -1,11 +1,15 @@
 from django.http import (
+    FileResponse,
+    Http404,
+    JsonResponse,
     HttpResponse,
     HttpResponse as HttpResponse,
     HttpResponseBadRequest,
     HttpResponseNotAllowed,
     HttpResponseNotFound,
+    StreamingHttpResponse,
 )
-from django.views.generic import ListView, TemplateView
+from django.views.generic import TemplateView
 from django.views.generic import View
 from .models import (
     Category,
@@ -17,88 +21,163 @@ from .models import (
     Comment,
     Subscriber,
     Favourite,
-    Vote,
+    Profile,
+    TrendingScore,
 )
 from django.views.generic.edit import CreateView
 from .forms import ContactForm
+from .votes import vote_engine
+from .search import search_articles
+from .suggestions import SUGGESTION_MODELS, suggestion_index
+from .similar import get_limit as get_similar_limit, similar_articles
+from .fragments import aget_versions, get_versions
+from .database import primary
+from .feeds import FEED_TYPES, article_items, cache_when_complete
+from .sitemaps import (
+    CONTENT_TYPE as SITEMAP_CONTENT_TYPE,
+    SECTIONS,
+    render_index,
+    shard_lastmod,
+    stream_urlset,
+)
+from .api import RESOURCES, ApiError, get_page_size, key_page, page_links
+from .featured import featured_article_pk
+from .trending import atrending_articles, trending_articles
+from .library import SHELVES, get_counts, get_page_size as get_library_page_size
+from .pagination import COMMENTS_COUNT_KEY, CursorPaginator, acached_count, cached_count
+from .interactions import aget_user_states, get_user_states
+from .images import FORMATS, VARIANTS_DIR, ensure_variant, source_info, variant_widths
+from .instrumentation import registry
+from .conditional import (
+    LISTING_MODELS,
+    aarticle_validators,
+    alisting_validators,
+    aload_user,
+    listing_validators,
+    make_etag,
+    not_modified,
+    set_public_validators,
+    set_validators,
+)
 from django_htmx.http import (
     retarget,
 )  # target swap locations in the DOM from the server
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import method_decorator
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.utils.functional import SimpleLazyObject
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from asgiref.sync import sync_to_async
+import asyncio
+
+
+# the hot read views (IndexView, BlogView, ArticleView) are async: under ASGI they run on the
+# event loop and load their data with the async ORM and cache APIs, independent lookups are
+# awaited together. Template rendering (with the context processors and the lazy objects the
+# cached fragments fall back to) is synchronous, it runs in a thread.
+arender = sync_to_async(render)
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
 
 
 # Views
 
 
 class IndexView(View):
-    def get(self, request):
+    async def get(self, request):
+        # the landing sections are cached as template fragments keyed by the version of
+        # the models they show, so everything below is lazy and only hits the database
+        # when a fragment has to be rebuilt after an edit, from the primary
+        with primary():
+            return await self.render_page(request)
+
+    async def render_page(self, request):
+        versions, featured_pk = await asyncio.gather(
+            aget_versions(Article, Author, Category, Testimonial, TrendingScore),
+            sync_to_async(featured_article_pk)(),  # sampled from the precomputed pool
+        )
         categories = Category.objects.all()  # getting all the categories
-        authors = Author.objects.prefetch_related(
-            "articles"
-        ).all()  # Adjust prefetching to include related articles
-        latest = (
-            Article.objects.order_by("-created_at")
+        authors = Author.objects.all()
+        latest = SimpleLazyObject(
+            lambda: Article.objects.order_by("-created_at")
             .select_related("author", "category")
             .first()  # getting the latest post
         )
-        featured = (
-            Article.objects.order_by("?").select_related("author", "category").first()
+        featured = SimpleLazyObject(
+            lambda: Article.objects.select_related("author", "category")
+            .filter(pk=featured_pk)
+            .first()
         )
         articles = Article.objects.select_related("author", "category").order_by(
             "-created_at"
         )[:4]
+        # read from the materialized ranking, one indexed query
+        trending = SimpleLazyObject(
+            lambda: trending_articles(limit=settings.TRENDING_LANDING_ARTICLES)
+        )
 
         # getting the testimonials in a descending order (latest first)
         testimonials = Testimonial.objects.order_by("-created_at")
 
-        # paginating the testimonials by one testimonial per page
+        # paginating the testimonials by one testimonial per page, counted once per version
         paginator = Paginator(testimonials, 1)
+        paginator.count = await acached_count(
+            testimonials, f"count:testimonials:{versions['testimonial']}"
+        )
 
-        # specifying the get request parameter to fetch the next / previous instance
-        page_number = request.GET.get("page", 1)
-        testimonials_page = paginator.get_page(page_number)
+        # specifying the get request parameter to fetch the next / previous instance, the
+        # fragment is keyed on the page the paginator settles on rather than the raw value
+        testimonials_page = paginator.get_page(request.GET.get("page", 1))
+
+        context = {
+            "versions": versions,
+            "page_number": testimonials_page.number,
+            "timeout": settings.LANDING_CACHE_TIMEOUT,
+            "testimonials": testimonials_page,
+        }
 
         # checking if the request is htmx originated, if yes return only the right testimonial instance
         if request.htmx:
-            return render(
-                request,
-                "landing/testimonials.html",
-                context={
-                    "testimonials": testimonials_page,
-                },
-            )
+            return await arender(request, "landing/testimonials.html", context=context)
 
         # if it's not htmx originated, then return the whole page content
         else:
-            return render(
-                request,
-                "landing/index.html",
-                context={
+            context.update(
+                {
                     "categories": categories,
                     "authors": authors,
                     "articles": articles,
+                    "trending": trending,
                     "latest": latest,
                     "featured": featured,
-                    "testimonials": testimonials_page,
-                },
+                    "featured_pk": featured_pk,
+                }
             )
+            return await arender(request, "landing/index.html", context=context)
 
-    def post(self, request):
+    async def post(self, request):
         if request.htmx and request.headers.get("src") == "newsletters":
             email = request.POST.get("email")
             if email:
-                if Subscriber.objects.filter(email=email).exists():
-                    return render(
+                if await Subscriber.objects.filter(email=email).aexists():
+                    return await arender(
                         request,
                         "partials/subscribed.html",
                         {"message": "You're already subscribed"},
                     )
                 else:
-                    Subscriber.objects.create(email=email)
-                    return render(
+                    await Subscriber.objects.acreate(email=email)
+                    return await arender(
                         request,
                         "partials/subscribed.html",
                         {"message": "Congrats! You're subscribed now"},
@@ -109,38 +188,92 @@ class IndexView(View):
         return HttpResponseNotAllowed("GET")
 
 
-# using django generic class based view ListView to render  a template that contains a list of elements for the same db tabl
-class BlogView(ListView):
-    template_name = (
-        "blog/index.html"  # specifying the name of the template that should be rendered
-    )
-    model = Article  # specifying the corresponding db table
-    context_object_name = "articles"  # overriding the context object name
+# the blog listing, newest first with cursor pagination and the ranked search results
+class BlogView(View):
     paginate_by = 5  # number of articles per page
 
     # returning the right page if the request is htmx originated, else return the whole page
     def get_template_names(self) -> list[str]:
-        query = self.request.GET.get("query")
         if self.request.htmx and self.request.headers.get("src") == "search":
-            return ["post.html", query]
+            return ["post.html"]
         if self.request.htmx:
             return ["blog/posts.html"]
         return ["blog/index.html"]
 
-    # overriding the default context to add the latest post into it
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["latest"] = (
-            Article.objects.select_related("author", "category")
-            .order_by("-created_at")
-            .first()
-        )
-        query = self.request.GET.get("query")
+    async def get(self, request):
+        query = request.GET.get("query")
+        if query and request.htmx and request.headers.get("src") == "search":
+            # the search results partial only shows the results, the listing isn't read
+            results = await sync_to_async(search_articles)(
+                query, request.GET.get("search_page", 1)
+            )
+            context = {"results": results, "query": query}
+            return await arender(request, self.get_template_names(), context)
+
+        # ?sort=trending lists the top trending articles (see core/trending.py) instead
+        trending = request.GET.get("sort") == "trending"
+        models = LISTING_MODELS + (TrendingScore,) if trending else LISTING_MODELS
+
+        # answering 304 before any of the queries below when nothing shown has changed
+        validators = await alisting_validators(request, Article.objects.all(), models)
+        response = not_modified(request, *validators)
+        if response is not None:
+            return response
+
+        articles = Article.objects.select_related("author", "category")
+
+        if trending:
+            paginator = None
+            listing = atrending_articles()
+        else:
+            # cursor pagination instead of COUNT(*) + OFFSET, the count is cached until an
+            # article changes
+            version = (await aget_versions(Article))["article"]
+            count = await acached_count(Article.objects.all(), f"count:articles:{version}")
+            paginator = CursorPaginator(articles, self.paginate_by, count=count)
+            listing = paginator.aget_page(request.GET)
+
+        lookups = [
+            listing,
+            articles.order_by("-created_at").afirst(),  # the latest post for the header
+            aget_user_states(await aload_user(request)),
+        ]
         if query:
-            context["results"] = Article.objects.select_related(
-                "author", "category"
-            ).filter(title__icontains=query)
-        return context
+            # ranked lookup in the search index instead of scanning the article titles
+            lookups.append(
+                sync_to_async(search_articles)(query, request.GET.get("search_page", 1))
+            )
+        page, latest, states, *results = await asyncio.gather(*lookups)
+
+        object_list = page if trending else page.object_list
+        context = {
+            "view": self,
+            "paginator": paginator,
+            "page_obj": None if trending else page,
+            "is_paginated": not trending and page.has_other_pages(),
+            "object_list": object_list,
+            "articles": states.annotate(object_list),
+            "latest": latest,
+            "sort": "trending" if trending else None,
+        }
+        if query:
+            context["results"] = results[0]
+            context["query"] = query
+        response = await arender(request, self.get_template_names(), context)
+        return set_validators(response, *validators)
+
+
+# search-as-you-type suggestions of the search bar, read from the in-memory trie of this
+# process (see core/suggestions.py) without a database query
+class SuggestionsView(View):
+    async def get(self, request):
+        versions = await aget_versions(*SUGGESTION_MODELS)
+        if not suggestion_index.built:
+            await sync_to_async(suggestion_index.build)(versions)
+        else:
+            suggestion_index.refresh(versions)
+        context = {"suggestions": suggestion_index.suggest(request.GET.get("query", ""))}
+        return await arender(request, "partials/suggestions.html", context)
 
 
 # static template page for the privacy policy page
@@ -190,52 +323,87 @@ class AboutView(TemplateView):
 # this view is responsible for rendering a template that  displays the posts written by  a specific author
 class AuthorPostsView(TemplateView):
     template_name = "author_posts/index.html"
+    paginate_by = BlogView.paginate_by
+
+    def get(self, request, *args, **kwargs):
+        articles = Article.objects.filter(author__username=kwargs["username"])
+        validators = listing_validators(request, articles)
+        response = not_modified(request, *validators)
+        if response is None:
+            response = set_validators(super().get(request, *args, **kwargs), *validators)
+        return response
 
     # Override the context data to add our own context data
-    def get_context_data(self, pk, **kwargs):
+    def get_context_data(self, username, **kwargs):
         context = super().get_context_data(**kwargs)
 
         try:
-            author = Author.objects.select_related().get(pk=pk)  # fetching the author
-            articles = (
-                Article.objects.select_related("author", "category")
-                .filter(author=pk)
-                .order_by("-created_at")
-            )  # fetching the articles written by the specified author
+            author = Author.objects.get(username=username)  # fetching the author
         except Author.DoesNotExist:
             author = None
-            articles = Article.objects.none()
+            page = None
+        else:
+            # a cursor page of the author's articles, like the blog listing
+            articles = Article.objects.select_related("author", "category").filter(author=author)
+            version = get_versions(Article)["article"]
+            count = cached_count(articles, f"count:author:{author.pk}:{version}")
+            page = CursorPaginator(articles, self.paginate_by, count=count).get_page(
+                self.request.GET
+            )
 
         context["author"] = author
-        context["articles"] = articles
+        context["page_obj"] = page
+        context["articles"] = get_user_states(self.request.user).annotate(list(page or []))
         return context
 
 
 # this view is responsible for rendering a template that  displays the posts under a specific category
 class CategoryPostsView(TemplateView):
     template_name = "category_posts/index.html"  # the template to be rendered
+    paginate_by = BlogView.paginate_by
+
+    def get(self, request, *args, **kwargs):
+        articles = Article.objects.filter(category__name=kwargs["name"])
+        models = LISTING_MODELS
+        if request.GET.get("sort") == "trending":
+            models += (TrendingScore,)
+        validators = listing_validators(request, articles, models)
+        response = not_modified(request, *validators)
+        if response is None:
+            response = set_validators(super().get(request, *args, **kwargs), *validators)
+        return response
 
     # Override the context data to add our own context data
-    def get_context_data(self, pk, **kwargs):
+    def get_context_data(self, name, **kwargs):
         context = super().get_context_data(**kwargs)
 
+        page = None
         try:
-            category = Category.objects.select_related().get(
-                pk=pk
-            )  # fetching the category
-            articles = (
-                Article.objects.select_related("author", "category")
-                .filter(category=pk)
-                .order_by("-created_at")
-            )  # fetching the articles under the specified category
-            count = articles.count()  # counting how many posts we have in the category
+            category = Category.objects.get(name=name)  # fetching the category
         except Category.DoesNotExist:
             category = None
-            articles = Article.objects.none()
+            articles = []
             count = 0
+        else:
+            articles = Article.objects.select_related("author", "category").filter(
+                category=category
+            )  # fetching the articles under the specified category
+            # counting how many posts we have in the category, once per article version
+            version = get_versions(Article)["article"]
+            count = cached_count(articles, f"count:category:{category.pk}:{version}")
+            if self.request.GET.get("sort") == "trending":
+                articles = trending_articles(category)  # the category's top trending articles
+            else:
+                # a cursor page of the category's articles, like the blog listing
+                page = CursorPaginator(articles, self.paginate_by, count=count).get_page(
+                    self.request.GET
+                )
+                articles = page
 
         context["category"] = category
-        context["articles"] = articles
+        context["sort"] = self.request.GET.get("sort")
+        context["page_obj"] = page
+        context["articles"] = get_user_states(self.request.user).annotate(list(articles))
         context["count"] = count
 
         return context
@@ -243,116 +411,127 @@ class CategoryPostsView(TemplateView):
 
 # this view is responsible for rendering a template that  displays  aspeicific post with crud functionalityclass ArticleView(View):
 class ArticleView(View):
-    def get(self, request, pk):
+    @staticmethod
+    def get_comments(article):
+        # the commenter's picture comes with the comment, not from one query per comment
+        pictures = Profile.objects.filter(user=OuterRef("user")).order_by("pk")
+        return (
+            Comment.objects.select_related("user")
+            .filter(article=article)
+            .annotate(picture=Subquery(pictures.values("picture")[:1]))
+        )
+
+    # newest comments first, five at a time, the "load more" button passes the cursor back
+    def get_comments_page(self, article, params=None):
+        comments = self.get_comments(article)
+        paginator = CursorPaginator(
+            comments,
+            5,
+            count=lambda: cached_count(comments, COMMENTS_COUNT_KEY % article.pk),
+        )
+        return paginator.get_page(params or {})
+
+    async def aget_comments_page(self, article, params=None):
+        comments = self.get_comments(article)
+        count = await acached_count(comments, COMMENTS_COUNT_KEY % article.pk)
+        return await CursorPaginator(comments, 5, count=count).aget_page(params or {})
+
+    async def get(self, request, slug):
+        validators = await aarticle_validators(request, slug)
+        if validators is not None:
+            response = not_modified(request, *validators)
+            if response is not None:
+                return response
+
         try:
-            article = Article.objects.select_related("author", "category").get(
-                pk=pk
+            article = await Article.objects.select_related("author", "category").aget(
+                slug=slug
             )  # fetching the article
         except Article.DoesNotExist:
             return HttpResponseNotFound("Article not found")
 
-        is_bookmarked = is_scheduled = upvoted = downvoted = False
-        if request.user.is_authenticated:
-            is_bookmarked = Favourite.objects.filter(
-                user=request.user, post=article
-            ).exists()
-            is_scheduled = ReadLater.objects.filter(
-                user=request.user, post=article
-            ).exists()
-            upvoted = Vote.objects.filter(
-                user=request.user, article=article, vote_type="up"
-            ).exists()
-            downvoted = Vote.objects.filter(
-                user=request.user, article=article, vote_type="down"
-            ).exists()
-
-        comments = (
-            Comment.objects.select_related("user")
-            .filter(article=article)
-            .order_by("-created_at")
-        )
-        paginator = Paginator(comments, 5)
-        page_number = self.request.GET.get("page", 1)
-        comments_page = paginator.get_page(page_number)
+        # adding the votes this worker has not flushed to the articles table yet
+        article.upvote, article.downvote = vote_engine.tallies(article)
 
         if request.htmx:
-            return render(
+            comments_page = await self.aget_comments_page(article, request.GET)
+            response = await arender(
                 request, "article/cmts.html", context={"comments": comments_page}
             )
-
-        related_articles = Article.objects.filter(category=article.category).exclude(
-            pk=pk
+            return set_validators(response, *validators)
+
+        # the reader's bookmark / read later / vote state (one cached query for all of it),
+        # the comments and the similar posts don't depend on each other
+        states, comments_page, related_articles = await asyncio.gather(
+            aget_user_states(await aload_user(request)),
+            self.aget_comments_page(article, request.GET),
+            alist(similar_articles(article)),  # precomputed, one indexed query
         )
-        return render(
+        state = states.get(article.pk)
+        if not related_articles:
+            # not computed yet (e.g. before the first rebuild_similar_articles)
+            related_articles = await alist(
+                Article.objects.filter(category=article.category_id)
+                .exclude(pk=article.pk)
+                .order_by("-created_at")[: get_similar_limit()]
+            )
+
+        response = await arender(
             request,
             "article/index.html",
             context={
                 "article": article,
                 "comments": comments_page,
-                "count": comments.count(),
+                "count": comments_page.paginator.count,
                 "articles": related_articles,
-                "is_bookmarked": is_bookmarked,
-                "is_scheduled": is_scheduled,
-                "upvoted": upvoted,
-                "downvoted": downvoted,
+                "is_bookmarked": state.is_bookmarked,
+                "is_scheduled": state.is_scheduled,
+                "upvoted": state.upvoted,
+                "downvoted": state.downvoted,
             },
         )
+        return set_validators(response, *validators)
+
+    # the write handlers stay synchronous and run in a thread, a view's handlers are
+    # either all sync or all async
+    async def post(self, request, slug, *args, **kwargs):
+        return await sync_to_async(self.handle_post)(request, slug)
 
-    def post(self, request, pk, *args, **kwargs):
+    async def delete(self, request, slug, *args, **kwargs):
+        return await sync_to_async(self.handle_delete)(request, slug)
+
+    def handle_post(self, request, slug):
         if request.htmx and request.headers.get("src") == "comment":
-            article = get_object_or_404(Article, pk=pk)
+            article = get_object_or_404(Article, slug=slug)
             Comment.objects.create(
                 user=request.user,
                 article=article,
                 content=request.POST.get("comment", ""),
             )
-            comments = (
-                Comment.objects.select_related("user")
-                .filter(article=article)
-                .order_by("-created_at")
-            )
-            paginator = Paginator(comments, 5)
-            page_number = self.request.GET.get("page", 1)
-            comments_page = paginator.get_page(page_number)
+            comments_page = self.get_comments_page(article)
             return render(
                 request, "article/cmts.html", context={"comments": comments_page}
             )
 
         elif request.htmx and request.headers.get("src") in ["up", "down"]:
-            article = get_object_or_404(Article, pk=pk)
-            src = request.headers.get("src")
-            user_vote, created = Vote.objects.get_or_create(
-                user=request.user, article=article, defaults={"vote_type": src}
+            # only the counters are needed, the vote engine never rewrites the article row
+            article = get_object_or_404(
+                Article.objects.only("pk", "upvote", "downvote"), slug=slug
             )
-
-            if not created:
-                if user_vote.vote_type != src:
-                    if src == "up":
-                        article.upvote += 1
-                        article.downvote -= 1
-                    else:
-                        article.upvote -= 1
-                        article.downvote += 1
-                    user_vote.vote_type = src
-                    user_vote.save()
-            else:
-                if src == "up":
-                    article.upvote += 1
-                else:
-                    article.downvote += 1
-            article.save()
-
-            upvoted = Vote.objects.filter(
-                user=request.user, article=article, vote_type="up"
-            ).exists()
-            downvoted = Vote.objects.filter(
-                user=request.user, article=article, vote_type="down"
-            ).exists()
+            result = vote_engine.cast(request.user, article, request.headers.get("src"))
+            article.upvote, article.downvote = result.upvote, result.downvote
 
             return render(
                 request,
                 "partials/ratings.html",
-                {"article": article, "upvoted": upvoted, "downvoted": downvoted},
+                {
+                    "article": article,
+                    "count": cached_count(
+                        Comment.objects.filter(article=article), COMMENTS_COUNT_KEY % article.pk
+                    ),
+                    "upvoted": result.upvoted,
+                    "downvoted": result.downvoted,
+                },
             )
 
         elif request.htmx and request.headers.get("src") in ["bookmark", "bookmarked"]:
@@ -383,19 +562,12 @@ class ArticleView(View):
 
         return HttpResponseNotAllowed("POST")
 
-    def delete(self, request, pk, *args, **kwargs):
-        article = get_object_or_404(Article, pk=pk)
+    def handle_delete(self, request, slug):
+        article = get_object_or_404(Article, slug=slug)
         if request.htmx:
             comment_pk = request.headers.get("comment")
             Comment.objects.filter(pk=comment_pk, article=article).delete()
-            comments = (
-                Comment.objects.select_related("user")
-                .filter(article=article)
-                .order_by("-created_at")
-            )
-            paginator = Paginator(comments, 5)
-            page_number = self.request.GET.get("page", 1)
-            comments_page = paginator.get_page(page_number)
+            comments_page = self.get_comments_page(article)
             return render(
                 request, "article/cmts.html", context={"comments": comments_page}
             )
@@ -411,78 +583,276 @@ class SettingsView(TemplateView):
         return super().dispatch(request, *args, **kwargs)
 
 
-class ReadingListView(TemplateView):
+# the four shelves of the reader's library (see core/library.py), a page at a time with the
+# number of items on each shelf
+class LibraryView(TemplateView):
+    template_name = "library/index.html"
+    shelf = None  # the name of the shelf in core.library.SHELVES
+
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
-    template_name = "reading_list/index.html"
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        try:
-            items = ReadLater.objects.select_related("post").filter(
-                user=self.request.user
-            )
-        except ReadLater.DoesNotExist:
-            items = None
-
-        context["items"] = items
+        user = self.request.user
+        shelf = SHELVES[self.shelf]
+        counts = get_counts(user)
+        paginator = CursorPaginator(
+            shelf.items(user), get_library_page_size(), field=shelf.field, count=counts[shelf.name]
+        )
+        page = paginator.get_page(self.request.GET)
+        context["shelf"] = shelf
+        context["shelves"] = [(other, counts[name]) for name, other in SHELVES.items()]
+        context["page_obj"] = page
+        context["articles"] = shelf.articles(page)
         return context
 
 
-class SavedPostsView(TemplateView):
-    @method_decorator(login_required)
-    def dispatch(self, request, *args, **kwargs):
-        return super().dispatch(request, *args, **kwargs)
-
-    template_name = "saved_posts/index.html"
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-
+# generates an image variant on its first request, afterwards the responsive_image tag
+# links straight to the generated file under MEDIA_URL
+class ImageVariantView(View):
+    def get(self, request, width, fmt, name):
+        if fmt not in FORMATS:
+            raise Http404("Unknown image variant")
+        if name.startswith(VARIANTS_DIR + "/"):
+            raise Http404("Unknown image")
         try:
-            items = Favourite.objects.select_related("post").filter(
-                user=self.request.user
+            if not default_storage.exists(name):
+                raise Http404("Unknown image")
+            info = source_info(name)
+            if info is None:
+                raise Http404("Unreadable image")
+            # the widths of the srcset, the buckets and the original when it's smaller
+            if width not in variant_widths(info):
+                raise Http404("Unknown image variant")
+            target = ensure_variant(name, width, fmt)
+        except SuspiciousFileOperation:
+            raise Http404("Unknown image")
+        if target is None:
+            raise Http404("Unreadable image")
+
+        response = FileResponse(default_storage.open(target), content_type=FORMATS[fmt][1])
+        response["Cache-Control"] = "public, max-age=31536000"
+        return response
+
+
+# RSS / Atom / JSON feeds of the latest articles, overall or of a category or author (see
+# core/feeds.py). The body is cached until an article, author or category changes, and the
+# aggregators polling them get a 304 from the cached validators without any query.
+class FeedView(View):
+    def get(self, request, fmt, name=None, username=None):
+        feed_type = FEED_TYPES.get(fmt)
+        if feed_type is None:
+            raise Http404("Unknown feed format")
+        url = request.build_absolute_uri()
+        etag = make_etag(url, get_versions(Article, Author, Category))
+        key = f"feed:{etag}"
+        max_age = getattr(settings, "FEED_MAX_AGE", 300)
+
+        cached = cache.get(key)
+        if cached is not None:
+            body, last_modified = cached
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            ) or HttpResponse(body, content_type=feed_type.content_type)
+            return set_public_validators(response, etag, last_modified, max_age)
+
+        # the body is cached, it's read from the primary (see core/database.py)
+        with primary():
+            title, link, description, articles = self.get_scope(name, username)
+            latest = articles.aggregate(latest=Max("updated_at"))["latest"]
+        last_modified = int(latest.timestamp()) if latest else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            feed = feed_type(
+                title=title,
+                link=request.build_absolute_uri(link),
+                description=description,
+                feed_url=url,
+                language=settings.LANGUAGE_CODE,
+                updated=latest,
             )
-        except Favourite.DoesNotExist:
-            items = None
-
-        context["items"] = items
-        return context
-
+            # read while the body is streamed, after the request
+            rows = (
+                articles.using(DEFAULT_DB_ALIAS)
+                .select_related("author", "category")
+                .order_by("-created_at", "-pk")[: getattr(settings, "FEED_ITEMS", 50)]
+                .iterator(chunk_size=100)
+            )
+            chunks = cache_when_complete(
+                feed.stream(article_items(rows, request.build_absolute_uri)),
+                key,
+                last_modified,
+                getattr(settings, "FEED_CACHE_TIMEOUT", 60 * 60 * 24),
+            )
+            response = StreamingHttpResponse(chunks, content_type=feed_type.content_type)
+        return set_public_validators(response, etag, last_modified, max_age)
+
+    def get_scope(self, name, username):
+        # the title, page, description and articles of the feed
+        if name is not None:
+            category = get_object_or_404(Category, name=name)
+            return (
+                f"Bloggy: {category.name}",
+                reverse("category_posts", kwargs={"name": category.name}),
+                category.description,
+                Article.objects.filter(category=category),
+            )
+        if username is not None:
+            author = get_object_or_404(Author, username=username)
+            return (
+                f"Bloggy: {author.name}",
+                reverse("author_posts", kwargs={"username": author.username}),
+                author.description,
+                Article.objects.filter(author=author),
+            )
+        return "Bloggy", reverse("blog"), "The latest posts on Bloggy", Article.objects.all()
 
-class UpvotedPostsView(TemplateView):
-    template_name = "upvoted_posts/index.html"
 
-    @method_decorator(login_required)
-    def dispatch(self, request, *args, **kwargs):
-        return super().dispatch(request, *args, **kwargs)
+# the sitemap index and its shards (see core/sitemaps.py), for the crawlers to find every
+# article without paging through the listings; cached, and served with validators
+class SitemapIndexView(View):
+    def get(self, request):
+        base = request.build_absolute_uri("/")[:-1]
+        # the article shard versions are only bumped along with the article version
+        etag = make_etag(base, get_versions(Article, Author, Category))
+        key = f"sitemap:index:{etag}"
+        cached = cache.get(key)
+        if cached is None:
+            with primary():
+                cached = render_index(base)
+            cache.set(key, cached, getattr(settings, "SITEMAP_CACHE_TIMEOUT", 60 * 60 * 24))
+        body, latest = cached
+        last_modified = int(latest.timestamp()) if latest else None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        ) or HttpResponse(body, content_type=SITEMAP_CONTENT_TYPE)
+        return set_public_validators(
+            response, etag, last_modified, getattr(settings, "SITEMAP_MAX_AGE", 60 * 60)
+        )
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
 
-        # Retrieve upvoted articles by the current user
-        items = Vote.objects.select_related("article").filter(
-            user=self.request.user, vote_type="up"
-        )
+class SitemapView(View):
+    def get(self, request, section, shard):
+        sitemap = SECTIONS.get(section)
+        if sitemap is None or shard < 1:
+            raise Http404("Unknown sitemap")
+        base = request.build_absolute_uri("/")[:-1]
+        etag = make_etag(base, section, shard, sitemap.version(shard))
+        key = f"sitemap:{etag}"
+        max_age = getattr(settings, "SITEMAP_MAX_AGE", 60 * 60)
+
+        cached = cache.get(key)
+        if cached is not None:
+            body, last_modified = cached
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            ) or HttpResponse(body, content_type=SITEMAP_CONTENT_TYPE)
+            return set_public_validators(response, etag, last_modified, max_age)
+
+        # the body is cached, it's read from the primary (see core/database.py)
+        with primary():
+            if shard > sitemap.shard_count():
+                raise Http404("Unknown sitemap")
+            latest = shard_lastmod(section, shard)
+        last_modified = int(latest.timestamp()) if latest else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            chunks = cache_when_complete(
+                stream_urlset(sitemap, shard, base),
+                key,
+                last_modified,
+                getattr(settings, "SITEMAP_CACHE_TIMEOUT", 60 * 60 * 24),
+            )
+            response = StreamingHttpResponse(chunks, content_type=SITEMAP_CONTENT_TYPE)
+        return set_public_validators(response, etag, last_modified, max_age)
 
-        context["items"] = items
-        return context
 
+# the read-only JSON API (see core/api.py): the ETag comes from the fragment versions of the
+# models shown, so a revalidation is answered before any query, and the responses are the
+# same for everyone (no session or cookie is read), shared caches may keep them API_MAX_AGE
+# seconds
+class ApiView(View):
+    resource = None  # the name of the resource in core.api.RESOURCES
+    many = False  # a list rather than the row named by the url arguments
+    models = (Article, Author, Category)  # the models whose versions the ETag is built from
 
-class DownvotedPostsView(TemplateView):
-    template_name = "downvoted_posts/index.html"
+    def get(self, request, **kwargs):
+        resource = RESOURCES[self.resource]
+        try:
+            names, embedded = resource.select(request.GET, self.many)
+            size = get_page_size(request.GET) if self.many else None
+        except ApiError as error:
+            return JsonResponse({"error": str(error)}, status=400)
+        try:
+            queryset, etag, last_modified = self.get_scope(request, resource, **kwargs)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                rows = queryset.values(*resource.columns(names, embedded, self.many))
+                serialize = resource.serializer(
+                    names, embedded, request.build_absolute_uri("/")[:-1]
+                )
+                response = JsonResponse(self.get_body(request, rows, serialize, size))
+        except Http404 as error:
+            return JsonResponse({"error": str(error)}, status=404)
+        return set_public_validators(
+            response, etag, last_modified, getattr(settings, "API_MAX_AGE", 60)
+        )
 
-    @method_decorator(login_required)
-    def dispatch(self, request, *args, **kwargs):
-        return super().dispatch(request, *args, **kwargs)
+    def get_scope(self, request, resource, **kwargs):
+        # the rows, the ETag and the last modified timestamp
+        etag = make_etag(request.build_absolute_uri(), get_versions(*self.models))
+        queryset = resource.model.objects.all()
+        if not self.many:
+            return queryset.filter(**kwargs), etag, None
+        return resource.filter(queryset, request.GET), etag, None
+
+    def get_body(self, request, rows, serialize, size):
+        if not self.many:
+            row = next(iter(rows[:1]), None)
+            if row is None:
+                raise Http404("Not found")
+            return {"data": serialize(row)}
+        key = RESOURCES[self.resource].key
+        if key is None:
+            page = CursorPaginator(rows, size).get_page(request.GET)
+            cursors = page.next_cursor, page.previous_cursor
+        else:
+            page, *cursors = key_page(rows, key, size, request.GET)
+        next_url, previous_url = page_links(request, *cursors)
+        return {
+            "data": [serialize(row) for row in page],
+            "next": next_url,
+            "previous": previous_url,
+        }
+
+
+class ApiCommentsView(ApiView):
+    resource = "comments"
+    many = True
+
+    def get_scope(self, request, resource, slug):
+        # the comments are not versioned, their latest date and count stand in
+        rows = (
+            Article.objects.filter(slug=slug)
+            .values("pk")
+            .annotate(latest=Max("comments__created_at"), comments=Count("comments"))
+        )
+        row = next(iter(rows[:1]), None)
+        if row is None:
+            raise Http404("No such article")
+        etag = make_etag(request.build_absolute_uri(), row["latest"], row["comments"])
+        last_modified = int(row["latest"].timestamp()) if row["latest"] else None
+        return Comment.objects.filter(article_id=row["pk"]), etag, last_modified
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        # Retrieve upvoted articles by the current user
-        items = Vote.objects.filter(user=self.request.user, vote_type="down")
 
-        context["items"] = items
-        return context
+# the per view histograms of this process (see core.instrumentation), for the staff only,
+# next to the admin
+class MetricsView(View):
+    def get(self, request):
+        if not request.user.is_staff:
+            raise Http404
+        return JsonResponse(registry.snapshot())
@@ -0,0 +1,199 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .interactions import invalidate_user_states
+from .library import VOTE_SHELVES, adjust_count
+from .models import Article, Vote
+
+logger = logging.getLogger(__name__)
+
+
+# write-behind vote counter engine: Vote rows are written immediately (they are the
+# source of truth), while the denormalized Article.upvote / Article.downvote counters
+# are buffered per article and flushed in batches with atomic F() increments, so a
+# vote never rewrites the whole article row (content included). A background thread flushes
+# every VOTES_FLUSH_INTERVAL seconds, so the last votes before a quiet period don't wait in
+# the memory of one worker for the next vote.
+
+
+@dataclass(frozen=True)
+class VoteResult:
+    upvote: int
+    downvote: int
+    upvoted: bool
+    downvoted: bool
+
+
+class VoteEngine:
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size or getattr(settings, "VOTES_FLUSH_BATCH_SIZE", 64)
+        self.flush_interval = flush_interval or getattr(
+            settings, "VOTES_FLUSH_INTERVAL", 2.0
+        )
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # article pk -> [upvote delta, downvote delta]
+        self._buffered = 0  # number of deltas waiting to be flushed
+        self._last_flush = time.monotonic()
+        self._thread = None
+        self._pid = None
+
+    def cast(self, user, article, vote_type):
+        """
+        Records the user's vote on the article and buffers the counter deltas.
+
+        Args:
+            user: The voting user.
+            article: The article being voted on, only upvote/downvote need to be loaded.
+            vote_type: Either "up" or "down".
+
+        Returns:
+            A VoteResult with the new tallies and the user's vote state.
+        """
+        if vote_type not in ("up", "down"):
+            raise ValueError(f"unknown vote type: {vote_type!r}")
+
+        # switching an existing vote is a single conditional UPDATE, the affected row
+        # count tells us whether this request is the one that flipped it
+        switched = (
+            Vote.objects.filter(user=user, article_id=article.pk)
+            .exclude(vote_type=vote_type)
+            .update(vote_type=vote_type, voted_at=timezone.now())
+        )
+        if switched:
+            delta = (1, -1) if vote_type == "up" else (-1, 1)
+        else:
+            _, created = Vote.objects.get_or_create(
+                user=user, article_id=article.pk, defaults={"vote_type": vote_type}
+            )
+            if created:
+                delta = (1, 0) if vote_type == "up" else (0, 1)
+            else:
+                delta = (0, 0)  # same vote again, nothing to count
+
+        if delta != (0, 0):
+            # the switch above is a queryset update, which sends no signal
+            invalidate_user_states(user.pk)
+            if switched:
+                adjust_count(user.pk, VOTE_SHELVES[vote_type], 1)
+                adjust_count(user.pk, VOTE_SHELVES["down" if vote_type == "up" else "up"], -1)
+            up, down = self._buffer(article.pk, delta)
+        else:
+            up, down = self._pending_for(article.pk)
+
+        return VoteResult(
+            upvote=article.upvote + up,
+            downvote=article.downvote + down,
+            upvoted=vote_type == "up",
+            downvoted=vote_type == "down",
+        )
+
+    def tallies(self, article):
+        """
+        Returns the (upvote, downvote) counters of the article including the deltas
+        this process has not flushed yet.
+        """
+        up, down = self._pending_for(article.pk)
+        return article.upvote + up, article.downvote + down
+
+    def _pending_for(self, pk):
+        with self._lock:
+            up, down = self._pending.get(pk, (0, 0))
+        return up, down
+
+    def _ensure_flusher(self):
+        # (re)starting the flusher lazily, also in a process forked after it was started
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="vote-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("could not flush the vote counters")
+
+    def _buffer(self, pk, delta):
+        # returns the pending deltas of the article as they were right before a
+        # possible flush, so the caller can still add them to the counters it loaded
+        self._ensure_flusher()
+        with self._lock:
+            pending = self._pending.setdefault(pk, [0, 0])
+            pending[0] += delta[0]
+            pending[1] += delta[1]
+            totals = tuple(pending)
+            self._buffered += 1
+            due = (
+                self._buffered >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+        return totals
+
+    def flush(self):
+        """
+        Writes every buffered delta to the articles table in one transaction.
+
+        Returns:
+            The number of articles updated.
+        """
+        # only one flusher at a time, the others keep buffering
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._buffered = 0
+                self._last_flush = time.monotonic()
+            if not pending:
+                return 0
+            try:
+                with transaction.atomic():
+                    for pk, (up, down) in pending.items():
+                        if up or down:
+                            Article.objects.filter(pk=pk).update(
+                                upvote=F("upvote") + up, downvote=F("downvote") + down
+                            )
+            except Exception:
+                # put the deltas back so they are retried on the next flush
+                with self._lock:
+                    for pk, (up, down) in pending.items():
+                        current = self._pending.setdefault(pk, [0, 0])
+                        current[0] += up
+                        current[1] += down
+                        self._buffered += 1
+                raise
+            return len(pending)
+        finally:
+            self._flush_lock.release()
+
+
+vote_engine = VoteEngine()
+
+
+# never lose the buffered deltas when the worker shuts down
+@atexit.register
+def _flush_on_exit():
+    try:
+        vote_engine.flush()
+    except Exception:
+        pass